@@ -0,0 +1,142 @@
+
+# An interval tier held as parallel numpy arrays: float64 start and stop
+# times and an integer code per entry into a list of the distinct labels.
+# Filtering, thresholding and relabeling work on whole arrays at once
+# instead of building a new list of tuples at each step.
+
+import numpy as np
+
+from praatio import praatio
+
+
+def internLabels(labelList):
+    '''
+    Returns an array of codes for labelList and the distinct labels
+
+    codeArray[i] is the index of labelList[i] in the distinct labels.
+    '''
+    codeDict = {}
+    codeArray = np.fromiter((codeDict.setdefault(label, len(codeDict))
+                             for label in labelList),
+                            dtype=np.int32, count=len(labelList))
+
+    uniqueLabelList = [None] * len(codeDict)
+    for label, code in codeDict.items():
+        uniqueLabelList[code] = label
+
+    return codeArray, uniqueLabelList
+
+
+class ArrayTier(object):
+    '''
+    An interval tier as startArray, stopArray and codeArray
+
+    labelList holds the distinct labels; the label of entry i is
+    labelList[codeArray[i]].  The tiers returned by relabel() and
+    remapLabels() share the time arrays rather than copying them.
+    '''
+
+    def __init__(self, name, startArray, stopArray, codeArray, labelList,
+                 minT=None, maxT=None):
+        self.name = name
+        self.startArray = startArray
+        self.stopArray = stopArray
+        self.codeArray = codeArray
+        self.labelList = labelList
+        self.minT = minT
+        self.maxT = maxT
+
+    @classmethod
+    def fromEntryList(cls, name, entryList, minT=None, maxT=None):
+
+        numEntries = len(entryList)
+        startArray = np.fromiter((entry[0] for entry in entryList),
+                                 dtype=np.float64, count=numEntries)
+        stopArray = np.fromiter((entry[1] for entry in entryList),
+                                dtype=np.float64, count=numEntries)
+        codeArray, labelList = internLabels([entry[2] for entry in entryList])
+
+        return cls(name, startArray, stopArray, codeArray, labelList,
+                   minT, maxT)
+
+    @classmethod
+    def fromTier(cls, tier):
+        '''
+        From a praatio IntervalTier
+        '''
+        return cls.fromEntryList(tier.name, tier.entryList, tier.minTimestamp,
+                                 tier.maxTimestamp)
+
+    def __len__(self):
+        return len(self.startArray)
+
+    def getDurations(self):
+        return self.stopArray - self.startArray
+
+    def getLabels(self):
+        return [self.labelList[code] for code in self.codeArray.tolist()]
+
+    def findCodes(self, labelList):
+        '''
+        The codes of the labels in labelList that occur in this tier
+        '''
+        labelSet = set(labelList)
+        return [code for code, label in enumerate(self.labelList)
+                if label in labelSet]
+
+    def find(self, label, caseSensitiveFlag=True):
+        '''
+        A boolean mask of the entries labeled label
+        '''
+        if caseSensitiveFlag:
+            codeList = self.findCodes([label])
+        else:
+            codeList = [code for code, tierLabel in enumerate(self.labelList)
+                        if tierLabel.lower() == label.lower()]
+
+        return np.isin(self.codeArray, codeList)
+
+    def select(self, mask):
+        '''
+        A tier with only the entries where mask is True
+        '''
+        return ArrayTier(self.name, self.startArray[mask],
+                         self.stopArray[mask], self.codeArray[mask],
+                         self.labelList, self.minT, self.maxT)
+
+    def filterByDuration(self, minDuration):
+        '''
+        A tier with only the entries longer than minDuration
+        '''
+        return self.select(self.getDurations() > minDuration)
+
+    def relabel(self, label):
+        '''
+        The same tier with every entry labeled label
+        '''
+        return ArrayTier(self.name, self.startArray, self.stopArray,
+                         np.zeros(len(self), dtype=np.int32), [label],
+                         self.minT, self.maxT)
+
+    def remapLabels(self, labelDict):
+        '''
+        The same tier with each label in labelDict replaced by its value
+        '''
+        newLabelList = [labelDict.get(label, label)
+                        for label in self.labelList]
+        remapArray, uniqueLabelList = internLabels(newLabelList)
+
+        return ArrayTier(self.name, self.startArray, self.stopArray,
+                         remapArray[self.codeArray], uniqueLabelList,
+                         self.minT, self.maxT)
+
+    def toEntryList(self):
+        return zip(self.startArray.tolist(), self.stopArray.tolist(),
+                   self.getLabels())
+
+    def toTier(self):
+        '''
+        As a praatio IntervalTier
+        '''
+        return praatio.IntervalTier(self.name, self.toEntryList(),
+                                    self.minT, self.maxT)
@@ -0,0 +1,166 @@
+
+# Reads PCM wav files through a memory map so that many segments can be cut
+# from a long recording without re-opening or re-reading it.
+
+import struct
+import wave
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavHeader(object):
+    '''
+    The format of a wav file and the location of its sample data
+    '''
+
+    def __init__(self, numChannels, sampleRate, sampWidth, dataOffset,
+                 numFrames):
+        self.numChannels = numChannels
+        self.sampleRate = sampleRate
+        self.sampWidth = sampWidth
+        self.dataOffset = dataOffset
+        self.numFrames = numFrames
+
+    @property
+    def duration(self):
+        return self.numFrames / float(self.sampleRate)
+
+
+def readWavHeader(fullPath):
+    '''
+    Parses the RIFF chunks of a PCM wav file without reading any audio
+    '''
+    with open(fullPath, "rb") as fd:
+        riffID, riffSize, waveID = struct.unpack("<4sI4s", fd.read(12))
+        if riffID != b"RIFF" or waveID != b"WAVE":
+            raise ValueError("Not a RIFF/WAVE file: %s" % fullPath)
+
+        formatTuple = None
+        while True:
+            chunkHeader = fd.read(8)
+            if len(chunkHeader) < 8:
+                raise ValueError("No data chunk in %s" % fullPath)
+            chunkID, chunkSize = struct.unpack("<4sI", chunkHeader)
+
+            if chunkID == b"fmt ":
+                chunk = fd.read(chunkSize)
+                formatTuple = struct.unpack("<HHIIHH", chunk[:16])
+                formatTag = formatTuple[0]
+                if formatTag == WAVE_FORMAT_EXTENSIBLE and len(chunk) >= 26:
+                    formatTag = struct.unpack("<H", chunk[24:26])[0]
+                if formatTag != WAVE_FORMAT_PCM:
+                    raise ValueError("Not a PCM wav file: %s" % fullPath)
+            elif chunkID == b"data":
+                if formatTuple is None:
+                    raise ValueError("Data before format in %s" % fullPath)
+                numChannels, sampleRate = formatTuple[1], formatTuple[2]
+                blockAlign, bitsPerSample = formatTuple[4], formatTuple[5]
+                return WavHeader(numChannels, sampleRate,
+                                 (bitsPerSample + 7) // 8, fd.tell(),
+                                 chunkSize // blockAlign)
+            else:
+                # Chunks are padded to an even number of bytes
+                fd.seek(chunkSize + (chunkSize % 2), 1)
+
+
+def openWavArray(fullPath, header=None):
+    '''
+    A read-only (numFrames, numChannels) memory map over the samples
+
+    24-bit files map to (numFrames, numChannels * 3) raw bytes.
+    '''
+    if header is None:
+        header = readWavHeader(fullPath)
+
+    dtype = {1: np.uint8, 2: np.dtype("<i2"), 3: np.uint8,
+             4: np.dtype("<i4")}[header.sampWidth]
+    numColumns = header.numChannels
+    if header.sampWidth == 3:
+        numColumns *= 3
+    if header.numFrames == 0:
+        return np.zeros((0, numColumns), dtype=dtype)
+
+    return np.memmap(fullPath, dtype=dtype, mode="r",
+                     offset=header.dataOffset,
+                     shape=(header.numFrames, numColumns))
+
+
+def getFrameRange(header, startTime, endTime):
+    '''
+    The frames for a segment, rounded as in audio_scripts.extractSubwav()
+    '''
+    startFrame = int(header.sampleRate * startTime)
+    numFrames = int(header.sampleRate * (endTime - startTime))
+
+    return startFrame, min(startFrame + numFrames, header.numFrames)
+
+
+def getSegment(wavArray, header, startTime, endTime, singleChannelFlag=True):
+    '''
+    A view of the samples for startTime-endTime; only the first channel
+    if singleChannelFlag is True.  No audio is copied.
+    '''
+    startFrame, endFrame = getFrameRange(header, startTime, endTime)
+    segment = wavArray[startFrame:endFrame]
+    if singleChannelFlag:
+        segment = segment[:, :3] if header.sampWidth == 3 else segment[:, :1]
+
+    return segment
+
+
+def toFloat(segment, header):
+    '''
+    A segment from getSegment() as samples scaled to -1..1, the channels
+    averaged
+    '''
+    if header.sampWidth == 1:
+        sampleArray = (segment.astype(np.float64) - 128.0) / 128.0
+    elif header.sampWidth == 2:
+        sampleArray = segment.astype(np.float64) / 2**15
+    elif header.sampWidth == 3:
+        raw = segment.reshape(len(segment), segment.shape[1] // 3, 3)
+        sampleArray = (raw[:, :, 0].astype(np.int32) |
+                       (raw[:, :, 1].astype(np.int32) << 8) |
+                       (raw[:, :, 2].astype(np.int8).astype(np.int32) << 16))
+        sampleArray = sampleArray.astype(np.float64) / 2**23
+    else:
+        sampleArray = segment.astype(np.float64) / 2**31
+
+    return sampleArray.mean(axis=1)
+
+
+def writeWav(fullPath, segment, header):
+    '''
+    Writes a segment from getSegment() as a wav file
+    '''
+    numChannels = segment.shape[1]
+    if header.sampWidth == 3:
+        numChannels //= 3
+
+    outWave = wave.open(fullPath, "wb")
+    try:
+        outWave.setnchannels(numChannels)
+        outWave.setsampwidth(header.sampWidth)
+        outWave.setframerate(header.sampleRate)
+        outWave.writeframes(np.ascontiguousarray(segment).tobytes())
+    finally:
+        outWave.close()
+
+
+def extractSegments(wavFullPath, segmentList, singleChannelFlag=True):
+    '''
+    Writes many segments of one wav file, reading it only through a
+    memory map
+
+    segmentList holds (startTime, endTime, outputFullPath) triples.
+    '''
+    header = readWavHeader(wavFullPath)
+    wavArray = openWavArray(wavFullPath, header)
+
+    for startTime, endTime, outputFullPath in segmentList:
+        segment = getSegment(wavArray, header, startTime, endTime,
+                             singleChannelFlag)
+        writeWav(outputFullPath, segment, header)
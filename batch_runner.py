@@ -0,0 +1,310 @@
+
+# Runs the play task steps without any prompts, for unattended runs.
+#
+#     python batch_runner.py config.json [--summary summary.json]
+#
+# The config is a JSON object:
+#
+#     {"workingDirs": ["play_A", "play_B"],    # required
+#      "projectPath": "/data/results",         # workingDirs are relative to it
+#      "steps": ["f0Checks", "step1", "step3"],
+#      "sessions": {"play_A": ["CSDP_ID_012_P"]},  # default: every session
+#      "islevPath": "...", "praatScriptPath": "...", "praatExePath": "...",
+#      "pitch": {"minPitch": 75, "maxPitch": 750, "sampleStep": 0.01,
+#                "backend": "praat", "cachePath": null, "numProcesses": null,
+#                "chunkDuration": null},    # seconds; streams long tracks
+#      "epochDuration": null, "fusedFlag": false, "incrementalFlag": false,
+#      "binaryFlag": false,
+#      "speechRateFlag": false,  # step1 also finds the syllable nuclei
+#      "numConcurrent": 1,     # working directories run at once
+#      "numWorkers": null}     # worker processes per working directory
+#
+# The steps are run in the order given for each working directory; a
+# failed step stops that directory but not the others.  Each directory's
+# output goes to batch_run.log in it.  A JSON summary is printed at the
+# end (and written to --summary); the exit status is 0 if every step of
+# every directory succeeded, 1 otherwise and 2 if the config is invalid.
+
+import os
+from os.path import join
+
+import argparse
+import json
+import multiprocessing
+import Queue
+import sys
+import time
+import traceback
+
+import executor
+import get_F0_from_CSDP_MCRP_data
+import pitch_extraction
+
+LOG_FN = "batch_run.log"
+
+F0_CHECKS = "f0Checks"
+STEP1 = "step1"
+STEP3 = "step3"
+STEP_LIST = [F0_CHECKS, STEP1, STEP3]
+
+_defaultConfig = {"projectPath": "",
+                  "steps": [STEP1],
+                  "sessions": {},
+                  "islevPath": None,
+                  "praatScriptPath": None,
+                  "praatExePath": None,
+                  "pitch": {},
+                  "epochDuration": None,
+                  "fusedFlag": False,
+                  "incrementalFlag": False,
+                  "binaryFlag": False,
+                  "speechRateFlag": False,
+                  "numConcurrent": 1,
+                  "numWorkers": None,
+                  }
+
+_defaultPitchConfig = {"minPitch": 75,
+                       "maxPitch": 750,
+                       "sampleStep": 0.01,
+                       "backend": pitch_extraction.PRAAT,
+                       "cachePath": None,
+                       "numProcesses": None,
+                       "chunkDuration": None,
+                       }
+
+
+class ConfigError(Exception):
+    pass
+
+
+def loadConfig(configFullPath):
+    '''
+    The config with defaults filled in; raises ConfigError if it's invalid
+    '''
+    try:
+        with open(configFullPath, "r") as fd:
+            userConfig = json.load(fd)
+    except (IOError, ValueError) as e:
+        raise ConfigError("Can't read %s: %s" % (configFullPath, e))
+
+    unknownList = sorted(set(userConfig.keys()) -
+                         set(_defaultConfig.keys() + ["workingDirs"]))
+    if len(unknownList) > 0:
+        raise ConfigError("Unknown settings: %s" % ", ".join(unknownList))
+
+    config = dict(_defaultConfig)
+    config.update(userConfig)
+    config["pitch"] = dict(_defaultPitchConfig, **config["pitch"])
+
+    if len(config.get("workingDirs", [])) == 0:
+        raise ConfigError("No workingDirs given")
+
+    for step in config["steps"]:
+        if step not in STEP_LIST:
+            raise ConfigError("Unknown step: %s (expected one of %s)" %
+                              (step, ", ".join(STEP_LIST)))
+
+    if STEP3 in config["steps"]:
+        requiredList = ["islevPath"]
+        if config["pitch"]["backend"] == pitch_extraction.PRAAT:
+            requiredList += ["praatScriptPath", "praatExePath"]
+        for key in requiredList:
+            if config[key] is None:
+                raise ConfigError("%s is needed for %s" % (key, STEP3))
+
+    for workingDir in config["workingDirs"]:
+        if not os.path.isdir(getWorkingPath(config, workingDir)):
+            raise ConfigError("No such working directory: %s" %
+                              getWorkingPath(config, workingDir))
+
+    return config
+
+
+def getWorkingPath(config, workingDir):
+    return join(config["projectPath"], workingDir)
+
+
+def runStep(config, step, workingPath, nameList):
+    '''
+    Runs one step over a working directory, returning its error list
+    '''
+    if step == F0_CHECKS:
+        return get_F0_from_CSDP_MCRP_data.playTask_F0Compare(workingPath)
+
+    if step == STEP1:
+        return get_F0_from_CSDP_MCRP_data.playTask_step1(workingPath,
+                                                         fusedFlag=config["fusedFlag"],
+                                                         epochDuration=config["epochDuration"],
+                                                         incrementalFlag=config["incrementalFlag"],
+                                                         speechRateFlag=config["speechRateFlag"],
+                                                         nameList=nameList)
+
+    pitchConfig = config["pitch"]
+    return get_F0_from_CSDP_MCRP_data.playTask_step3(workingPath,
+                                                     config["islevPath"],
+                                                     config["praatScriptPath"],
+                                                     config["praatExePath"],
+                                                     pitchCachePath=pitchConfig["cachePath"],
+                                                     numPraatProcesses=pitchConfig["numProcesses"],
+                                                     pitchBackend=pitchConfig["backend"],
+                                                     incrementalFlag=config["incrementalFlag"],
+                                                     binaryFlag=config["binaryFlag"],
+                                                     minPitch=pitchConfig["minPitch"],
+                                                     maxPitch=pitchConfig["maxPitch"],
+                                                     sampleStep=pitchConfig["sampleStep"],
+                                                     chunkDuration=pitchConfig["chunkDuration"],
+                                                     nameList=nameList)
+
+
+def runWorkingDir(config, workingDir):
+    '''
+    Runs every step over one working directory, returning its summary
+    '''
+    workingPath = getWorkingPath(config, workingDir)
+    nameList = config["sessions"].get(workingDir)
+
+    summary = {"workingDir": workingDir,
+               "path": workingPath,
+               "status": "ok",
+               "steps": [],
+               }
+    startTime = time.time()
+    for step in config["steps"]:
+        stepStartTime = time.time()
+        stepSummary = {"step": step, "status": "ok", "numErrors": 0,
+                       "error": None}
+        try:
+            errorList = runStep(config, step, workingPath, nameList)
+            if errorList:
+                stepSummary["status"] = "failed"
+                stepSummary["numErrors"] = len(errorList)
+        except Exception:
+            # A step that fails as a whole rather than per session
+            stepSummary["status"] = "failed"
+            stepSummary["error"] = traceback.format_exc()
+            print(stepSummary["error"])
+
+        stepSummary["seconds"] = time.time() - stepStartTime
+        summary["steps"].append(stepSummary)
+        if stepSummary["status"] != "ok":
+            summary["status"] = "failed"
+            break
+
+    summary["seconds"] = time.time() - startTime
+
+    return summary
+
+
+def _runWorkingDirInProcess(config, workingDir, resultQueue):
+    '''
+    Runs one working directory in its own process, logging to its folder
+    '''
+    try:
+        logFD = os.open(join(getWorkingPath(config, workingDir), LOG_FN),
+                        os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+
+        # Redirected at the descriptor level so that Praat and the worker
+        # processes log there too; nothing may ask for input
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(logFD, 1)
+        os.dup2(logFD, 2)
+        sys.stdin = open(os.devnull, "r")
+
+        executor.setWorkerOptions(numWorkers=config["numWorkers"])
+        summary = runWorkingDir(config, workingDir)
+    except Exception:
+        summary = {"workingDir": workingDir,
+                   "path": getWorkingPath(config, workingDir),
+                   "status": "failed",
+                   "steps": [],
+                   "error": traceback.format_exc(),
+                   }
+
+    sys.stdout.flush()
+    resultQueue.put(summary)
+
+
+def runBatch(config):
+    '''
+    Runs every working directory, numConcurrent at a time
+
+    Returns the summary of the whole run.
+    '''
+    startTime = time.time()
+    resultQueue = multiprocessing.Queue()
+
+    # Each directory gets its own (non-daemon) process, so that its stages
+    # can start their own worker pools
+    waitingList = list(config["workingDirs"])
+    processDict = {}
+    summaryDict = {}
+    while len(waitingList) > 0 or len(processDict) > 0:
+        while len(waitingList) > 0 and len(processDict) < config["numConcurrent"]:
+            workingDir = waitingList.pop(0)
+            process = multiprocessing.Process(target=_runWorkingDirInProcess,
+                                              args=(config, workingDir,
+                                                    resultQueue))
+            process.start()
+            processDict[workingDir] = process
+            print("Started %s" % workingDir)
+
+        try:
+            summary = resultQueue.get(timeout=5)
+        except Queue.Empty:
+            # A process that died without reporting (e.g. it was killed)
+            for workingDir, process in processDict.items():
+                if not process.is_alive() and resultQueue.empty():
+                    summary = {"workingDir": workingDir,
+                               "path": getWorkingPath(config, workingDir),
+                               "status": "failed",
+                               "steps": [],
+                               "error": "Exited with code %s" % process.exitcode,
+                               }
+                    break
+            else:
+                continue
+
+        processDict.pop(summary["workingDir"]).join()
+        summaryDict[summary["workingDir"]] = summary
+        print("Finished %s: %s" % (summary["workingDir"], summary["status"]))
+
+    summaryList = [summaryDict[workingDir]
+                   for workingDir in config["workingDirs"]]
+    isOK = all(summary["status"] == "ok" for summary in summaryList)
+
+    return {"status": "ok" if isOK else "failed",
+            "seconds": time.time() - startTime,
+            "workingDirs": summaryList,
+            }
+
+
+def main(argList=None):
+
+    parser = argparse.ArgumentParser(description="Runs the play task steps "
+                                                 "over working directories "
+                                                 "without prompting")
+    parser.add_argument("config", help="JSON config file")
+    parser.add_argument("--summary", default=None,
+                        help="where to also write the JSON summary")
+    args = parser.parse_args(argList)
+
+    try:
+        config = loadConfig(args.config)
+    except ConfigError as e:
+        print(json.dumps({"status": "invalid config", "error": str(e)}))
+        return 2
+
+    runSummary = runBatch(config)
+
+    summaryStr = json.dumps(runSummary, indent=1, sort_keys=True)
+    if args.summary is not None:
+        with open(args.summary, "w") as fd:
+            fd.write(summaryStr + "\n")
+    print(summaryStr)
+
+    return 0 if runSummary["status"] == "ok" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,411 @@
+# Checks the sweep and binary-search rewrites of the textgrid edits, and the
+# compiled label normalizer, against the straightforward versions they
+# replaced, on random inputs.
+#
+# Each check builds small random tiers--on a coarse grid, so that entries
+# often touch at their boundaries or are zero-length--and compares the
+# rewritten function with a reference that does the same edit the old way,
+# entry by entry, or with praatio's crop.  The normalizer is checked on
+# labels with balanced, unnested brackets; on others the old version could
+# raise.  The first mismatch of each check is printed and the exit status
+# is then 1.
+#
+# Usage: python check_equivalence.py --trials 5000 --seed 0
+
+import os
+
+import argparse
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import get_F0_from_CSDP_MCRP_data
+import interval_algebra
+import label_normalizer
+
+
+def _makeTier(rng, labelList, maxEntries, zeroLengthFlag=False):
+    '''
+    A random sorted, non-overlapping entry list on a grid of whole seconds
+
+    Gaps are often zero, so neighbouring entries often share a boundary.
+    '''
+    durationList = [1, 1, 2, 3]
+    if zeroLengthFlag:
+        durationList.append(0)
+
+    entryList = []
+    time = 0
+    for _ in range(rng.randint(0, maxEntries)):
+        time += rng.choice([0, 0, 1, 2])
+        duration = rng.choice(durationList)
+        entryList.append((float(time), float(time + duration),
+                          rng.choice(labelList)))
+        time += duration
+
+        # Two zero-length entries at the same time would overlap
+        if duration == 0:
+            time += 1
+
+    return entryList
+
+
+def _getEntries(entryList, start, stop, boundaryInclusive):
+    '''
+    As IntervalTier.getEntries()
+    '''
+    if boundaryInclusive:
+        return [entry for entry in entryList
+                if entry[0] <= stop and entry[1] >= start]
+    return [entry for entry in entryList
+            if entry[0] < stop and entry[1] > start]
+
+
+def _insertReplace(entryList, entry):
+    '''
+    As IntervalTier.insert() with collisionCode="replace"
+    '''
+    for match in _getEntries(entryList, entry[0], entry[1], False):
+        entryList.remove(match)
+    entryList.append(entry)
+    entryList.sort()
+
+
+def _cropEntries(entryList, cropStart, cropEnd):
+    '''
+    As IntervalTier.crop() (non-strict, not rebased to zero)
+    '''
+    return [(max(start, cropStart), min(stop, cropEnd), label)
+            for start, stop, label in entryList
+            if not (stop <= cropStart or start >= cropEnd)]
+
+
+def _subtractOverlapReference(startTime, endTime, label, cmprStart, cmprEnd):
+    '''
+    The case analysis of the old subtractOverlap()
+    
+    Its no-overlap branch raised a TypeError and the other branches assume
+    that cmprStart-cmprEnd overlaps or touches the interval; here an
+    interval that it doesn't reach is kept.
+    '''
+    returnList = []
+    if cmprEnd < startTime or cmprStart > endTime: # No overlap
+        returnList.append((startTime, endTime, label))
+    elif cmprStart <= startTime and cmprEnd >= endTime: # Crop entire region
+        pass
+    elif cmprStart <= startTime and cmprEnd < endTime: # Crop left edge
+        returnList.append((cmprEnd, endTime, label))
+    elif cmprStart > startTime and cmprEnd >= endTime: # Crop right edge
+        returnList.append((startTime, cmprStart, label))
+    else: # Interval divided in two
+        if cmprStart - startTime > cmprEnd - endTime:
+            leftLabel = label
+            rightLabel = '(pST)'
+        else:
+            leftLabel = '(nST)'
+            rightLabel = label
+        returnList.append((startTime, cmprStart, leftLabel))
+        returnList.append((cmprEnd, endTime, rightLabel))
+
+    return returnList
+
+
+def _subtractIntervalsReference(entryList, cmprEntryList):
+    '''
+    The old _isolateEntries(): each entry is cut by the cropped filter tier
+    
+    The old loop dropped the pieces after the first once an entry was cut
+    twice, and cut every piece under the entry's original label, so that a
+    label could end up on both sides of a second cut.  Here each piece is
+    cut in turn, under its own label.
+    '''
+    newEntryList = []
+    for start, stop, label in entryList:
+        resultList = [(start, stop, label)]
+        for subStart, subStop, subLabel in _cropEntries(cmprEntryList,
+                                                        start, stop):
+            tmpResultList = []
+            for tmpStart, tmpStop, tmpLabel in resultList:
+                tmpResultList.extend(_subtractOverlapReference(tmpStart,
+                                                               tmpStop,
+                                                               tmpLabel,
+                                                               subStart,
+                                                               subStop))
+            resultList = tmpResultList
+        newEntryList.extend(resultList)
+
+    return newEntryList
+
+
+def _mergeSpeechEntriesReference(origSpeechEntryList, laughEntryList,
+                                 laughSpeechEntryList):
+    '''
+    The speech tier edit that _mergePlayTextgrid made one span at a time
+    '''
+    speechEntryList = list(origSpeechEntryList)
+    for start, stop, label in laughEntryList:
+        laughSpeechMatches = []
+        for entry in _getEntries(speechEntryList, start, stop, True):
+            speechEntryList.remove(entry)
+            laughSpeechMatches.extend(_getEntries(laughSpeechEntryList,
+                                                  entry[0], entry[1], True))
+        for entry in laughSpeechMatches:
+            _insertReplace(speechEntryList, entry)
+
+    return speechEntryList
+
+
+def checkMergeSpeechEntries(rng):
+    '''
+    Overlapping and adjacent laughter spans, merged into the speech tier
+    '''
+    zeroLengthFlag = rng.random() < 0.3
+    argList = [_makeTier(rng, ["MS"], 6, zeroLengthFlag),
+               _makeTier(rng, ["LA"], 4, zeroLengthFlag),
+               _makeTier(rng, ["MS", "LA"], 6, zeroLengthFlag)]
+
+    expected = _mergeSpeechEntriesReference(*argList)
+    actual = get_F0_from_CSDP_MCRP_data._mergeSpeechEntries(*argList)
+
+    return argList, expected, actual
+
+
+def checkReplaceIntervals(rng):
+    '''
+    Laughter spans merged into the laughter tier, as by repeated inserts
+    '''
+    zeroLengthFlag = rng.random() < 0.3
+    argList = [_makeTier(rng, ["LA", "x"], 6, zeroLengthFlag),
+               _makeTier(rng, ["LA"], 4, zeroLengthFlag)]
+
+    expected = list(argList[0])
+    for entry in argList[1]:
+        _insertReplace(expected, entry)
+    actual = interval_algebra.replaceIntervals(*argList)
+
+    return argList, expected, actual
+
+
+def checkSubtractIntervals(rng):
+    '''
+    Speech with touching, zero-length and split-causing filter intervals
+    '''
+    zeroLengthFlag = rng.random() < 0.3
+    argList = [_makeTier(rng, ["MS"], 4, zeroLengthFlag),
+               _makeTier(rng, ["CS"], 8, zeroLengthFlag)]
+
+    # Split intervals on a finer grid, so that the (pST)/(nST) rule has
+    # both outcomes
+    if rng.random() < 0.5:
+        argList[1] = [(start + 0.5, max(start + 0.5, stop + 0.25), label)
+                      for start, stop, label in argList[1]]
+
+    expected = _subtractIntervalsReference(*argList)
+    actual = interval_algebra.subtractIntervals(*argList)
+
+    return argList, expected, actual
+
+
+def checkIntervalIndex(rng):
+    '''
+    Overlap queries, as cropping the laughter tier to the query interval
+    '''
+    # The indexed intervals may overlap one another
+    entryList = (_makeTier(rng, ["LA"], 4, True) +
+                 _makeTier(rng, ["LA"], 4, True))
+    queryList = [(start, stop) for start, stop, label
+                 in _makeTier(rng, ["MS"], 6, True)]
+
+    index = interval_algebra.IntervalIndex(entryList)
+    sortedList = sorted(entryList)
+
+    expected = []
+    actual = []
+    for start, stop in queryList:
+        matchList = [entry for entry in sortedList
+                     if not (entry[1] <= start or entry[0] >= stop)]
+        expected.append((len(matchList) > 0, matchList))
+        actual.append((index.anyOverlap(start, stop),
+                       sorted(index.getOverlaps(start, stop))))
+
+    return [entryList, queryList], expected, actual
+
+
+def _makeWindowList(rng):
+    '''
+    Random (start, stop) windows, possibly overlapping and out of order
+    '''
+    windowList = [(start, stop) for start, stop, label
+                  in _makeTier(rng, ["E"], 5, True)]
+    if rng.random() < 0.3:
+        windowList.extend([(start - 0.5, stop + 1) for start, stop
+                           in windowList])
+    rng.shuffle(windowList)
+
+    return windowList
+
+
+def checkCropToWindows(rng):
+    '''
+    Each window cropped out of an interval tier and a point tier
+    '''
+    windowList = _makeWindowList(rng)
+    entryList = _makeTier(rng, ["MS", "LA"], 8, True)
+    pointList = [(float(rng.randint(0, 20)) / 2, "p")
+                 for _ in range(rng.randint(0, 8))]
+    pointList = sorted(set(pointList))
+
+    expected = []
+    for cropStart, cropEnd in windowList:
+        # Points on a window boundary belong to the window
+        expected.append((_cropEntries(entryList, cropStart, cropEnd),
+                         [point for point in pointList
+                          if cropStart <= point[0] <= cropEnd]))
+    actual = list(zip(interval_algebra.cropToWindows(windowList, entryList),
+                      interval_algebra.cropPointsToWindows(windowList,
+                                                           pointList)))
+
+    return [windowList, entryList, pointList], expected, actual
+
+
+def checkSumLabelPerWindow(rng):
+    '''
+    Duration and count of one label per window, as by cropping each window
+    '''
+    windowList = _makeWindowList(rng)
+    entryList = _makeTier(rng, ["MS", "FP"], 8, True)
+
+    expected = []
+    for cropStart, cropEnd in windowList:
+        matchList = [entry for entry in _cropEntries(entryList, cropStart,
+                                                     cropEnd)
+                     if entry[2] == "MS"]
+        expected.append((sum([stop - start for start, stop, label
+                              in matchList]), len(matchList)))
+    actual = interval_algebra.sumLabelPerWindow(windowList, entryList, "MS")
+
+    return [windowList, entryList], expected, actual
+
+
+def _matchDemarker(label, startMarker, endMarker, subLabel=None):
+
+    startIndex = 0
+    while True:
+        try:
+            startIndex = label.index(startMarker, startIndex)
+        except ValueError:
+            break
+
+        endIndex = label.index(endMarker, startIndex)
+
+        if subLabel is None or subLabel in label[startIndex:endIndex]:
+            label = label[:startIndex] + label[endIndex+1:]
+        else:
+            startIndex = endIndex
+
+    return label
+
+
+def _normalizeLabelReference(label):
+    '''
+    The old _filterLabelFunction(), one rule at a time
+    '''
+    label = label.lower()
+
+    for char in ['.', '!', '?', ',', "' ", " '", ';', ',', '--', 'nc', '(nc)',
+                 '`']:
+        label = label.replace(char, ' ')
+
+    label = label.replace('(', '<')
+    label = label.replace(')', '>')
+
+    for mode in label_normalizer.SPEECH_MODE_LIST:
+        label = label.replace(mode, ' ')
+
+    label = _matchDemarker(label, '<', '>', 'voice')
+
+    for subLabel in label_normalizer.SPECIFIC_TAG_LIST:
+        label = label.replace(subLabel, ' ')
+
+    label = label.strip()
+    label = _matchDemarker(label, '[', ']')
+
+    if '<' in label:
+        start = label.index('<')
+        end = label.index('>')
+        label = label[:start] + label[end+1:]
+
+    return label
+
+
+_TOKEN_LIST = ["hi", "Mommy", "don't", "ya", "nice", "voice", "nc",
+               ".", "!", "?", ",", ";", "--", "`", "'", "(nc)",
+               "<normal voice>", "(funny voice)", "(whispers)", "<laughing>",
+               "<sad voice>", "<Back to normal>", "<not sure if correct>",
+               "<unclear>", "(coughs)", "[inaudible]", "[hi, there]"]
+
+
+def checkNormalizeLabel(rng):
+    '''
+    Labels with balanced, unnested brackets give the same words
+    '''
+    tokenList = [rng.choice(_TOKEN_LIST) for _ in range(rng.randint(0, 8))]
+    label = "".join(token + rng.choice(["", " ", " ", "  "])
+                    for token in tokenList)
+
+    label_normalizer._labelCache.clear()
+    expected = _normalizeLabelReference(label).split()
+    actual = label_normalizer.normalizeLabel(label).split()
+
+    return [label], expected, actual
+
+
+CHECK_LIST = [checkMergeSpeechEntries, checkReplaceIntervals,
+              checkSubtractIntervals, checkIntervalIndex, checkCropToWindows,
+              checkSumLabelPerWindow, checkNormalizeLabel]
+
+
+def runChecks(numTrials, seed):
+    '''
+    Runs each check numTrials times; returns the number of checks that failed
+    '''
+    numFailed = 0
+    for check in CHECK_LIST:
+        rng = random.Random(seed)
+        numMismatches = 0
+        for _ in range(numTrials):
+            argList, expected, actual = check(rng)
+            if expected == actual:
+                continue
+
+            if numMismatches == 0:
+                print("MISMATCH %s" % check.__name__)
+                print("  args:     %r" % (argList,))
+                print("  expected: %r" % (expected,))
+                print("  actual:   %r" % (actual,))
+            numMismatches += 1
+
+        print("%-32s %d/%d mismatches" % (check.__name__, numMismatches,
+                                          numTrials))
+        if numMismatches > 0:
+            numFailed += 1
+
+    return numFailed
+
+
+def main(argList=None):
+
+    parser = argparse.ArgumentParser(description="Checks the rewritten "
+                                                 "textgrid edits against "
+                                                 "their old versions")
+    parser.add_argument("--trials", type=int, default=5000,
+                        help="random inputs per check")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argList)
+
+    return 1 if runChecks(args.trials, args.seed) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+
+# Generates a synthetic CSDP working directory for benchmarking, since the
+# real recordings can't leave the lab.  Each session gets:
+#
+# - wavs/<name>.wav: a mono 16-bit recording with a voice-like harmonic
+#   tone during the mother's speech and low-level noise elsewhere
+# - textgrids_intervals_marked/<name>.TextGrid: Mother, Mother's
+#   Backchannel, Child, Room and Epochs tiers
+# - epochs/<name>.txt: the epochs, as generateEpochFiles() writes them
+# - praat_f0_min_75_max_750/<name>.txt: a pitch track, as Praat writes it
+#
+# Event densities are those of a typical play session: the mother speaks
+# for about half of the time in utterances of a second or two, with
+# occasional filled pauses and laughter; the child and room noise are
+# sparser.  The same seed always gives the same corpus.
+#
+# Usage: python generate_corpus.py <outputPath> <numSessions> [<duration>]
+
+import os
+from os.path import join
+
+import random
+import sys
+import wave
+
+import numpy as np
+
+from praatio import praatio
+
+SESSION_NAME = "CSDP_ID_%03d_P"
+EPOCH_DURATION = 30
+SAMPLE_RATE = 16000
+PITCH_STEP = 0.01
+
+# (tier name, mean gap, mean duration, labels and their weights)
+TIER_SPEC_LIST = [("Mother", 1.2, 1.4, [("MS", 0.9), ("FP", 0.1)]),
+                  ("Mother's Backchannel", 20.0, 0.8, [("LA", 0.8),
+                                                       ("MS", 0.2)]),
+                  ("Child", 6.0, 1.0, [("CS", 1.0)]),
+                  ("Room", 25.0, 2.0, [("noise", 1.0)]),
+                  ]
+
+
+def _chooseLabel(rng, labelList):
+
+    value = rng.random()
+    for label, weight in labelList:
+        value -= weight
+        if value < 0:
+            return label
+
+    return labelList[-1][0]
+
+
+def generateEntries(rng, duration, meanGap, meanDuration, labelList):
+    '''
+    Non-overlapping intervals with exponential gaps and lognormal durations
+    '''
+    entryList = []
+    time = rng.expovariate(1.0 / meanGap)
+    while True:
+        entryDuration = rng.lognormvariate(np.log(meanDuration), 0.5)
+        stop = time + entryDuration
+        if stop >= duration:
+            break
+        entryList.append((round(time, 3), round(stop, 3),
+                          _chooseLabel(rng, labelList)))
+        time = stop + rng.expovariate(1.0 / meanGap)
+
+    return entryList
+
+
+def generateEpochs(duration):
+
+    epochList = []
+    for i, start in enumerate(range(0, int(duration), EPOCH_DURATION)):
+        stop = min(start + EPOCH_DURATION, duration)
+        epochList.append((float(start), float(stop), "%02d" % (i + 1)))
+
+    return epochList
+
+
+def _getF0Contour(timeArray, entryList, baseF0List):
+    '''
+    f0 for each time: a falling contour in each utterance, zero elsewhere
+    '''
+    f0Array = np.zeros(len(timeArray))
+    for (start, stop, label), baseF0 in zip(entryList, baseF0List):
+        i, j = np.searchsorted(timeArray, [start, stop])
+        if i == j:
+            continue
+        
+        # The contour is set by the utterance's times, so that it's the
+        # same however timeArray is sampled
+        fractionArray = (timeArray[i:j] - start) / (stop - start)
+        f0Array[i:j] = baseF0 * (1.15 - 0.3 * fractionArray)
+
+    return f0Array
+
+
+def writeWav(fullPath, duration, entryList, baseF0List, seed,
+             chunkDuration=60):
+    '''
+    Writes the recording chunkDuration seconds at a time to bound memory
+    '''
+    numSamples = int(duration * SAMPLE_RATE)
+    chunkSize = int(chunkDuration * SAMPLE_RATE)
+    noiseRNG = np.random.RandomState(seed)
+
+    wavFile = wave.open(fullPath, "wb")
+    wavFile.setnchannels(1)
+    wavFile.setsampwidth(2)
+    wavFile.setframerate(SAMPLE_RATE)
+
+    phase = 0.0
+    for chunkStart in range(0, numSamples, chunkSize):
+        sampleIArray = np.arange(chunkStart, min(chunkStart + chunkSize,
+                                                 numSamples))
+        timeArray = sampleIArray / float(SAMPLE_RATE)
+        f0Array = _getF0Contour(timeArray, entryList, baseF0List)
+
+        # A few harmonics of the running f0, plus background noise
+        phaseArray = phase + 2 * np.pi * np.cumsum(f0Array) / SAMPLE_RATE
+        phase = phaseArray[-1]
+        signalArray = sum(np.sin(k * phaseArray) / k for k in range(1, 4))
+        signalArray = (0.3 * signalArray +
+                       0.01 * noiseRNG.standard_normal(len(sampleIArray)))
+        sampleArray = np.clip(signalArray * 32767, -32768, 32767).astype("<i2")
+        wavFile.writeframes(sampleArray.tobytes())
+
+    wavFile.close()
+
+
+def writePitchTrack(fullPath, duration, entryList, baseF0List, seed):
+
+    timeArray = np.arange(PITCH_STEP, duration, PITCH_STEP)
+    f0Array = _getF0Contour(timeArray, entryList, baseF0List)
+
+    # Octave jumps, as a real tracker would make, for the median filter
+    voicedArray = np.flatnonzero(f0Array > 0)
+    isJump = np.random.RandomState(seed).rand(len(voicedArray)) < 0.02
+    f0Array[voicedArray[isJump]] *= 2
+
+    intensityArray = np.where(f0Array > 0, 70.0, 40.0)
+
+    outputList = ["%0.6f,%0.3f,%0.3f" % row
+                  for row in zip(timeArray.tolist(), f0Array.tolist(),
+                                 intensityArray.tolist())]
+    open(fullPath, "w").write("\n".join(outputList) + "\n")
+
+
+def generateSession(outputPath, name, duration, seed):
+
+    rng = random.Random(seed)
+
+    tg = praatio.Textgrid()
+    tierDict = {}
+    for tierName, meanGap, meanDuration, labelList in TIER_SPEC_LIST:
+        entryList = generateEntries(rng, duration, meanGap, meanDuration,
+                                    labelList)
+        tierDict[tierName] = entryList
+        tg.addTier(praatio.IntervalTier(tierName, entryList, 0, duration))
+
+    epochList = generateEpochs(duration)
+    tg.addTier(praatio.IntervalTier("Epochs", epochList, 0, duration))
+    tg.save(join(outputPath, "textgrids_intervals_marked",
+                 name + ".TextGrid"))
+
+    with open(join(outputPath, "epochs", name + ".txt"), "w") as epochFile:
+        for start, stop, label in epochList:
+            epochFile.write(str(label) + ',' + str(start) + ',' + str(stop) + '\n')
+
+    speechList = [entry for entry in tierDict["Mother"] if entry[2] == "MS"]
+    baseF0List = [rng.uniform(180, 320) for entry in speechList]
+    writeWav(join(outputPath, "wavs", name + ".wav"), duration, speechList,
+             baseF0List, rng.randint(0, 2 ** 31 - 1))
+    writePitchTrack(join(outputPath, "praat_f0_min_75_max_750", name + ".txt"),
+                    duration, speechList, baseF0List,
+                    rng.randint(0, 2 ** 31 - 1))
+
+
+def generateCorpus(outputPath, numSessions, duration=600, seed=0):
+    '''
+    Writes numSessions sessions of duration seconds each to outputPath
+
+    Returns the session names.
+    '''
+    for folder in ["wavs", "textgrids_intervals_marked", "epochs",
+                   "praat_f0_min_75_max_750"]:
+        if not os.path.exists(join(outputPath, folder)):
+            os.makedirs(join(outputPath, folder))
+
+    nameList = []
+    for i in range(numSessions):
+        name = SESSION_NAME % (i + 1)
+        generateSession(outputPath, name, duration, seed * 100003 + i)
+        nameList.append(name)
+
+    return nameList
+
+
+if __name__ == "__main__":
+
+    duration = 600
+    if len(sys.argv) > 3:
+        duration = float(sys.argv[3])
+    generateCorpus(sys.argv[1], int(sys.argv[2]), duration)
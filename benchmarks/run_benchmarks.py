@@ -0,0 +1,312 @@
+
+# Times the general_CSDP_MCRP stages on a synthetic corpus (see
+# generate_corpus.py) at several corpus sizes.
+#
+# One corpus of the largest size is generated and each size runs on the
+# first n sessions of it, through the stages' nameList.  Each stage is
+# timed repeat times at each size and the fastest run is kept.  The report
+# gives the time per stage and size, the time per session and the scaling
+# exponent (the slope of log time against log size: 1 is linear).
+#
+# With --baseline, the times are compared against a stored report and any
+# stage that is more than --tolerance slower at some size is flagged as a
+# regression; the exit status is then 1.  --save-baseline stores this
+# run's report as the new baseline.
+#
+# Usage: python run_benchmarks.py --sizes 2 4 8 --duration 300
+#                                 --baseline baseline.json
+
+import os
+from os.path import join
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import executor
+import general_CSDP_MCRP
+import generate_corpus
+
+TG_FOLDER = "textgrids_intervals_marked"
+
+
+def _runStage(stageName, path, nameList):
+    '''
+    Runs one stage over the sessions in nameList
+
+    Stages run in pipeline order, so each one's inputs exist by the time
+    it runs.
+    '''
+    g = general_CSDP_MCRP
+
+    if stageName == "generateEpochFiles":
+        return g.generateEpochFiles(join(path, TG_FOLDER), join(path, "wavs"),
+                                    join(path, "epochs_from_textgrids"),
+                                    nameList=nameList)
+    elif stageName == "processTextgrids":
+        return g.processTextgrids(path, TG_FOLDER, nameList=nameList)
+    elif stageName == "processTextgridsFused":
+        return g.processTextgrids(path, TG_FOLDER, fusedFlag=True,
+                                  nameList=nameList)
+    elif stageName == "isolateMotherSpeech":
+        return g.isolateMotherSpeech(join(path, "textgrids_w_epochs_final_non_isolated"),
+                                     "Child",
+                                     join(path, "textgrids_w_epochs_filtered_for_child_speech"),
+                                     nameList=nameList)
+    elif stageName == "filterTextgrids":
+        return g.filterTextgrids(join(path, "textgrids_w_renamed_tiers"),
+                                 "Mother", "Mother's Backchannel", 0.15,
+                                 join(path, "textgrids_w_epochs_final_non_isolated"),
+                                 nameList=nameList)
+    elif stageName == "simplifyTextgrids":
+        return g.simplifyTextgrids(join(path, "textgrids_w_epochs_final_isolated"),
+                                   join(path, "textgrids_two_tags"),
+                                   nameList=nameList)
+    elif stageName == "extractTGInfo":
+        return g.extractTGInfo(join(path, "textgrids_w_epochs_final_isolated"),
+                               join(path, "tg_info"), "Mother",
+                               "Mother's Backchannel", False,
+                               nameList=nameList)
+    elif stageName == "eventStructurePerEpoch":
+        return g.eventStructurePerEpoch(join(path, "epochs"),
+                                        join(path, "textgrids_two_tags"),
+                                        join(path, "textgrids_w_epochs_filtered_for_child_speech_two_label"),
+                                        join(path, "textgrids_w_epochs_filtered_for_room_noise_two_label"),
+                                        join(path, "textgrids_w_epochs_final_non_isolated_two_label"),
+                                        join(path, "event_frequency_and_duration"),
+                                        "Mother", "Mother's Backchannel",
+                                        nameList=nameList)
+    elif stageName == "medianFilterPitch":
+        windowList = [(windowSize,
+                       join(path, "praat_f0_75_750_median_filtered_%d" % windowSize))
+                      for windowSize in [5, 9, 49]]
+        return g.medianFilterPitch(join(path, "praat_f0_min_75_max_750"),
+                                   windowList, nameList=nameList)
+    elif stageName == "extractPraatPitchForEpochs":
+        return g.extractPraatPitchForEpochs(join(path, "praat_f0_75_750_median_filtered_9"),
+                                            join(path, "epochs"),
+                                            join(path, "tg_info"),
+                                            join(path, "praat_f0_75_750_median_filtered_9_for_epochs"),
+                                            nameList=nameList)
+    elif stageName == "extractPraatPitchForEpochsStreaming":
+        return g.extractPraatPitchForEpochs(join(path, "praat_f0_75_750_median_filtered_9"),
+                                            join(path, "epochs"),
+                                            join(path, "tg_info"),
+                                            join(path, "praat_f0_75_750_median_filtered_9_for_epochs"),
+                                            chunkDuration=300,
+                                            nameList=nameList)
+    elif stageName == "extractMotherSpeech":
+        return g.extractMotherSpeech(join(path, "wavs"),
+                                     join(path, "textgrids_two_tags"),
+                                     "Mother",
+                                     join(path, "wavs_subset_mothers_speech"),
+                                     join(path, "textgrids_subset_mothers_speech"),
+                                     nameList=nameList)
+    elif stageName == "generateEpochRowHeader":
+        return g.generateEpochRowHeader(join(path, "epochs"),
+                                        join(path, "epoch_row_header"), "P",
+                                        nameList=nameList)
+
+    raise ValueError("Unknown stage: %s" % stageName)
+
+
+# In the order they can run in
+STAGE_NAME_LIST = ["generateEpochFiles",
+                   "processTextgridsFused",
+                   "processTextgrids",
+                   "filterTextgrids",
+                   "isolateMotherSpeech",
+                   "simplifyTextgrids",
+                   "extractTGInfo",
+                   "eventStructurePerEpoch",
+                   "medianFilterPitch",
+                   "extractPraatPitchForEpochs",
+                   "extractPraatPitchForEpochsStreaming",
+                   "extractMotherSpeech",
+                   "generateEpochRowHeader",
+                   ]
+
+
+def timeStage(stageName, path, nameList, repeat):
+    '''
+    The fastest of repeat runs, in seconds, and the number of failed files
+    '''
+    timeList = []
+    numErrors = 0
+    for i in range(repeat):
+        startTime = time.time()
+        errorList = _runStage(stageName, path, nameList)
+        timeList.append(time.time() - startTime)
+        if errorList is not None:
+            numErrors = len(errorList)
+
+    return min(timeList), numErrors
+
+
+def getScalingExponent(sizeList, timeList):
+    '''
+    The slope of log time against log size (1 for linear scaling)
+    '''
+    if len(sizeList) < 2 or min(timeList) <= 0:
+        return None
+
+    return float(np.polyfit(np.log(sizeList), np.log(timeList), 1)[0])
+
+
+def runBenchmarks(path, sizeList, duration, repeat=1, stageNameList=None,
+                  seed=0, quietFlag=True):
+    '''
+    Times each stage at each corpus size, returning the report
+    '''
+    if stageNameList is None:
+        stageNameList = STAGE_NAME_LIST
+    sizeList = sorted(sizeList)
+
+    print("Generating %d sessions of %ds" % (sizeList[-1], duration))
+    allNameList = generate_corpus.generateCorpus(path, sizeList[-1], duration,
+                                                 seed)
+
+    timeDict = dict((stageName, {}) for stageName in stageNameList)
+    errorDict = dict((stageName, {}) for stageName in stageNameList)
+    for size in sizeList:
+        nameList = allNameList[:size]
+        for stageName in stageNameList:
+
+            # The stages print each file they process
+            stdout = sys.stdout
+            if quietFlag:
+                sys.stdout = open(os.devnull, "w")
+            try:
+                seconds, numErrors = timeStage(stageName, path, nameList,
+                                               repeat)
+            finally:
+                if quietFlag:
+                    sys.stdout.close()
+                sys.stdout = stdout
+
+            timeDict[stageName][str(size)] = seconds
+            errorDict[stageName][str(size)] = numErrors
+            print("%d sessions  %-28s %8.3fs" % (size, stageName, seconds))
+
+    stageDict = {}
+    for stageName in stageNameList:
+        timeList = [timeDict[stageName][str(size)] for size in sizeList]
+        stageDict[stageName] = {"seconds": timeDict[stageName],
+                                "secondsPerSession": dict((str(size), seconds / size)
+                                                          for size, seconds
+                                                          in zip(sizeList, timeList)),
+                                "errors": errorDict[stageName],
+                                "scalingExponent": getScalingExponent(sizeList,
+                                                                      timeList),
+                                }
+
+    return {"sizes": sizeList,
+            "duration": duration,
+            "repeat": repeat,
+            "numWorkers": executor.getNumWorkers(),
+            "stages": stageDict,
+            }
+
+
+def findRegressions(report, baseline, tolerance, minSeconds=0.05):
+    '''
+    (stageName, size, seconds, baselineSeconds) for each regression
+
+    A stage regresses at a size if it is more than tolerance (a fraction)
+    slower than the baseline and more than minSeconds slower, so timer
+    noise on very fast stages isn't flagged.
+    '''
+    regressionList = []
+    for stageName, stageReport in sorted(report["stages"].items()):
+        baselineStage = baseline["stages"].get(stageName)
+        if baselineStage is None:
+            continue
+        for size, seconds in sorted(stageReport["seconds"].items()):
+            baselineSeconds = baselineStage["seconds"].get(size)
+            if baselineSeconds is None:
+                continue
+            if (seconds > baselineSeconds * (1 + tolerance) and
+                    seconds - baselineSeconds > minSeconds):
+                regressionList.append((stageName, int(size), seconds,
+                                       baselineSeconds))
+
+    return regressionList
+
+
+def main(argList=None):
+
+    parser = argparse.ArgumentParser(description="Times the CSDP stages on "
+                                                 "a synthetic corpus")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4],
+                        help="corpus sizes, in sessions")
+    parser.add_argument("--duration", type=float, default=300,
+                        help="seconds per session")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--stages", nargs="+", default=None,
+                        choices=STAGE_NAME_LIST)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--work-dir", default=None,
+                        help="where to put the corpus (default: a temporary "
+                             "folder, deleted afterwards)")
+    parser.add_argument("--output", default=None,
+                        help="where to write the report (JSON)")
+    parser.add_argument("--baseline", default=None,
+                        help="report to check for regressions against")
+    parser.add_argument("--save-baseline", default=None,
+                        help="where to store this report as a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown against the baseline, as a "
+                             "fraction")
+    parser.add_argument("--verbose", action="store_true",
+                        help="show the stages' own output")
+    args = parser.parse_args(argList)
+
+    executor.setWorkerOptions(numWorkers=args.workers)
+
+    path = args.work_dir
+    if path is None:
+        path = tempfile.mkdtemp(prefix="csdp_benchmark_")
+    try:
+        report = runBenchmarks(path, args.sizes, args.duration, args.repeat,
+                               args.stages, quietFlag=not args.verbose)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(path)
+
+    print("\n%-28s %10s  %s" % ("stage", "exponent", "s/session"))
+    for stageName in sorted(report["stages"].keys()):
+        stageReport = report["stages"][stageName]
+        exponent = stageReport["scalingExponent"]
+        exponentStr = "-" if exponent is None else "%0.2f" % exponent
+        perSessionStr = "  ".join("%s:%0.3f" % (size, stageReport["secondsPerSession"][str(size)])
+                                  for size in report["sizes"])
+        print("%-28s %10s  %s" % (stageName, exponentStr, perSessionStr))
+
+    for outputFN in [args.output, args.save_baseline]:
+        if outputFN is not None:
+            with open(outputFN, "w") as fd:
+                json.dump(report, fd, indent=1, sort_keys=True)
+
+    if args.baseline is None:
+        return 0
+
+    with open(args.baseline, "r") as fd:
+        baseline = json.load(fd)
+    regressionList = findRegressions(report, baseline, args.tolerance)
+    for stageName, size, seconds, baselineSeconds in regressionList:
+        print("REGRESSION %s at %d sessions: %0.3fs (baseline %0.3fs)" %
+              (stageName, size, seconds, baselineSeconds))
+
+    return 1 if len(regressionList) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+
+# A binary alternative to the comma-separated intermediate files (pitch
+# tracks, tg_info and epochs).  Each session is one .npy file holding a
+# structured array; its field names and types are the schema and are
+# checked on loading.  The files can be memory-mapped, so a stage reads
+# only the columns it uses and never parses text.
+#
+# The text files remain the format that the pyacoustics stages and
+# aggregate_features read.  A binary folder sits next to its text folder
+# (see getBinaryPath()) and is written by textToBinary().  Readers use
+# loadTable(), which takes either folder.
+
+import os
+from os.path import join
+
+import codecs
+import itertools
+
+import numpy as np
+
+from pyacoustics.utilities import utils
+from pyacoustics.intensity_and_pitch import praat_pi
+
+import executor
+
+BINARY_EXT = ".npy"
+TEXT_EXT = ".txt"
+
+# Schemas
+PITCH = "pitch"
+TG_INFO = "tg_info"
+EPOCHS = "epochs"
+
+# Label columns are unicode; their width is set per file
+_schemaDict = {PITCH: [("time", "<f8"), ("f0", "<f8"), ("intensity", "<f8")],
+               TG_INFO: [("start", "<f8"), ("stop", "<f8"), ("label", "U")],
+               EPOCHS: [("epoch", "U"), ("start", "<f8"), ("stop", "<f8")],
+               }
+
+
+def getBinaryPath(path):
+    '''
+    The folder for the binary version of the text folder path
+    '''
+    return os.path.normpath(path) + "_npy"
+
+
+def getDtype(schemaName, columnList):
+    '''
+    The dtype for schemaName, with label columns wide enough for columnList
+    '''
+    dtypeList = []
+    for (fieldName, fieldType), column in zip(_schemaDict[schemaName],
+                                              columnList):
+        if fieldType == "U":
+            width = max([len(value) for value in column] + [1])
+            fieldType = "U%d" % width
+        dtypeList.append((fieldName, fieldType))
+
+    return np.dtype(dtypeList)
+
+
+def makeTable(schemaName, columnList):
+    '''
+    A structured array from one sequence per column of the schema
+    '''
+    dtype = getDtype(schemaName, columnList)
+    numRows = len(columnList[0]) if len(columnList) > 0 else 0
+
+    table = np.zeros(numRows, dtype=dtype)
+    for fieldName, column in zip(dtype.names, columnList):
+        table[fieldName] = column
+
+    return table
+
+
+def _checkSchema(table, schemaName, fullPath):
+
+    fieldNameList = [fieldName for fieldName, fieldType
+                     in _schemaDict[schemaName]]
+    if table.dtype.names is None or list(table.dtype.names) != fieldNameList:
+        raise ValueError("%s does not hold a %s table" % (fullPath,
+                                                          schemaName))
+
+
+def saveTable(fullPath, schemaName, table):
+
+    _checkSchema(table, schemaName, fullPath)
+
+    # Written under a temporary name so an interrupted run never leaves a
+    # partial file behind.  np.save() adds the extension if it is missing.
+    tmpFullPath = fullPath + ".%d.tmp.npy" % os.getpid()
+    np.save(tmpFullPath, table)
+    os.rename(tmpFullPath, fullPath)
+
+
+def _readTextTable(path, fn, schemaName):
+
+    if schemaName == PITCH:
+        dataList = praat_pi.loadPitchAndTime(path, fn)
+        dataArray = np.array(dataList, dtype=np.float64).reshape(-1, 3)
+        columnList = [dataArray[:, 0], dataArray[:, 1], dataArray[:, 2]]
+    elif schemaName == TG_INFO:
+        # Labels may themselves contain commas
+        rowList = utils.openCSV(path, fn)
+        columnList = [[float(row[0]) for row in rowList],
+                      [float(row[1]) for row in rowList],
+                      [u",".join(row[2:]) for row in rowList]]
+    else:
+        rowList = utils.openCSV(path, fn)
+        columnList = [[row[0] for row in rowList],
+                      [float(row[1]) for row in rowList],
+                      [float(row[2]) for row in rowList]]
+
+    return makeTable(schemaName, columnList)
+
+
+def loadTable(path, name, schemaName, mmapFlag=True):
+    '''
+    The table for session name from either a binary or a text folder
+
+    If path holds <name>.npy, it is loaded (memory-mapped, with mmapFlag),
+    otherwise <name>.txt is parsed.  name may also be given with an
+    extension, which is ignored.
+    '''
+    name = os.path.splitext(name)[0]
+    binaryFullPath = join(path, name + BINARY_EXT)
+
+    if not os.path.exists(binaryFullPath):
+        return _readTextTable(path, name + TEXT_EXT, schemaName)
+
+    mmapMode = "r" if mmapFlag else None
+    table = np.load(binaryFullPath, mmap_mode=mmapMode)
+    _checkSchema(table, schemaName, binaryFullPath)
+
+    return table
+
+
+def iterTableBlocks(path, name, schemaName, blockSize=2**16):
+    '''
+    Yields the table for session name blockSize rows at a time
+
+    Like loadTable(), but only one block is ever in memory: a .npy file is
+    memory-mapped and sliced, and a text pitch track is parsed blockSize
+    lines at a time.  The other text tables are small and are yielded
+    whole.
+    '''
+    name = os.path.splitext(name)[0]
+    binaryFullPath = join(path, name + BINARY_EXT)
+
+    if os.path.exists(binaryFullPath):
+        table = loadTable(path, name, schemaName)
+        for i in xrange(0, len(table), blockSize):
+            yield table[i:i + blockSize]
+        return
+
+    if schemaName != PITCH:
+        yield _readTextTable(path, name + TEXT_EXT, schemaName)
+        return
+
+    # Parsed as praat_pi.loadPitchAndTime() does
+    with open(join(path, name + TEXT_EXT), "rU") as fd:
+        while True:
+            lineList = list(itertools.islice(fd, blockSize))
+            if len(lineList) == 0:
+                break
+            dataList = [[float(value) for value in line.split(",")]
+                        for line in lineList if line.strip() != ""]
+            dataArray = np.array(dataList, dtype=np.float64).reshape(-1, 3)
+            yield makeTable(PITCH, [dataArray[:, 0], dataArray[:, 1],
+                                    dataArray[:, 2]])
+
+
+def findTableNames(path, nameList=None):
+    '''
+    The sessions in path, a binary or a text folder
+
+    If nameList is given, only those sessions are returned.
+    '''
+    nameSet = set()
+    for ext in [BINARY_EXT, TEXT_EXT]:
+        nameSet.update(utils.findFiles(path, filterExt=ext, stripExt=True))
+
+    if nameList is not None:
+        nameSet &= set(nameList)
+
+    return sorted(nameSet)
+
+
+def _formatRow(schemaName, row):
+
+    if schemaName == TG_INFO:
+        # As written by general_CSDP_MCRP.extractTGInfo()
+        return u"%f,%f,%s" % row
+
+    return u",".join([value if isinstance(value, basestring) else repr(value)
+                      for value in row])
+
+
+def textToBinary(inputPath, schemaName, outputPath=None, nameList=None):
+    '''
+    Writes a .npy file for each text file in inputPath
+
+    outputPath defaults to getBinaryPath(inputPath).
+    '''
+    if outputPath is None:
+        outputPath = getBinaryPath(inputPath)
+    utils.makeDir(outputPath)
+
+    jobList = [(name, (inputPath, outputPath, schemaName, name))
+               for name in utils.findFiles(inputPath, filterExt=TEXT_EXT,
+                                           stripExt=True)
+               if nameList is None or name in nameList]
+    return executor.mapFiles(_textToBinaryForFile, jobList)[1]
+
+
+def _textToBinaryForFile(inputPath, outputPath, schemaName, name):
+
+    table = _readTextTable(inputPath, name + TEXT_EXT, schemaName)
+    saveTable(join(outputPath, name + BINARY_EXT), schemaName, table)
+
+
+def binaryToText(inputPath, outputPath, schemaName, nameList=None):
+    '''
+    Writes a text file for each .npy file in inputPath
+    '''
+    utils.makeDir(outputPath)
+
+    jobList = [(name, (inputPath, outputPath, schemaName, name))
+               for name in utils.findFiles(inputPath, filterExt=BINARY_EXT,
+                                           stripExt=True)
+               if nameList is None or name in nameList]
+    return executor.mapFiles(_binaryToTextForFile, jobList)[1]
+
+
+def _binaryToTextForFile(inputPath, outputPath, schemaName, name):
+
+    table = loadTable(inputPath, name, schemaName, mmapFlag=False)
+    outputList = [_formatRow(schemaName, row) for row in table.tolist()]
+
+    codecs.open(join(outputPath, name + TEXT_EXT), "w",
+                encoding="utf-8").write("\n".join(outputList) + "\n")
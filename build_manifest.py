@@ -0,0 +1,266 @@
+
+# Records, for each stage and session, the hashes of the files the stage
+# read and the parameters it was run with, so that a rerun only redoes the
+# sessions whose inputs or parameters have changed.
+#
+# A session's input files are the files in each input folder whose names,
+# minus the extension, match the session name (e.g. epochs/<name>.txt and
+# textgrids_two_tags/<name>.TextGrid).
+
+import os
+from os.path import join
+
+import hashlib
+import json
+
+MANIFEST_FN = "build_manifest.json"
+
+
+def getFileHash(fullPath, blockSize=2**20):
+    
+    hashObj = hashlib.sha1()
+    with open(fullPath, "rb") as fd:
+        while True:
+            data = fd.read(blockSize)
+            if not data:
+                break
+            hashObj.update(data)
+    
+    return hashObj.hexdigest()
+
+
+class FolderIndexCache(object):
+    '''
+    Folder listings kept across calls to BuildManifest.getStaleNames()
+
+    A caller checking one session at a time lists each folder only once.
+    A folder marked as changed is listed again only when a session being
+    checked is missing from it or one of its files is gone.
+    '''
+
+    def __init__(self):
+        self._indexDict = {}
+        self._changedSet = set()
+
+    def markChanged(self, path):
+        self._changedSet.add(path)
+
+    def getIndex(self, path, nameList=None):
+        '''
+        The _indexFolder() of path, listing it again if it has changed and
+        doesn't have every session in nameList (None for every session)
+        '''
+        folderIndex = self._indexDict.get(path)
+        if (folderIndex is None or
+                (path in self._changedSet and
+                 not _hasNames(path, folderIndex, nameList))):
+            folderIndex = _indexFolder(path)
+            self._indexDict[path] = folderIndex
+            self._changedSet.discard(path)
+
+        return folderIndex
+
+
+class BuildManifest(object):
+    '''
+    The build manifest for one working directory
+    '''
+
+    def __init__(self, path):
+        self.fullPath = join(path, MANIFEST_FN)
+
+        # stageName -> name -> {"params": paramStr, "inputs": {fullPath: hash}}
+        self.stageDict = {}
+
+        # fullPath -> [size, mtime, hash] so unchanged files aren't rehashed
+        self.hashDict = {}
+
+        if os.path.exists(self.fullPath):
+            with open(self.fullPath, "r") as fd:
+                data = json.load(fd)
+            self.stageDict = data["stages"]
+            self.hashDict = data["hashes"]
+
+        self._pendingDict = {}
+
+    def getCachedFileHash(self, fullPath):
+
+        statResult = os.stat(fullPath)
+        size, mtime = statResult.st_size, statResult.st_mtime
+
+        cached = self.hashDict.get(fullPath)
+        if cached is not None and cached[0] == size and cached[1] == mtime:
+            return cached[2]
+
+        fileHash = getFileHash(fullPath)
+        self.hashDict[fullPath] = [size, mtime, fileHash]
+
+        return fileHash
+
+    def _getInputHashes(self, folderIndexList, name):
+
+        inputDict = {}
+        for inputPath, folderIndex in folderIndexList:
+            for fn in folderIndex.get(name, []):
+                fullPath = join(inputPath, fn)
+                inputDict[fullPath] = self.getCachedFileHash(fullPath)
+
+        return inputDict
+
+    def getStaleNames(self, stageName, inputPathList, paramList,
+                      outputPath=None, nameList=None, folderIndexCache=None):
+        '''
+        The sessions that stageName needs to (re)process
+
+        The sessions are those in the first folder of inputPathList, or
+        those of nameList that are in it.  A session is stale if it hasn't
+        been built before, if any of its input files or paramList have
+        changed since, or--if outputPath is given--if it has no file in
+        outputPath.
+
+        The folders are listed on every call unless a FolderIndexCache is
+        given.
+        '''
+        if folderIndexCache is None:
+            folderIndexCache = FolderIndexCache()
+
+        folderIndexList = [(inputPath,
+                            folderIndexCache.getIndex(inputPath, nameList))
+                           for inputPath in inputPathList]
+
+        # A session's output is only ever written by the stage itself
+        outputIndex = None
+        if outputPath is not None:
+            outputIndex = folderIndexCache.getIndex(outputPath, [])
+
+        paramStr = _getParamStr(paramList)
+        recordDict = self.stageDict.get(stageName, {})
+
+        candidateList = folderIndexList[0][1].keys()
+        if nameList is not None:
+            candidateList = [name for name in nameList
+                             if name in folderIndexList[0][1]]
+
+        pendingDict = {}
+        for name in sorted(candidateList):
+            inputDict = self._getInputHashes(folderIndexList, name)
+            record = recordDict.get(name)
+
+            isStale = (record is None or
+                       record["params"] != paramStr or
+                       record["inputs"] != inputDict or
+                       (outputIndex is not None and name not in outputIndex))
+            if isStale:
+                pendingDict[name] = {"params": paramStr, "inputs": inputDict}
+
+        self._pendingDict.setdefault(stageName, {}).update(pendingDict)
+
+        return sorted(pendingDict.keys())
+
+    def record(self, stageName, errorList=None, nameList=None):
+        '''
+        Marks the sessions from getStaleNames() as built
+
+        Only the sessions in nameList are marked, if given.  Sessions in
+        errorList (a list of (fn, traceback)) are left stale.
+        '''
+        failedSet = set()
+        if errorList is not None:
+            failedSet = set(os.path.splitext(fn)[0] for fn, error in errorList)
+
+        pendingDict = self._pendingDict.get(stageName, {})
+        if nameList is None:
+            nameList = pendingDict.keys()
+
+        recordDict = self.stageDict.setdefault(stageName, {})
+        for name in nameList:
+            record = pendingDict.pop(name, None)
+            if record is None:
+                continue
+            if name in failedSet:
+                recordDict.pop(name, None)
+            else:
+                recordDict[name] = record
+
+    def save(self):
+
+        data = {"stages": self.stageDict, "hashes": self.hashDict}
+
+        # Write under a temporary name so an interrupted run never leaves
+        # a partial manifest
+        tmpFullPath = self.fullPath + ".tmp"
+        with open(tmpFullPath, "w") as fd:
+            json.dump(data, fd, indent=1, sort_keys=True)
+        os.rename(tmpFullPath, self.fullPath)
+
+
+def _indexFolder(path):
+    '''
+    Maps each name (filename minus extension) in a folder to its filenames
+    '''
+    folderIndex = {}
+    if not os.path.exists(path):
+        return folderIndex
+
+    for fn in os.listdir(path):
+        if fn.startswith(".") or not os.path.isfile(join(path, fn)):
+            continue
+        folderIndex.setdefault(os.path.splitext(fn)[0], []).append(fn)
+
+    return folderIndex
+
+
+def _hasNames(path, folderIndex, nameList):
+    '''
+    True if every session in nameList is in folderIndex and its files
+    still exist
+    '''
+    if nameList is None:
+        return False
+
+    for name in nameList:
+        fnList = folderIndex.get(name)
+        if fnList is None:
+            return False
+        for fn in fnList:
+            if not os.path.exists(join(path, fn)):
+                return False
+
+    return True
+
+
+def _getParamStr(paramList):
+    return json.dumps([repr(param) for param in paramList])
+
+
+def runStage(manifest, stageName, inputPathList, outputPath, paramList,
+             stageFunc, *argList, **kwargDict):
+    '''
+    Calls stageFunc(*argList, **kwargDict) for only the stale sessions
+
+    The sessions are passed to stageFunc with the nameList keyword.  If
+    manifest is None, stageFunc is simply run over every session.  The
+    manifest is saved after every stage, so an interrupted build loses
+    at most the stage that was running.
+    '''
+    if manifest is None:
+        return stageFunc(*argList, **kwargDict)
+
+    nameList = manifest.getStaleNames(stageName, inputPathList, paramList,
+                                      outputPath)
+    print("%s: %d sessions to build" % (stageName, len(nameList)))
+    if len(nameList) == 0:
+        manifest.record(stageName)
+        return []
+
+    kwargDict["nameList"] = nameList
+    errorList = stageFunc(*argList, **kwargDict)
+
+    # Sessions are only marked as built if the stage reports its errors
+    if isinstance(errorList, list):
+        manifest.record(stageName, errorList)
+    else:
+        manifest.record(stageName, nameList=[])
+    manifest.save()
+
+    return errorList
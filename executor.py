@@ -0,0 +1,142 @@
+
+import multiprocessing
+import traceback
+
+import instrumentation
+
+# Used by every stage in general_CSDP_MCRP.  A numWorkers of None means one
+# worker per core; a numWorkers of 1 runs everything in this process.
+_workerOptions = {"numWorkers": None,
+                  "chunkSize": 1,
+                  }
+
+
+def setWorkerOptions(numWorkers=None, chunkSize=1):
+    '''
+    Sets the worker count and chunk size used by mapFiles()
+
+    Larger chunks cut the overhead for stages with many small files.
+    '''
+    _workerOptions["numWorkers"] = numWorkers
+    _workerOptions["chunkSize"] = chunkSize
+
+
+def getNumWorkers():
+    numWorkers = _workerOptions["numWorkers"]
+    if numWorkers is None:
+        numWorkers = multiprocessing.cpu_count()
+
+    return numWorkers
+
+
+def _runJob(job):
+    '''
+    Runs one job, returning the error instead of raising it
+
+    The job's instrumentation record, if any, is returned with it.
+    '''
+    func, fn, argTuple, stageName = job
+    try:
+        result, record = instrumentation.measure(stageName, fn, func,
+                                                 *argTuple)
+        if record is not None:
+            record["numFiles"] = 1
+        return fn, result, None, record
+    except Exception:
+        return fn, None, traceback.format_exc(), None
+
+
+def mapFiles(func, jobList, stageName=None, numWorkers=None):
+    '''
+    Runs func over independent files, spread across worker processes
+
+    jobList is a list of (fn, argTuple) pairs; func(*argTuple) is called
+    once for each.  func must be defined at module level so that it can
+    be sent to the workers.
+
+    A failure in one file does not stop the others.  Returns
+    (resultList, errorList) where resultList holds (fn, result) pairs in
+    the order of jobList for the files that succeeded and errorList holds
+    (fn, traceback) pairs for those that failed.
+
+    numWorkers, if given, overrides the worker count for this call--e.g.
+    to bound the number of concurrent external processes.
+    '''
+    if stageName is None:
+        stageName = func.__name__
+
+    startCounters = None
+    if instrumentation.isEnabled():
+        startCounters = instrumentation.getCounters()
+
+    resultList = []
+    errorList = []
+    recordList = []
+    for fn, result, error, record in _imapFiles(func, jobList, stageName,
+                                                numWorkers):
+        if error is None:
+            resultList.append((fn, result))
+        else:
+            errorList.append((fn, error))
+        if record is not None:
+            recordList.append(record)
+            instrumentation.addRecord(record)
+
+    if startCounters is not None:
+        stopCounters = instrumentation.getCounters()
+        instrumentation.addRecord(instrumentation.summarizeStage(stageName,
+                                                                 startCounters,
+                                                                 stopCounters,
+                                                                 recordList))
+
+    reportErrors(stageName, errorList, len(jobList))
+
+    return resultList, errorList
+
+
+def imapFiles(func, jobList, numWorkers=None):
+    '''
+    Like mapFiles() but yields (fn, result, error) for one file at a time
+
+    Results come back in the order of jobList as soon as they are ready,
+    so callers can write them out without holding every result in memory.
+    error is None on success; otherwise it is the traceback and result is
+    None.  Errors are not reported--see reportErrors().
+    '''
+    for fn, result, error, record in _imapFiles(func, jobList, func.__name__,
+                                                numWorkers):
+        instrumentation.addRecord(record)
+        yield fn, result, error
+
+
+def _imapFiles(func, jobList, stageName, numWorkers=None):
+
+    jobList = [(func, fn, argTuple, stageName) for fn, argTuple in jobList]
+    if numWorkers is None:
+        numWorkers = getNumWorkers()
+    numWorkers = min(numWorkers, len(jobList))
+
+    if numWorkers <= 1:
+        for job in jobList:
+            yield _runJob(job)
+        return
+
+    pool = multiprocessing.Pool(numWorkers)
+    try:
+        for output in pool.imap(_runJob, jobList,
+                                _workerOptions["chunkSize"]):
+            yield output
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def reportErrors(stageName, errorList, numJobs):
+    
+    if len(errorList) == 0:
+        return
+    
+    print("%s: %d of %d files failed" % (stageName, len(errorList), numJobs))
+    for fn, error in errorList:
+        print("%s\n%s" % (fn, error))
@@ -0,0 +1,215 @@
+
+# A pure NumPy replacement for the Praat pitch and intensity extraction in
+# praat_pi.getPraatPitchAndIntensity().  Pitch is found with the YIN
+# algorithm (de Cheveigne and Kawahara 2002) and intensity is the
+# Hanning-weighted mean power of each frame, in dB re 2e-5 Pa.
+#
+# The output files have the same rows as the Praat output--time, f0,
+# intensity--one frame every sampleStep seconds, with unvoiced frames
+# given an f0 of 0.
+
+import os
+from os.path import join
+
+import wave
+
+import numpy as np
+
+import audio_segments
+
+# Frames are processed this many at a time to bound memory use on long
+# recordings; getPitchAndIntensity() reads the recording through a memory
+# map and only converts the samples of one block at a time to floats
+BLOCK_SIZE = 1000
+
+# YIN's threshold on the cumulative mean normalized difference
+YIN_THRESHOLD = 0.15
+
+# Like Praat's silence threshold: frames whose peak amplitude is below this
+# fraction of the file's peak amplitude are unvoiced
+SILENCE_THRESHOLD = 0.03
+
+
+def readWav(fullPath):
+    '''
+    Returns the samples (all channels averaged, scaled to -1..1) and the
+    sampling rate of a PCM wav file
+    '''
+    wav = wave.open(fullPath, "rb")
+    try:
+        numChannels, sampWidth, sampleRate, numFrames = wav.getparams()[:4]
+        data = wav.readframes(numFrames)
+    finally:
+        wav.close()
+
+    if sampWidth == 1:
+        samples = np.frombuffer(data, dtype=np.uint8).astype(np.float64)
+        samples = (samples - 128.0) / 128.0
+    elif sampWidth == 2:
+        samples = np.frombuffer(data, dtype="<i2").astype(np.float64) / 2**15
+    elif sampWidth == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        samples = (raw[:, 0].astype(np.int32) |
+                   (raw[:, 1].astype(np.int32) << 8) |
+                   (raw[:, 2].astype(np.int8).astype(np.int32) << 16))
+        samples = samples.astype(np.float64) / 2**23
+    elif sampWidth == 4:
+        samples = np.frombuffer(data, dtype="<i4").astype(np.float64) / 2**31
+    else:
+        raise ValueError("Unsupported sample width: %d bytes" % sampWidth)
+
+    samples = samples.reshape(-1, numChannels).mean(axis=1)
+
+    return samples, sampleRate
+
+
+def getFrameTimes(duration, windowDuration, sampleStep):
+    '''
+    Frame centers, spread symmetrically over the file as in Praat
+    '''
+    numFrames = int(np.floor((duration - windowDuration) / sampleStep)) + 1
+    if numFrames < 1:
+        return np.zeros(0)
+    firstTime = (duration - (numFrames - 1) * sampleStep) / 2.0
+
+    return firstTime + sampleStep * np.arange(numFrames)
+
+
+def _yinForBlock(frameMatrix, integrationLength, minLag, maxLag):
+    '''
+    Returns the period in samples (0 if unvoiced) for each row of frameMatrix
+
+    Each row holds integrationLength + maxLag samples.
+    '''
+    numRows, frameLength = frameMatrix.shape
+    fftLength = 1
+    while fftLength < frameLength + integrationLength:
+        fftLength *= 2
+
+    # Autocorrelation of the integration window against each lag
+    head = np.fft.rfft(frameMatrix[:, :integrationLength], fftLength)
+    full = np.fft.rfft(frameMatrix, fftLength)
+    acf = np.fft.irfft(np.conj(head) * full, fftLength)[:, :maxLag + 1]
+
+    # Energy of the window starting at each lag
+    cumEnergy = np.zeros((numRows, frameLength + 1))
+    cumEnergy[:, 1:] = np.cumsum(frameMatrix ** 2, axis=1)
+    lagEnergy = (cumEnergy[:, integrationLength:integrationLength + maxLag + 1] -
+                 cumEnergy[:, :maxLag + 1])
+
+    diff = lagEnergy[:, :1] + lagEnergy - 2 * acf
+    diff[:, 0] = 0
+    diff = np.maximum(diff, 0)
+
+    # Cumulative mean normalized difference
+    cumDiff = np.cumsum(diff[:, 1:], axis=1)
+    cmnd = np.ones_like(diff)
+    lagArray = np.arange(1, maxLag + 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cmnd[:, 1:] = np.where(cumDiff > 0, diff[:, 1:] * lagArray / cumDiff, 1)
+
+    # The first local minimum under the threshold within the pitch range
+    search = cmnd[:, minLag:maxLag]
+    isLocalMin = search[:, :-1] <= search[:, 1:]
+    candidates = (search[:, :-1] < YIN_THRESHOLD) & isLocalMin
+    hasCandidate = candidates.any(axis=1)
+    lagIndex = np.argmax(candidates, axis=1) + minLag
+
+    # Parabolic interpolation around the chosen lag
+    rows = np.arange(numRows)
+    left = cmnd[rows, np.maximum(lagIndex - 1, 0)]
+    center = cmnd[rows, lagIndex]
+    right = cmnd[rows, np.minimum(lagIndex + 1, maxLag)]
+    denominator = left - 2 * center + right
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shift = np.where(np.abs(denominator) > 1e-12,
+                         0.5 * (left - right) / denominator, 0)
+    shift = np.clip(shift, -1, 1)
+
+    return np.where(hasCandidate, lagIndex + shift, 0)
+
+
+def trackPitchAndIntensity(samples, sampleRate, minPitch, maxPitch,
+                           sampleStep, header=None):
+    '''
+    Returns arrays of time, f0 (0 if unvoiced) and intensity (dB)
+
+    samples are as returned by readWav(), or, if header (an
+    audio_segments.WavHeader) is given, the array returned by
+    audio_segments.openWavArray().
+    '''
+    def _getSamples(start, stop):
+        if header is None:
+            return samples[start:stop]
+        return audio_segments.toFloat(samples[start:stop], header)
+
+    minLag = int(np.floor(sampleRate / float(maxPitch)))
+    maxLag = int(np.ceil(sampleRate / float(minPitch)))
+    integrationLength = maxLag
+    frameLength = integrationLength + maxLag
+
+    numSamples = len(samples)
+    duration = numSamples / float(sampleRate)
+    timeArray = getFrameTimes(duration, frameLength / float(sampleRate),
+                              sampleStep)
+    numFrames = len(timeArray)
+    f0Array = np.zeros(numFrames)
+    intensityArray = np.zeros(numFrames)
+    if numFrames == 0:
+        return timeArray, f0Array, intensityArray
+
+    startArray = np.round(timeArray * sampleRate).astype(np.int64) - frameLength // 2
+    startArray = np.clip(startArray, 0, numSamples - frameLength)
+
+    hanning = np.hanning(frameLength)
+    hanning /= hanning.sum()
+    offsetArray = np.arange(frameLength)
+
+    blockLength = BLOCK_SIZE * frameLength
+    peakAmplitude = max(np.abs(_getSamples(start, start + blockLength)).max()
+                        for start in range(0, numSamples, blockLength))
+
+    for i in range(0, numFrames, BLOCK_SIZE):
+        blockStarts = startArray[i:i + BLOCK_SIZE]
+        blockStart = blockStarts[0]
+        blockSamples = _getSamples(blockStart, blockStarts[-1] + frameLength)
+        frameMatrix = blockSamples[(blockStarts - blockStart)[:, np.newaxis] +
+                                   offsetArray]
+
+        power = np.dot(frameMatrix ** 2, hanning)
+        intensityArray[i:i + BLOCK_SIZE] = 10 * np.log10(np.maximum(power, 1e-20) / 4e-10)
+
+        lagArray = _yinForBlock(frameMatrix, integrationLength, minLag, maxLag)
+        isSilent = np.abs(frameMatrix).max(axis=1) < SILENCE_THRESHOLD * peakAmplitude
+        with np.errstate(divide="ignore"):
+            f0 = np.where((lagArray > 0) & ~isSilent,
+                          sampleRate / np.maximum(lagArray, 1e-12), 0)
+        f0[(f0 < minPitch) | (f0 > maxPitch)] = 0
+        f0Array[i:i + BLOCK_SIZE] = f0
+
+    return timeArray, f0Array, intensityArray
+
+
+def getPitchAndIntensity(inputPath, inputFN, outputPath, minPitch, maxPitch,
+                         sampleStep=0.01, forceRegenerate=True):
+    '''
+    Drop-in for praat_pi.getPraatPitchAndIntensity() that doesn't need Praat
+    '''
+    name = os.path.splitext(inputFN)[0]
+    outputFN = join(outputPath, name + ".txt")
+    if not forceRegenerate and os.path.exists(outputFN):
+        return
+
+    fullPath = join(inputPath, inputFN)
+    header = audio_segments.readWavHeader(fullPath)
+    wavArray = audio_segments.openWavArray(fullPath, header)
+    timeArray, f0Array, intensityArray = trackPitchAndIntensity(wavArray,
+                                                                header.sampleRate,
+                                                                minPitch,
+                                                                maxPitch,
+                                                                sampleStep,
+                                                                header)
+
+    outputList = ["%0.6f,%0.3f,%0.3f" % row
+                  for row in zip(timeArray, f0Array, intensityArray)]
+    open(outputFN, "w").write("\n".join(outputList) + "\n")
@@ -4,6 +4,7 @@ from os.path import join
 
 import codecs
 import shutil
+import traceback
 
 from pyacoustics.utilities import utils
 
@@ -15,23 +16,71 @@ from pyacoustics import aggregate_features
 
 from praatio import praatio
 
+import numpy as np
 
-def processTextgrids(path, tgFolder, includeMothersPhones=False):
+import array_tier
+import audio_segments
+import binary_tables
+import executor
+import interval_algebra
+import pitch_tracks
+import session_catalog
+import textgrid_reader
+
+
+def findSessionFiles(path, filterExt, nameList=None, stripExt=False):
+    '''
+    Same as utils.findFiles() but limited to the sessions in nameList, if given
+    
+    A session's name is its filename minus the extension.
+    '''
+    fnList = utils.findFiles(path, filterExt=filterExt, stripExt=stripExt)
+    if nameList is not None:
+        nameSet = set(nameList)
+        fnList = [fn for fn in fnList
+                  if os.path.splitext(fn)[0] in nameSet]
+    
+    return fnList
+
+
+def processTextgrids(path, tgFolder, includeMothersPhones=False,
+                     fusedFlag=False, debugFlag=False, nameList=None):
+    '''
+    Cleans the textgrids and isolates the mother's speech
     
-    addEpochsToTextgrids(join(path, tgFolder),
-                        join(path, "epochs"),
-                        join(path, "textgrids_w_epochs"))
+    If fusedFlag is True, each textgrid is opened once and pushed through
+    every stage in memory.  Only the folders consumed downstream are
+    written (see FUSED_OUTPUT_FOLDERS); with debugFlag also True, the
+    intermediate per-stage folders are written as well.
+    
+    If nameList is given, only those sessions are processed.
+    
+    Returns the list of (fn, traceback) for the sessions that failed, one
+    per session (the first stage it failed in).
+    '''
+    
+    if fusedFlag:
+        return processTextgridsFused(path, tgFolder, includeMothersPhones,
+                                     debugFlag, nameList)
+    
+    errorList = []
+    errorList += addEpochsToTextgrids(join(path, tgFolder),
+                                      join(path, "epochs"),
+                                      join(path, "textgrids_w_epochs"),
+                                      nameList=nameList)
 
-    renameTiers(join(path, "textgrids_w_epochs"),
+    errorList += renameTiers(join(path, "textgrids_w_epochs"),
                 join(path, "textgrids_w_renamed_tiers"),
-                includeMothersPhones
+                includeMothersPhones,
+                nameList=nameList
                 )
 
-    filterTextgrids(join(path, "textgrids_w_renamed_tiers"),
-                    "Mother",
-                    "Mother's Backchannel",
-                    0.15,
-                    join(path, "textgrids_w_epochs_final_non_isolated"))
+    errorList += filterTextgrids(join(path, "textgrids_w_renamed_tiers"),
+                                 "Mother",
+                                 "Mother's Backchannel",
+                                 0.15,
+                                 join(path, "textgrids_w_epochs_final_non_isolated"),
+                                 nameList=nameList)
 
 
 #    # Removing ultrashort intervals, laughter segments, and intervals marked
@@ -50,133 +99,270 @@ def processTextgrids(path, tgFolder, includeMothersPhones=False):
 #                )
 
 # #     # Removing segments where the mother and child speech in unison
-    isolateMotherSpeech(join(path, "textgrids_w_epochs_final_non_isolated"),
-                        "Room",
-                        join(path, "textgrids_w_epochs_filtered_for_room_noise")
-                        )
+    errorList += isolateMotherSpeech(join(path, "textgrids_w_epochs_final_non_isolated"),
+                                     "Room",
+                                     join(path, "textgrids_w_epochs_filtered_for_room_noise"),
+                                     nameList=nameList
+                                     )
 # 
-    isolateMotherSpeech(join(path, "textgrids_w_epochs_final_non_isolated"),
-                        "Child",
-                        join(path, "textgrids_w_epochs_filtered_for_child_speech")
-                        )
+    errorList += isolateMotherSpeech(join(path, "textgrids_w_epochs_final_non_isolated"),
+                                     "Child",
+                                     join(path, "textgrids_w_epochs_filtered_for_child_speech"),
+                                     nameList=nameList
+                                     )
 
-    isolateMotherSpeech(join(path, "textgrids_w_epochs_filtered_for_room_noise"),
-                        "Child",
-                        join(path, "textgrids_w_epochs_filtered_for_room_noise_and_child_speech")
-                        )
+    errorList += isolateMotherSpeech(join(path, "textgrids_w_epochs_filtered_for_room_noise"),
+                                     "Child",
+                                     join(path, "textgrids_w_epochs_filtered_for_room_noise_and_child_speech"),
+                                     nameList=nameList
+                                     )
     
-    finalSourceTextgridFolder = "textgrids_w_epochs_filtered_for_room_noise_and_child_speech"
-    try:
-        isolateMotherSpeech(join(path, "textgrids_w_epochs_filtered_for_room_noise_and_child_speech"),
-                            "F0 Checks",
-                            join(path, "textgrids_w_epochs_filtered_for_room_noise_child_speech_and_f0_checks"
-                            ))
-        finalSourceTextgridFolder = "textgrids_w_epochs_filtered_for_room_noise_child_speech_and_f0_checks"
-    except KeyError:
-        pass # No F0 checks done on these textgrids
+    noF0CheckFolder = "textgrids_w_epochs_filtered_for_room_noise_and_child_speech"
+    f0CheckFolder = "textgrids_w_epochs_filtered_for_room_noise_child_speech_and_f0_checks"
+    f0CheckErrorList = isolateMotherSpeech(join(path, noF0CheckFolder),
+                                           "F0 Checks",
+                                           join(path, f0CheckFolder),
+                                           nameList=nameList)
+    
+    # Sessions whose textgrids have no F0 Checks tier are finished from the
+    # textgrids before it; any other F0 check failure is an error
+    noF0CheckSet = set(findTextgridsWithoutTier(join(path, noF0CheckFolder),
+                                                "F0 Checks", nameList))
+    failedSet = set()
+    for fn, error in f0CheckErrorList:
+        name = os.path.splitext(fn)[0]
+        if name not in noF0CheckSet:
+            failedSet.add(name)
+            errorList.append((fn, error))
+    sessionList = [name for name in
+                   findSessionFiles(join(path, noF0CheckFolder), ".TextGrid",
+                                    nameList, stripExt=True)
+                   if name not in failedSet]
     
 # 
 #     # Removing ultrashort segments created by the isolation function
-    filterTextgrids(join(path, finalSourceTextgridFolder),
-                    "Mother",
-                    "Mother's Backchannel",
-                    0.15,
-                    join(path, "textgrids_w_epochs_final_isolated")
-                    )
+    for folder, sourceNameList in [(f0CheckFolder,
+                                    [name for name in sessionList
+                                     if name not in noF0CheckSet]),
+                                   (noF0CheckFolder,
+                                    [name for name in sessionList
+                                     if name in noF0CheckSet])]:
+        errorList += filterTextgrids(join(path, folder),
+                                     "Mother",
+                                     "Mother's Backchannel",
+                                     0.15,
+                                     join(path, "textgrids_w_epochs_final_isolated"),
+                                     nameList=sourceNameList
+                                     )
 
 #     # Replaces all non-silence text with the label MS for "Mother Speech"
-    simplifyTextgrids(join(path, "textgrids_w_epochs_final_isolated"),
-                      join(path, "textgrids_two_tags")
-                      )
+    errorList += simplifyTextgrids(join(path, "textgrids_w_epochs_final_isolated"),
+                                   join(path, "textgrids_two_tags"),
+                                   nameList=nameList
+                                   )
 
-    extractTGInfo(join(path, "textgrids_w_epochs_final_isolated"),
-                  join(path, "tg_info"),
-                  "Mother",
-                  "Mother's Backchannel",
-                  False)
+    errorList += extractTGInfo(join(path, "textgrids_w_epochs_final_isolated"),
+                               join(path, "tg_info"),
+                               "Mother",
+                               "Mother's Backchannel",
+                               False,
+                               nameList=nameList)
+    
+    return _getFirstErrorPerSession(errorList)
 
 
-def simplifyTextgrids(inputPath, outputPath):
+def _getFirstErrorPerSession(errorList):
+    '''
+    The first of the (fn, traceback) errors for each session
+    '''
+    seenSet = set()
+    firstErrorList = []
+    for fn, error in errorList:
+        name = os.path.splitext(fn)[0]
+        if name not in seenSet:
+            seenSet.add(name)
+            firstErrorList.append((fn, error))
+    
+    return firstErrorList
+
+
+# Folders written by processTextgridsFused() even when debugFlag is False
+# --these are the ones read by extractMotherSpeech() and playTask_step3
+FUSED_OUTPUT_FOLDERS = ["textgrids_w_epochs_final_isolated",
+                        "textgrids_two_tags",
+                        "textgrids_w_epochs_filtered_for_child_speech_two_label",
+                        "textgrids_w_epochs_filtered_for_room_noise_two_label",
+                        "textgrids_w_epochs_final_non_isolated_two_label",
+                        ]
+
+FUSED_DEBUG_FOLDERS = ["textgrids_w_epochs",
+                       "textgrids_w_renamed_tiers",
+                       "textgrids_w_epochs_final_non_isolated",
+                       "textgrids_w_epochs_filtered_for_room_noise",
+                       "textgrids_w_epochs_filtered_for_child_speech",
+                       "textgrids_w_epochs_filtered_for_room_noise_and_child_speech",
+                       "textgrids_w_epochs_filtered_for_room_noise_child_speech_and_f0_checks",
+                       ]
+
+
+def processTextgridsFused(path, tgFolder, includeMothersPhones=False,
+                          debugFlag=False, nameList=None):
+    '''
+    Same as processTextgrids() but each textgrid is only read once
+
+    Every variant produced by processTextgrids() differs only in the
+    "Mother" tier, so the variants are computed as entry lists and a
+    single textgrid is saved once per output folder.  The two-label
+    textgrids that playTask_step1 builds with simplifyTextgrids() are
+    written here too.
+    '''
+
+    outputFolderList = list(FUSED_OUTPUT_FOLDERS)
+    if debugFlag:
+        outputFolderList.extend(FUSED_DEBUG_FOLDERS)
+
+    for folder in outputFolderList:
+        utils.makeDir(join(path, folder))
+    utils.makeDir(join(path, "tg_info"))
+
+    jobList = [(name, (path, tgFolder, name, includeMothersPhones,
+                       outputFolderList))
+               for name in findSessionFiles(join(path, tgFolder),
+                                            filterExt=".TextGrid",
+                                            nameList=nameList,
+                                            stripExt=True)]
+    return executor.mapFiles(_processTextgridFused, jobList)[1]
+
+
+def _processTextgridFused(path, tgFolder, name, includeMothersPhones,
+                          outputFolderList):
+
+    print name
+    fn = name + ".TextGrid"
+    speechTierName = "Mother"
+    laughterTierName = "Mother's Backchannel"
+    minDuration = 0.15
+
+    def _save(tg, folder, entryList=None):
+        if folder not in outputFolderList:
+            return
+        if entryList is not None:
+            tg.replaceTier(speechTierName, entryList)
+        tg.save(join(path, folder, fn))
+
+    tg = praatio.openTextGrid(join(path, tgFolder, fn))
+    tg = _addEpochTier(tg, join(path, "epochs"), name)
+    _save(tg, "textgrids_w_epochs")
+
+    tg = _renameTiersInTG(tg, includeMothersPhones)
+    _save(tg, "textgrids_w_renamed_tiers")
+
+    # From here on, only the "Mother" tier changes between stages
+    nonIsolatedList = _filterSpeechEntries(tg,
+                                           tg.tierDict[speechTierName].entryList,
+                                           laughterTierName, minDuration)
+    roomList = _isolateEntries(tg, nonIsolatedList, "Room")
+    childList = _isolateEntries(tg, nonIsolatedList, "Child")
+    roomAndChildList = _isolateEntries(tg, roomList, "Child")
+
+    finalSourceList = roomAndChildList
+    f0CheckList = None
+    if "F0 Checks" in tg.tierDict.keys():
+        f0CheckList = _isolateEntries(tg, roomAndChildList, "F0 Checks")
+        finalSourceList = f0CheckList
+
+    finalList = _filterSpeechEntries(tg, finalSourceList, laughterTierName,
+                                     minDuration)
+
+    outputList = [("textgrids_w_epochs_final_non_isolated", nonIsolatedList),
+                  ("textgrids_w_epochs_filtered_for_room_noise", roomList),
+                  ("textgrids_w_epochs_filtered_for_child_speech", childList),
+                  ("textgrids_w_epochs_filtered_for_room_noise_and_child_speech",
+                   roomAndChildList),
+                  ("textgrids_w_epochs_filtered_for_room_noise_child_speech_and_f0_checks",
+                   f0CheckList),
+                  ("textgrids_w_epochs_final_isolated", finalList),
+                  ("textgrids_two_tags", _simplifyEntries(finalList)),
+                  ("textgrids_w_epochs_filtered_for_child_speech_two_label",
+                   _simplifyEntries(childList)),
+                  ("textgrids_w_epochs_filtered_for_room_noise_two_label",
+                   _simplifyEntries(roomList)),
+                  ("textgrids_w_epochs_final_non_isolated_two_label",
+                   _simplifyEntries(nonIsolatedList)),
+                  ]
+    for folder, entryList in outputList:
+        if entryList is not None:
+            _save(tg, folder, entryList)
+
+    outputTxt = _getTGInfoText(finalList, False)
+    codecs.open(join(path, "tg_info", name + ".txt"), "w",
+                encoding="utf-8").write(outputTxt)
+
+
+def _simplifyEntries(entryList):
+    return array_tier.ArrayTier.fromEntryList(None, entryList).relabel("MS").toEntryList()
+
+
+def simplifyTextgrids(inputPath, outputPath, nameList=None):
     
     utils.makeDir(outputPath)
     
+    jobList = [(fn, (inputPath, outputPath, fn))
+               for fn in findSessionFiles(inputPath, ".TextGrid", nameList)]
+    return executor.mapFiles(_simplifyTextgrid, jobList)[1]
+
+
+def _simplifyTextgrid(inputPath, outputPath, fn):
+    
     speechTierName = "Mother"
     
-    for fn in utils.findFiles(inputPath, filterExt=".TextGrid"):
-        
-        tg = praatio.openTextGrid(join(inputPath, fn))
-        tg.replaceTier(speechTierName, [[start, stop, "MS"] for start, stop, label in tg.tierDict[speechTierName].entryList])
-        tg.save(join(outputPath, fn))
+    tg = praatio.openTextGrid(join(inputPath, fn))
+    tg.replaceTier(speechTierName, _simplifyEntries(tg.tierDict[speechTierName].entryList))
+    tg.save(join(outputPath, fn))
         
     
 def subtractOverlap(startTime, endTime, label, cmprStart, cmprEnd):
     
-    returnList =[]
-    if cmprStart <= startTime and cmprEnd >= endTime: # Crop entire region
-        pass
-    elif cmprStart <= startTime and cmprEnd < endTime: # Crop left edge
-        returnList.append((cmprEnd, endTime, label))
-    elif cmprStart > startTime and cmprEnd >= endTime: # Crop right edge
-        returnList.append((startTime, cmprStart, label))
-    elif cmprStart > startTime and cmprEnd < endTime: # Interval divided in two
-        
-        # If we have to divide the interval in two, only assign the label to one side
-        if cmprStart - startTime > cmprEnd - endTime: 
-            leftLabel = label
-            rightLabel = '(pST)'
-        else:
-            leftLabel = '(nST)'
-            rightLabel = label
-            
-        returnList.append((startTime, cmprStart, leftLabel))
-        returnList.append((cmprEnd, endTime, rightLabel))
-    else: # No overlap
-        returnList.append(startTime, endTime)    
-    
-    return returnList
+    return interval_algebra.subtractIntervals([(startTime, endTime, label),],
+                                              [(cmprStart, cmprEnd, None),])
 
 
-def isolateMotherSpeech(path, filterGrid, outputPath):
+def isolateMotherSpeech(path, filterGrid, outputPath, nameList=None):
     '''
     Removes mother speech when the child is also speaking
+    
+    Returns the list of (fn, traceback) for the files that failed--e.g.
+    with a KeyError if a textgrid has no tier filterGrid
     '''
     
     utils.makeDir(outputPath)
     
-    for fn in utils.findFiles(path, filterExt=".TextGrid"):
-        
-        tg = praatio.openTextGrid(join(path, fn))
-        motherTier = tg.tierDict["Mother"]
-        
-        newEntryList = []
-        for start, stop, label in motherTier.entryList:
-            croppedTG = tg.crop(False, False, start, stop)
-            entryList = croppedTG.tierDict[filterGrid].entryList
-            
-            resultList = [(start, stop, label),]
-            
-            for subStart, subStop, subLabel in entryList:
-                
-                i = 0
-                while i < len(resultList):
-                    tmpStart = resultList[i][0]
-                    tmpEnd = resultList[i][1]
-                    tmpResultList = subtractOverlap(tmpStart,
-                                                    tmpEnd,
-                                                    label,
-                                                    subStart,
-                                                    subStop)
-                     # Replace if there has been a change
-                    if tmpResultList != [[tmpStart, tmpEnd, label],]:
-                        resultList = resultList[:i] + tmpResultList
-                        i += len(tmpResultList) - 1
-                    i += 1
-
-            newEntryList.extend(resultList)
-
-        newMotherTier = praatio.IntervalTier("Mother", newEntryList)
-        tg.replaceTier("Mother", newMotherTier.entryList)
-        tg.save(join(outputPath, fn))
+    jobList = [(fn, (path, filterGrid, outputPath, fn))
+               for fn in findSessionFiles(path, ".TextGrid", nameList)]
+    return executor.mapFiles(_isolateMotherSpeechInFile, jobList)[1]
+
+
+def _isolateMotherSpeechInFile(path, filterGrid, outputPath, fn):
+    
+    tg = praatio.openTextGrid(join(path, fn))
+    motherTier = tg.tierDict["Mother"]
+    
+    newEntryList = _isolateEntries(tg, motherTier.entryList, filterGrid)
+
+    newMotherTier = praatio.IntervalTier("Mother", newEntryList)
+    tg.replaceTier("Mother", newMotherTier.entryList)
+    tg.save(join(outputPath, fn))
+
+
+def _isolateEntries(tg, entryList, filterGrid):
+    '''
+    Returns the entries in entryList minus the regions in tier filterGrid
+    
+    Raises KeyError if the textgrid has no tier filterGrid
+    '''
+    filterTier = tg.tierDict[filterGrid]
+    
+    return interval_algebra.subtractIntervals(entryList, filterTier.entryList)
 
 
 def replaceTierName(tg, oldTierNameList, newTierName):
@@ -193,7 +379,7 @@ def replaceTierName(tg, oldTierNameList, newTierName):
     return tg
 
 
-def renameTiers(inputPath, outputPath, includeMothersPhones=False):
+def _renameTiersInTG(tg, includeMothersPhones=False):
     
     renameList = [(["Mother", "Mother's Speech", "Mother's speech", "mother's speech", "Mother Speech", "mother speech"], "Mother"),
                   (["Mother's Backchannel", "Mother's backchannel", "mother's backchannel", "child's backchannel"], "Mother's Backchannel"),
@@ -206,55 +392,87 @@ def renameTiers(inputPath, outputPath, includeMothersPhones=False):
     if includeMothersPhones:
         renameList.insert(1, (["Mother's phones",], "Mother's Phones"))
     
+    for oldNameList, newName in renameList:
+        tg = replaceTierName(tg, oldNameList, newName)
+    
+    return tg
+
+
+def renameTiers(inputPath, outputPath, includeMothersPhones=False,
+                nameList=None):
+    
     utils.makeDir(outputPath)
     
-    for fn in utils.findFiles(inputPath, filterExt=".TextGrid"):
-        
-        tg = praatio.openTextGrid(join(inputPath, fn))
-        
-        for oldNameList, newName in renameList:
-            try:
-                tg = replaceTierName(tg, oldNameList, newName)
-            except ValueError:
-                print fn
-                raise
-        
-        tg.save(join(outputPath, fn))
+    jobList = [(fn, (inputPath, outputPath, fn, includeMothersPhones))
+               for fn in findSessionFiles(inputPath, ".TextGrid", nameList)]
+    return executor.mapFiles(_renameTiersInFile, jobList)[1]
 
 
-def addEpochsToTextgrids(tgPath, epochPath, outputPath):
+def _renameTiersInFile(inputPath, outputPath, fn, includeMothersPhones):
+    
+    tg = praatio.openTextGrid(join(inputPath, fn))
+    tg = _renameTiersInTG(tg, includeMothersPhones)
+    tg.save(join(outputPath, fn))
+
+
+def addEpochsToTextgrids(tgPath, epochPath, outputPath, nameList=None):
     
     utils.makeDir(outputPath)
     
-    for name in utils.findFiles(tgPath, filterExt=".TextGrid", stripExt=True):
-        print name
-        tg = praatio.openTextGrid(join(tgPath, name+".TextGrid"))
+    jobList = [(name, (tgPath, epochPath, outputPath, name))
+               for name in findSessionFiles(tgPath, ".TextGrid", nameList,
+                                            stripExt=True)]
+    return executor.mapFiles(_addEpochsToTextgrid, jobList)[1]
 
-        entryList = utils.openCSV(epochPath, name+".txt")
-        entryList = [(float(start), float(end), label) for label, start, end in entryList]
-        
-        tier = praatio.IntervalTier("epochs", entryList, minT=0, maxT=tg.maxTimestamp)
-        
-        tg.addTier(tier)
-        tg.save(join(outputPath, name+".TextGrid"))
+
+def _addEpochsToTextgrid(tgPath, epochPath, outputPath, name):
+    
+    print name
+    tg = praatio.openTextGrid(join(tgPath, name+".TextGrid"))
+    tg = _addEpochTier(tg, epochPath, name)
+    tg.save(join(outputPath, name+".TextGrid"))
+
+
+def _addEpochTier(tg, epochPath, name):
+    
+    entryList = utils.openCSV(epochPath, name+".txt")
+    entryList = [(float(start), float(end), label) for label, start, end in entryList]
+    
+    tier = praatio.IntervalTier("epochs", entryList, minT=0, maxT=tg.maxTimestamp)
+    
+    tg.addTier(tier)
+    
+    return tg
         
         
-def insituLaughterCheck(start, stop, textgrid, laughterTierName):
+def getLaughterIndex(textgrid, laughterTierName):
     '''
-    Returns True if there is no laughter during the interval.  False otherwise.
+    An index of the laughter in a textgrid, for repeated insitu checks
     '''
-    croppedTG = textgrid.crop(strictFlag=False, softFlag=False, 
-                              startTime=start, endTime=stop)
-    tier = croppedTG.tierDict[laughterTierName]
-    entryList = tier.getEntries()
+    entryList = textgrid.tierDict[laughterTierName].entryList
     
     # Only intervals labeled "LA" are laughter
     entryList = [row for row in entryList if row[2].lower() == "la"]
     
-    return len(entryList) == 0
+    return interval_algebra.IntervalIndex(entryList)
+
+
+def insituLaughterCheck(start, stop, textgrid, laughterTierName,
+                        laughterIndex=None):
+    '''
+    Returns True if there is no laughter during the interval.  False otherwise.
+    
+    When checking many intervals, build laughterIndex once with
+    getLaughterIndex() and pass it in.
+    '''
+    if laughterIndex is None:
+        laughterIndex = getLaughterIndex(textgrid, laughterTierName)
+    
+    return not laughterIndex.anyOverlap(start, stop)
 
 
-def filterTextgrids(tgPath, speechTierName, laughterTierName, minDuration, outputPath):
+def filterTextgrids(tgPath, speechTierName, laughterTierName, minDuration, outputPath,
+                    nameList=None):
     '''
     Removes invalid entries from the mother's speech tier
     
@@ -266,101 +484,105 @@ def filterTextgrids(tgPath, speechTierName, laughterTierName, minDuration, outpu
     
     utils.makeDir(outputPath)
     
-    for fn in utils.findFiles(tgPath, filterExt=".TextGrid"):
-        
-        tg = praatio.openTextGrid(join(tgPath, fn))
-
-        # Removes all non-speech events (MS)
-        newTierEntryList = []
-        speechTier = tg.tierDict[speechTierName]
-        for entry in speechTier.entryList:
-            start, stop, label = entry
-            if insituLaughterCheck(start, stop, tg, laughterTierName):
-               newTierEntryList.append(entry)
-               
-        # Removes all speech events shorter than some threshold
-        newTierEntryList = [(start, stop, label) for start, stop, label in newTierEntryList
-                            if float(stop) - float(start) > minDuration]
-        tg.replaceTier(speechTierName, newTierEntryList)
-        tg.save(join(outputPath, fn))
+    jobList = [(fn, (tgPath, speechTierName, laughterTierName, minDuration,
+                     outputPath, fn))
+               for fn in findSessionFiles(tgPath, ".TextGrid", nameList)]
+    return executor.mapFiles(_filterTextgrid, jobList)[1]
+
+
+def _filterTextgrid(tgPath, speechTierName, laughterTierName, minDuration,
+                    outputPath, fn):
+    
+    tg = praatio.openTextGrid(join(tgPath, fn))
+
+    speechTier = tg.tierDict[speechTierName]
+    newTierEntryList = _filterSpeechEntries(tg, speechTier.entryList,
+                                            laughterTierName, minDuration)
+    tg.replaceTier(speechTierName, newTierEntryList)
+    tg.save(join(outputPath, fn))
+
+
+def _filterSpeechEntries(tg, entryList, laughterTierName, minDuration):
+    
+    speechTier = array_tier.ArrayTier.fromEntryList(None, entryList)
+    laughterIndex = getLaughterIndex(tg, laughterTierName)
+    
+    # Removes all speech that occurs with laughter and all speech events
+    # shorter than some threshold
+    isInsitu = np.array([not laughterIndex.anyOverlap(start, stop)
+                         for start, stop in zip(speechTier.startArray.tolist(),
+                                                speechTier.stopArray.tolist())],
+                        dtype=bool)
+    isLongEnough = speechTier.getDurations() > minDuration
+    
+    return speechTier.select(isInsitu & isLongEnough).toEntryList()
         
 
 def eventStructurePerEpoch(epochPath, fullyFilteredTGPath, 
                            childFilteredTGPath, noiseFilteredTGPath,
                            unfilteredTGPath, outputPath, 
-                           speechTierName, laughterTierName):
+                           speechTierName, laughterTierName, nameList=None):
     '''
     How frequent and with what duration did laughter, pauses, and speech occur
     '''
     
-    def _getCountsAndDurations(tier, searchLabel):
-        entryList = tier.find(searchLabel)
-        durationList = [float(stop) - float(start) 
-                        for start, stop, label in entryList]
-        count = len(entryList)
-        
-        return sum(durationList), count
-    
     utils.makeDir(outputPath)
     
-    for name in utils.findFiles(epochPath, filterExt=".txt", stripExt=True):
-        
-        epochList = utils.openCSV(epochPath, name+".txt")
-        epochList = [(epochNum, float(start), float(stop)) 
-                     for epochNum, start, stop in epochList]
-        tg = praatio.openTextGrid(join(fullyFilteredTGPath, 
-                                       name + ".TextGrid"))
-        childFilteredTG = praatio.openTextGrid(join(childFilteredTGPath,
-                                                   name + ".TextGrid"))
-        noiseFilteredTG = praatio.openTextGrid(join(noiseFilteredTGPath,
-                                                    name + ".TextGrid"))
-        origTG = praatio.openTextGrid(join(unfilteredTGPath, 
+    jobList = [(name, (epochPath, fullyFilteredTGPath, childFilteredTGPath,
+                       noiseFilteredTGPath, unfilteredTGPath, outputPath,
+                       speechTierName, laughterTierName, name))
+               for name in findSessionFiles(epochPath, ".txt", nameList,
+                                            stripExt=True)]
+    return executor.mapFiles(_eventStructureForFile, jobList)[1]
+
+
+def _eventStructureForFile(epochPath, fullyFilteredTGPath, 
+                           childFilteredTGPath, noiseFilteredTGPath,
+                           unfilteredTGPath, outputPath, 
+                           speechTierName, laughterTierName, name):
+    
+    epochList = utils.openCSV(epochPath, name+".txt")
+    windowList = [(float(start), float(stop)) 
+                  for epochNum, start, stop in epochList]
+    tg = textgrid_reader.openTextgrid(join(fullyFilteredTGPath, 
                                            name + ".TextGrid"))
+    childFilteredTG = textgrid_reader.openTextgrid(join(childFilteredTGPath,
+                                                        name + ".TextGrid"))
+    noiseFilteredTG = textgrid_reader.openTextgrid(join(noiseFilteredTGPath,
+                                                        name + ".TextGrid"))
+    origTG = textgrid_reader.openTextgrid(join(unfilteredTGPath, 
+                                               name + ".TextGrid"))
+    
+    # Each tier is swept once against all of the epochs
+    def _sumPerEpoch(textgrid, tierName, searchLabel):
+        entryList = textgrid.tierDict[tierName].entryList
+        return interval_algebra.sumLabelPerWindow(windowList, entryList,
+                                                  searchLabel)
+    
+    pauseList = _sumPerEpoch(tg, speechTierName, "FP")
+    speechList = _sumPerEpoch(tg, speechTierName, "MS")
+    laughList = _sumPerEpoch(tg, laughterTierName, "LA")
+    csFilteredList = _sumPerEpoch(childFilteredTG, speechTierName, "MS")
+    nsFilteredList = _sumPerEpoch(noiseFilteredTG, speechTierName, "MS")
+    fullSpeechList = _sumPerEpoch(origTG, speechTierName, "MS")
+    
+    outputList = []
+    for i in xrange(len(windowList)):
+        pauseDur, numPauses = pauseList[i]
+        speechDur, numSpeech = speechList[i]
+        laughDur, numLaughter = laughList[i]
+        csFiltSpeech = csFilteredList[i][0]
+        nsFiltSpeech = nsFilteredList[i][0]
+        fullSpeechDur = fullSpeechList[i][0]
         
-        outputList = []
-        for epochNum, start, stop in epochList:
-            subTG = tg.crop(strictFlag=False, softFlag=False, 
-                            startTime=start, endTime=stop)
-            
-            speechTier = subTG.tierDict[speechTierName]
-            laughterTier = subTG.tierDict[laughterTierName]
-            
-            pauseDur, numPauses = _getCountsAndDurations(speechTier, "FP")
-            speechDur, numSpeech = _getCountsAndDurations(speechTier, "MS")
-            laughDur, numLaughter = _getCountsAndDurations(laughterTier, "LA")
-            
-            subCSFilteredTG = childFilteredTG.crop(strictFlag=False, 
-                                                softFlag=False,
-                                                startTime=start,
-                                                endTime=stop)
-            csFilteredTier = subCSFilteredTG.tierDict[speechTierName]
-            csFiltSpeech, numCSFiltSpeech = _getCountsAndDurations(csFilteredTier, 
-                                                               "MS")            
-
-            subNoiseFilteredTG = noiseFilteredTG.crop(strictFlag=False, 
-                                                softFlag=False,
-                                                startTime=start,
-                                                endTime=stop)
-            nsFilteredTier = subNoiseFilteredTG.tierDict[speechTierName]
-            nsFiltSpeech, numNsFiltSpeech = _getCountsAndDurations(nsFilteredTier, 
-                                                               "MS")     
-            
-            subOrigTG = origTG.crop(strictFlag=False,
-                                    softFlag=False,
-                                    startTime=start,
-                                    endTime=stop)
-            origSpeechTier = subOrigTG.tierDict[speechTierName]
-            fullSpeechDur, fullNumSpeech = _getCountsAndDurations(origSpeechTier, 
-                                                                  "MS")
-            
-            epochTuple = (speechDur, numSpeech, csFiltSpeech, nsFiltSpeech, 
-                          fullSpeechDur, fullSpeechDur - speechDur,
-                          pauseDur, numPauses, laughDur, numLaughter)
-            outputList.append("%.02f, %d, %.02f, %.02f, %.02f, %.02f, %.02f, %d, %.02f, %d" % epochTuple)
-        
-        open(join(outputPath, name+".txt"), "w").write("\n".join(outputList) + "\n")
-        
+        epochTuple = (speechDur, numSpeech, csFiltSpeech, nsFiltSpeech, 
+                      fullSpeechDur, fullSpeechDur - speechDur,
+                      pauseDur, numPauses, laughDur, numLaughter)
+        outputList.append("%.02f, %d, %.02f, %.02f, %.02f, %.02f, %.02f, %d, %.02f, %d" % epochTuple)
     
+    open(join(outputPath, name+".txt"), "w").write("\n".join(outputList) + "\n")
+    
+
 def analyzeLaughter(textgridPath, outputPath):
     
     utils.makeDir(outputPath)
@@ -373,52 +595,110 @@ def analyzeLaughter(textgridPath, outputPath):
     pauseCode = "FP"
     
     # How much did each event occur?
-    allCodeSummaryList = []
-    for tierName, code, outputName in [[speechTierName, speechCode, "speech_occurances"],
-                                       [laughterTierName, laughterCode, "laughter_occurances"],
-                                       [speechTierName, pauseCode, "pause_code"],
-                                       ]:
-        entryList = []
-        summaryList = []
-        for fn in utils.findFiles(textgridPath, filterExt=".TextGrid"):
-            tg = praatio.openTextGrid(join(textgridPath, fn))
-            tier = tg.tierDict[tierName]
-            
-            matchEntryList = tier.find(code)
-            durationList = [float(stop)-float(start) for start, stop, label in matchEntryList]
-            matchEntryList = [[fn,str(start),str(stop),label]for start, stop, label in matchEntryList] 
-            
-            entryList.extend(matchEntryList)
-            summaryList.append( (fn, str(sum(durationList))) )
-        
-        entryList = [",".join(row) for row in entryList]
-        open(join(outputPath, outputName+".csv"), "w").write("\n".join(entryList))
-
-        allCodeSummaryList.append(summaryList)
+    queryList = [[speechTierName, speechCode, "speech_occurances"],
+                 [laughterTierName, laughterCode, "laughter_occurances"],
+                 [speechTierName, pauseCode, "pause_code"],
+                 ]
+    summaryList = findCodesInTextgrids(textgridPath, outputPath, queryList)
     
     outputList = ["Filename,Speech,Laughter,Pause",]
-    for speech, laugh, pause in utils.safeZip(allCodeSummaryList, enforceLength=True):
-        outputList.append(",".join([speech[0], speech[1], laugh[1], pause[1]]))
+    for fn, durationList in summaryList:
+        outputList.append(",".join([fn,] + [str(duration) for duration in durationList]))
         
     open(join(outputPath, "event_cumulative_lengths.csv"), "w").write("\n".join(outputList) + "\n")
+
+
+def findCodesInTextgrids(textgridPath, outputPath, queryList):
+    '''
+    Collects the entries for any number of tier/code pairs in one pass
+    
+    queryList holds (tierName, code, outputName) triples.  Each textgrid is
+    read once and the matching entries for each query are written to
+    <outputName>.csv as they come in, one "fn,start,stop,label" row per
+    entry.  Returns a list of (fn, durationList) holding the total
+    duration of each query's matches in each file.
+    '''
+    
+    codeList = [(tierName, code) for tierName, code, outputName in queryList]
+    jobList = [(fn, (textgridPath, fn, codeList))
+               for fn in utils.findFiles(textgridPath, filterExt=".TextGrid")]
+    
+    fdList = [open(join(outputPath, outputName+".csv"), "w")
+              for tierName, code, outputName in queryList]
+    isEmptyList = [True for fd in fdList]
+    summaryList = []
+    errorList = []
+    try:
+        for fn, result, error in executor.imapFiles(_findCodesInFile, jobList):
+            if error is not None:
+                errorList.append((fn, error))
+                continue
+            
+            durationList = []
+            for i, (matchEntryList, totalDuration) in enumerate(result):
+                for row in matchEntryList:
+                    if not isEmptyList[i]:
+                        fdList[i].write("\n")
+                    fdList[i].write(",".join(row))
+                    isEmptyList[i] = False
+                durationList.append(totalDuration)
+            summaryList.append( (fn, durationList) )
+    finally:
+        for fd in fdList:
+            fd.close()
+    
+    executor.reportErrors("findCodesInTextgrids", errorList, len(jobList))
+    
+    return summaryList
+
+
+def _findCodesInFile(textgridPath, fn, codeList):
+    
+    tg = textgrid_reader.openTextgrid(join(textgridPath, fn))
+    
+    resultList = []
+    for tierName, code in codeList:
+        tier = tg.tierDict[tierName]
+        
+        matchEntryList = tier.find(code)
+        durationList = [float(stop)-float(start) for start, stop, label in matchEntryList]
+        matchEntryList = [[fn,str(start),str(stop),label]for start, stop, label in matchEntryList] 
+        
+        resultList.append( (matchEntryList, sum(durationList)) )
+    
+    return resultList
         
 
 def analyzeInsituLaughter(inputPath, outputPath):
     
+    jobList = [(fn, (inputPath, fn))
+               for fn in utils.findFiles(inputPath, filterExt=".TextGrid")]
+    resultList = executor.mapFiles(_findInsituLaughterInFile, jobList)[0]
+    
     outputList = []
-    for fn in utils.findFiles(inputPath, filterExt=".TextGrid"):
-        
-        tg = praatio.openTextGrid(join(inputPath, fn))
-        tier = tg.tierDict["Mother"]
-        for start, stop, label in tier.getEntries():
-            isInsitu = insituLaughterCheck(start, stop, tg, "Mother's Backchannel")
-            if isInsitu:
-                outputList.append("%s,%02.02f,%02.02f,%s" % (fn, start, stop, label))
+    for fn, subOutputList in resultList:
+        outputList.extend(subOutputList)
                 
     open(join(outputPath, "insitu_laughter_events.csv"), "w").write("\n".join(outputList) + "\n")
         
        
-def extractTGInfo(inputPath, outputPath, tierName, laughterTierName, searchForMothersSpeech):
+def _findInsituLaughterInFile(inputPath, fn):
+    
+    outputList = []
+    tg = textgrid_reader.openTextgrid(join(inputPath, fn))
+    tier = tg.tierDict["Mother"]
+    laughterIndex = getLaughterIndex(tg, "Mother's Backchannel")
+    for start, stop, label in tier.getEntries():
+        isInsitu = insituLaughterCheck(start, stop, tg, "Mother's Backchannel",
+                                       laughterIndex)
+        if isInsitu:
+            outputList.append("%s,%02.02f,%02.02f,%s" % (fn, start, stop, label))
+    
+    return outputList
+
+
+def extractTGInfo(inputPath, outputPath, tierName, laughterTierName, searchForMothersSpeech,
+                  nameList=None):
     '''
     Same as textgrids.extractTGInfo?
     
@@ -430,155 +710,404 @@ def extractTGInfo(inputPath, outputPath, tierName, laughterTierName, searchForMo
     minDuration = 0.15 # Time in seconds
     
     
-    for name in utils.findFiles(inputPath, filterExt=".TextGrid", stripExt=True):
-        print name
-        
-        tg = praatio.openTextGrid(join(inputPath, name+".TextGrid"))
-        tier = tg.tierDict[tierName]
-        entryList = tier.getEntries()
+    jobList = [(name, (inputPath, outputPath, tierName, searchForMothersSpeech,
+                       name))
+               for name in findSessionFiles(inputPath, ".TextGrid", nameList,
+                                            stripExt=True)]
+    return executor.mapFiles(_extractTGInfoForFile, jobList)[1]
+
+
+def _extractTGInfoForFile(inputPath, outputPath, tierName,
+                          searchForMothersSpeech, name):
+    
+    print name
+    
+    tg = textgrid_reader.openTextgrid(join(inputPath, name+".TextGrid"))
+    tier = tg.tierDict[tierName]
+    
+    outputTxt = _getTGInfoText(tier.getEntries(), searchForMothersSpeech)
+    codecs.open(join(outputPath, name + ".txt"), "w", encoding="utf-8").write(outputTxt)
         
-        if searchForMothersSpeech:
-            entryList = [(start, stop, label) for start, stop, label in entryList
-                         if label == "MS"]
+
+def _getTGInfoText(entryList, searchForMothersSpeech):
+    
+    tier = array_tier.ArrayTier.fromEntryList(None, entryList)
+    if searchForMothersSpeech:
+        tier = tier.select(tier.find("MS"))
+    
+    outputList = ["%f,%f,%s" % entry for entry in tier.toEntryList()]
         
-        outputList = []
-        for start, stop, label in entryList:
-            outputList.append( "%f,%f,%s" % (start, stop, label) )
-            
-        outputTxt = "\n".join(outputList) + "\n"
-        codecs.open(join(outputPath, name + ".txt"), "w", encoding="utf-8").write(outputTxt)
+    return "\n".join(outputList) + "\n"
         
 
 def removeFilledPauses(inputPath, outputPath):
     
     utils.makeDir(outputPath)
     
-    for fn in utils.findFiles(inputPath, filterExt=".txt"):
-        dataList = utils.openCSV(inputPath, fn)
-        dataList = [[start, stop, label] for start, stop, label in dataList if label == "MS"]
-        dataList = [",".join(row) for row in dataList]
-        open(join(outputPath, fn), "w").write("\n".join(dataList) + "\n")
-        
+    jobList = [(fn, (inputPath, outputPath, fn))
+               for fn in utils.findFiles(inputPath, filterExt=".txt")]
+    return executor.mapFiles(_removeFilledPausesInFile, jobList)[1]
 
-def extractPraatPitchForEpochs(pitchPath, epochPath, tgInfoPath, outputPath):
+
+def _removeFilledPausesInFile(inputPath, outputPath, fn):
     
-    utils.makeDir(outputPath)
-       
-    for fn in utils.findFiles(pitchPath, filterExt=".txt"):
-        name = os.path.splitext(fn)[0]
+    dataList = utils.openCSV(inputPath, fn)
+    
+    # The rows are written back as they were read
+    codeArray, labelList = array_tier.internLabels([row[2] for row in dataList])
+    isSpeech = np.isin(codeArray, [code for code, label in enumerate(labelList)
+                                   if label == "MS"])
+    dataList = [",".join(dataList[i]) for i in np.flatnonzero(isSpeech)]
+    open(join(outputPath, fn), "w").write("\n".join(dataList) + "\n")
         
-        print name
 
-        epochList = utils.openCSV(epochPath, fn)
-        epochList = [(epochNum, float(start), float(stop)) for epochNum, start, stop in epochList]
-        
-        entryList = utils.openCSV(tgInfoPath, fn)
-        entryList = [(float(start), float(stop), label) for start, stop, label in entryList]
-        
-        dataList = praat_pi.loadPitchAndTime(pitchPath, fn)
+def medianFilterPitch(pitchPath, windowList, filterZeroFlag=False,
+                      binaryFlag=False, nameList=None):
+    '''
+    Median filters the f0 of each pitch track with several window sizes
+    
+    windowList holds (windowSize, outputPath) pairs.  Each track is read
+    once and written to every output folder.  pitchPath may be a binary
+    folder (see binary_tables); with binaryFlag, a binary copy of each
+    output is written as well.
+    
+    By default unvoiced samples (f0 of zero) are filtered like any other.
+    With filterZeroFlag, they are left at zero and each voiced stretch is
+    filtered on its own.
+    '''
+    for windowSize, outputPath in windowList:
+        utils.makeDir(outputPath)
+        if binaryFlag:
+            utils.makeDir(binary_tables.getBinaryPath(outputPath))
+    
+    jobList = [(name + ".txt", (pitchPath, windowList, filterZeroFlag,
+                                binaryFlag, name))
+               for name in binary_tables.findTableNames(pitchPath, nameList)]
+    return executor.mapFiles(_medianFilterPitchForFile, jobList)[1]
+
+
+def _medianFilterPitchForFile(pitchPath, windowList, filterZeroFlag,
+                              binaryFlag, name):
+    
+    table = binary_tables.loadTable(pitchPath, name, binary_tables.PITCH)
+    timeArray, f0Array = table["time"], table["f0"]
+    intensityArray = table["intensity"]
+    
+    runStartArray, runStopArray = None, None
+    if filterZeroFlag:
+        runStartArray, runStopArray = pitch_tracks.getVoicedRuns(f0Array)
+    
+    timeList = timeArray.tolist()
+    intensityList = intensityArray.tolist()
+    for windowSize, outputPath in windowList:
+        filteredArray = pitch_tracks.medianFilter(f0Array, windowSize,
+                                                  runStartArray, runStopArray)
         
-        # Get F0 values for the intervals when the mother was speaking
-        speechDataList = []
-        for start, stop, label in entryList:
-            speechDataList.extend(praat_pi.getAllValuesInTime(start, stop, dataList))
+        outputList = ["%s,%s,%s" % row for row in zip(timeList,
+                                                      filteredArray.tolist(),
+                                                      intensityList)]
+        open(join(outputPath, name + ".txt"), "w").write("\n".join(outputList) + "\n")
         
-        # Get F0 values for the times the mother is speaking for each epoch
-        pitchData = []
-        for epochNum, start, stop in epochList:
-            start, stop = float(start), float(stop)
-            duration = stop - start
-            epochValueList = praat_pi.getAllValuesInTime(start, stop, speechDataList)
-            f0List = [f0Val for time, f0Val, intVal in epochValueList]
-            
-            pitchData.append(praat_pi.extractPitchMeasuresForSegment(f0List, name, epochNum, medianFilterWindowSize=None, filterZeroFlag=True))
+        if binaryFlag:
+            outputTable = binary_tables.makeTable(binary_tables.PITCH,
+                                                  [timeArray, filteredArray,
+                                                   intensityArray])
+            binary_tables.saveTable(join(binary_tables.getBinaryPath(outputPath),
+                                         name + binary_tables.BINARY_EXT),
+                                    binary_tables.PITCH, outputTable)
+
+
+def extractPraatPitchForEpochs(pitchPath, epochPath, tgInfoPath, outputPath,
+                               chunkDuration=None, nameList=None):
+    '''
+    Pitch measures for the mother's speech in each epoch
+    
+    Any of pitchPath, epochPath and tgInfoPath may be binary folders
+    (see binary_tables).  If chunkDuration is given, each pitch track is
+    read in chunks of about that many seconds, cut at epoch boundaries,
+    rather than all at once (see pitch_tracks.getPitchMeasuresStreaming()),
+    for recordings too long to hold in memory.
+    '''
+    utils.makeDir(outputPath)
+    
+    jobList = [(name + ".txt", (pitchPath, epochPath, tgInfoPath, outputPath,
+                                chunkDuration, name))
+               for name in binary_tables.findTableNames(pitchPath, nameList)]
+    return executor.mapFiles(_extractPraatPitchForFile, jobList)[1]
+
+
+def _extractPraatPitchForFile(pitchPath, epochPath, tgInfoPath, outputPath,
+                              chunkDuration, name):
+    
+    print name
+
+    epochTable = binary_tables.loadTable(epochPath, name, binary_tables.EPOCHS)
+    epochNumList = epochTable["epoch"].tolist()
+    epochStartArray = epochTable["start"]
+    epochStopArray = epochTable["stop"]
+    
+    entryTable = binary_tables.loadTable(tgInfoPath, name,
+                                         binary_tables.TG_INFO)
+    entryStartArray = entryTable["start"]
+    entryStopArray = entryTable["stop"]
+    
+    if chunkDuration is not None:
+        measureArray = pitch_tracks.getPitchMeasuresStreaming(pitchPath, name,
+                                                              entryStartArray,
+                                                              entryStopArray,
+                                                              epochStartArray,
+                                                              epochStopArray,
+                                                              chunkDuration)
+    else:
+        timeArray, f0Array = pitch_tracks.loadPitchTrack(pitchPath, name)[:2]
         
-        open(join(outputPath, "%s.txt" % name), "w").write("\n".join(pitchData) + "\n")
+        # The F0 values for the intervals when the mother was speaking
+        speechMask = pitch_tracks.getIntervalMask(timeArray, entryStartArray,
+                                                  entryStopArray)
         
+        # Pitch measures for the times the mother is speaking for each epoch
+        measureArray = pitch_tracks.getPitchMeasures(timeArray, f0Array,
+                                                     speechMask,
+                                                     epochStartArray,
+                                                     epochStopArray)
+    pitchData = [pitch_tracks.formatPitchMeasures(name, epochNum, measureRow)
+                 for epochNum, measureRow in zip(epochNumList, measureArray)]
+    
+    open(join(outputPath, "%s.txt" % name), "w").write("\n".join(pitchData) + "\n")
+    
 
 def extractMotherSpeech(wavPath, textgridPath, mothersSpeechName,
-                        outputWavPath, outputTextgridPath):
+                        outputWavPath, outputTextgridPath, nameList=None):
     
     utils.makeDir(outputWavPath)
     utils.makeDir(outputTextgridPath)
     
-    for name in utils.findFiles(wavPath, filterExt=".wav", stripExt=True,):
-        print name
-        tg = praatio.openTextGrid(join(textgridPath, name+".TextGrid"))
-        speechTier = tg.tierDict[mothersSpeechName]
-        for i, entry in enumerate(speechTier.entryList):
-            subName = "%s_%03d" % (name, i)
-            start, stop, label = entry
-            start, stop = float(start), float(stop)
-            audio_scripts.extractSubwav(join(wavPath, name+".wav"), 
-                                        join(outputWavPath, subName+".wav" ),
-                                             start, stop, 
-                                             singleChannelFlag=True)
-            subTG = tg.crop(strictFlag=False, softFlag=False, 
-                            startTime=start, endTime=stop)
-            subTG.save(join(outputTextgridPath, subName+".TextGrid"))
-
-
-def generateEpochRowHeader(epochPath, outputPath, sessionCode):
+    jobList = [(name, (wavPath, textgridPath, mothersSpeechName,
+                       outputWavPath, outputTextgridPath, name))
+               for name in findSessionFiles(wavPath, ".wav", nameList, stripExt=True)]
+    return executor.mapFiles(_extractMotherSpeechForFile, jobList)[1]
+
+
+def _extractMotherSpeechForFile(wavPath, textgridPath, mothersSpeechName,
+                                outputWavPath, outputTextgridPath, name):
     
-    utils.makeDir(outputPath)
+    print name
+    tg = textgrid_reader.openTextgrid(join(textgridPath, name+".TextGrid"))
+    speechTier = tg.tierDict[mothersSpeechName]
+    
+    windowList = []
+    segmentList = []
+    for i, entry in enumerate(speechTier.entryList):
+        subName = "%s_%03d" % (name, i)
+        start, stop, label = entry
+        start, stop = float(start), float(stop)
+        windowList.append( (start, stop) )
+        segmentList.append( (start, stop, join(outputWavPath, subName+".wav")) )
     
-    for fn in utils.findFiles(epochPath, filterExt=".txt"):
-        epochList = utils.openCSV(epochPath, fn)
+    # The session wav is memory-mapped once for all of its segments
+    audio_segments.extractSegments(join(wavPath, name+".wav"), segmentList,
+                                   singleChannelFlag=True)
+    
+    for i, subTG in enumerate(_cropToWindows(tg, windowList)):
+        subName = "%s_%03d" % (name, i)
+        subTG.save(join(outputTextgridPath, subName+".TextGrid"))
+
+
+def _cropToWindows(tg, windowList):
+    '''
+    Same as tg.crop(strictFlag=False, softFlag=False) for each window, but
+    each tier is swept only once
+    '''
+    subTGList = [praatio.Textgrid() for window in windowList]
+    for tierName in tg.tierNameList:
+        tier = tg.tierDict[tierName]
+        if isinstance(tier, praatio.IntervalTier):
+            croppedList = interval_algebra.cropToWindows(windowList,
+                                                         tier.entryList)
+            tierClass = praatio.IntervalTier
+        else:
+            croppedList = interval_algebra.cropPointsToWindows(windowList,
+                                                               tier.entryList)
+            tierClass = praatio.PointTier
         
+        for subTG, (start, stop), entryList in zip(subTGList, windowList,
+                                                   croppedList):
+            subTG.addTier(tierClass(tierName, entryList, start, stop))
+    
+    return subTGList
+
+
+def generateEpochRowHeader(epochPath, outputPath, sessionCode, nameList=None):
+    '''
+    The epoch files and session ids come from the session catalog of the
+    folder epochPath is in (see session_catalog).  epochPath is rescanned
+    first--one listing--so files added or removed since are accounted for.
+    '''
+    utils.makeDir(outputPath)
+    
+    workingPath, folder = os.path.split(os.path.normpath(epochPath))
+    catalog = session_catalog.SessionCatalog(workingPath)
+    catalog.scanFolder(folder, hashFlag=False)
+    artifactList = catalog.getArtifacts([folder], nameList=nameList,
+                                        extList=[".txt"], segmentFlag=False)
+    
+    jobList = [(fn, (epochPath, outputPath, sessionCode,
+                     catalog.getSession(name)[2], fn))
+               for artifactFolder, fn, name, segment in artifactList]
+    catalog.close()
+    
+    return executor.mapFiles(_generateEpochRowHeaderForFile, jobList)[1]
+
+
+def _generateEpochRowHeaderForFile(epochPath, outputPath, sessionCode, id, fn):
+    
+    epochList = utils.openCSV(epochPath, fn)
+    
+    # Names the catalog can't parse
+    if id is None:
         id = fn.split("_")[2]
-        
-        outputList = [",".join([id, sessionCode, epoch, epochStart, epochEnd, str(float(epochEnd) - float(epochStart))]) for epoch, epochStart, epochEnd in epochList]
-        
-        open(join(outputPath, fn), "w").write("\n".join(outputList) + "\n")
+    
+    outputList = [",".join([id, sessionCode, epoch, epochStart, epochEnd, str(float(epochEnd) - float(epochStart))]) for epoch, epochStart, epochEnd in epochList]
+    
+    open(join(outputPath, fn), "w").write("\n".join(outputList) + "\n")
 
 
 def adjustEpochNumbers(inputPath, outputPath):
     
     utils.makeDir(outputPath)
     
-    for fn in utils.findFiles(inputPath, filterExt=".txt"):
-        dataList = utils.openCSV(inputPath, fn)
-        dataList = ["%02d,%s,%s" % (int(id)+1,start, stop) 
-                    for id, start, stop in dataList]
-        
-        open(join(outputPath, fn), "w").write("\n".join(dataList) + "\n")
+    jobList = [(fn, (inputPath, outputPath, fn))
+               for fn in utils.findFiles(inputPath, filterExt=".txt")]
+    return executor.mapFiles(_adjustEpochNumbersInFile, jobList)[1]
+
+
+def _adjustEpochNumbersInFile(inputPath, outputPath, fn):
+    
+    dataList = utils.openCSV(inputPath, fn)
+    dataList = ["%02d,%s,%s" % (int(id)+1,start, stop) 
+                for id, start, stop in dataList]
+    
+    open(join(outputPath, fn), "w").write("\n".join(dataList) + "\n")
+
 
 # Corresponding text files annotating the start and end times of each epoch 
 # can be derived from textgrids.  The textgrids must have an interval tier 
 # called "Epochs" which has been annotated with epoch intervals.
-def generateEpochFiles(tgPath, wavPath, epPath):
+def generateEpochFiles(tgPath, wavPath, epPath, epochDuration=None,
+                       nameList=None):
+    '''
+    Writes the epoch files, from the "Epochs" tiers if the textgrids have them
+    
+    The wav files of the sessions whose textgrids don't are split into
+    epochs of epochDuration seconds.  If epochDuration is None, those
+    sessions fail instead; the others are still written.  Returns the
+    errors.
+    '''
     utils.makeDir(epPath)
-    try:
-        for filename in utils.findFiles(tgPath, filterExt=".TextGrid", stripExt=True):
-            tgrid = praatio.openTextGrid(os.path.join(tgPath, filename+".TextGrid"))
-            with open(os.path.join(epPath, filename+".txt"), "w") as epochFile:
-                for (start,stop,label) in tgrid.tierDict["Epochs"].entryList:
-                    epochFile.write(str(label)+','+str(start)+','+str(stop)+'\n')
-
-    except:
-        epDuration = int(raw_input("\nOk, the textgrids don't have an 'Epochs' tier.  How long are the epochs in this dataset?\nEnter the epoch duration in seconds: "))
-        print("\nOk. Epochs are each %dsecs max.\n" % epDuration)    
-#def generatePlayEpochs(path, outputPath):
-    
-        durationList = []
-        for fn in utils.findFiles(wavPath, filterExt=".wav"):
-            duration = audio_scripts.getSoundFileDuration(join(wavPath, fn))
-            durationList.append( (fn, int(duration)) )
-        
-        durationList.sort()
+    
+    noEpochList = findTextgridsWithoutTier(tgPath, "Epochs", nameList)
+    noEpochSet = set(noEpochList)
+    jobList = [(filename, (tgPath, epPath, filename))
+               for filename in findSessionFiles(tgPath, ".TextGrid", nameList, stripExt=True)
+               if filename not in noEpochSet]
+    errorList = executor.mapFiles(_writeEpochFileFromTextgrid, jobList)[1]
+
+    if len(noEpochList) == 0:
+        return errorList
+    
+    if epochDuration is None:
+        return errorList + [(filename, "No 'Epochs' tier and no epochDuration "
+                             "was given to split the wav file with\n")
+                            for filename in noEpochList]
+    
+    return errorList + generateEpochFilesFromWavs(wavPath, epPath,
+                                                  epochDuration, noEpochList)
+
+
+def findTextgridsWithoutTier(tgPath, tierName, nameList=None):
+    '''
+    The sessions in tgPath whose textgrids have no tier called tierName
+    
+    Textgrids that can't be read aren't included; the stages that read
+    them report the error.
+    '''
+    missingList = []
+    for name in findSessionFiles(tgPath, ".TextGrid", nameList, stripExt=True):
+        try:
+            tg = textgrid_reader.openTextgrid(join(tgPath, name + ".TextGrid"))
+        except Exception:
+            continue
+        if tierName not in tg.tierNameList:
+            missingList.append(name)
+    
+    return missingList
+
+
+def generateEpochFilesFromWavs(wavPath, epPath, epochDuration, nameList=None):
+    '''
+    Splits each wav file into epochs of epochDuration seconds
+    
+    Durations are read from the wav headers alone and the epochs for the
+    whole folder are computed at once.  Durations are truncated to whole
+    seconds.  If a file doesn't divide evenly, the final, shorter epoch is
+    numbered one past the next number in sequence, as it always has been.
+    
+    Returns the list of (fn, traceback) for the files that failed,
+    including the sessions in nameList that have no wav file.
+    '''
+    utils.makeDir(epPath)
+    
+    errorList = []
+    fnList = findSessionFiles(wavPath, ".wav", nameList)
+    if nameList is not None:
+        foundSet = set(os.path.splitext(fn)[0] for fn in fnList)
+        errorList += [(name + ".wav", "No wav file in %s\n" % wavPath)
+                      for name in nameList if name not in foundSet]
+    
+    durationList = []
+    for fn in list(fnList):
+        try:
+            durationList.append(int(audio_segments.readWavHeader(join(wavPath, fn)).duration))
+        except Exception:
+            errorList.append((fn, traceback.format_exc()))
+            fnList.remove(fn)
+    durationArray = np.array(durationList, dtype=np.int64)
+    epochDuration = int(epochDuration)
+    
+    # The full epochs, then the remainder epoch for each file
+    numFullArray = durationArray // epochDuration
+    remainderArray = durationArray % epochDuration
+    numEpochArray = numFullArray + (remainderArray != 0)
+    
+    fileIArray = np.repeat(np.arange(len(fnList)), numEpochArray)
+    firstRowArray = np.cumsum(numEpochArray) - numEpochArray
+    epochIArray = np.arange(len(fileIArray)) - np.repeat(firstRowArray, numEpochArray)
+    
+    startArray = epochIArray * epochDuration
+    stopArray = startArray + epochDuration
+    isRemainder = epochIArray == numFullArray[fileIArray]
+    stopArray[isRemainder] = startArray[isRemainder] + remainderArray[fileIArray[isRemainder]]
+    epochIArray[isRemainder] += 1
+    
+    rowArray = np.column_stack((epochIArray, startArray, stopArray))
+    for i, fn in enumerate(fnList):
+        subRowArray = rowArray[firstRowArray[i]:firstRowArray[i] + numEpochArray[i]]
+        epochList = ["%02d, %02d, %02d" % tuple(row) for row in subRowArray.tolist()]
         
-        for fn, duration in durationList:
-#            if '045' in fn:
-#                print 'hello'
-            outputFN = os.path.splitext(fn)[0] + ".txt"
-            
-            numEpoches = int(duration / epDuration)
-            epochList = [(i, i*epDuration,(i+1)*epDuration) for i in xrange((numEpoches))]
-            if duration % epDuration != 0:
-                startTime = (numEpoches)*epDuration
-                epochList.append( (numEpoches+1, startTime, startTime+(duration%epDuration) ) )
-                
-            epochList = ["%02d, %02d, %02d" % row for row in epochList]
-            
+        outputFN = os.path.splitext(fn)[0] + ".txt"
+        try:
             with open(join(epPath, outputFN), "w") as epochFN:
                 epochFN.write("\n".join(epochList) + "\n")
+        except Exception:
+            errorList.append((fn, traceback.format_exc()))
+    
+    return errorList
+
+
+def _writeEpochFileFromTextgrid(tgPath, epPath, filename):
+    
+    tgrid = textgrid_reader.openTextgrid(os.path.join(tgPath, filename+".TextGrid"))
+    epochTier = tgrid.tierDict["Epochs"]
+    with open(os.path.join(epPath, filename+".txt"), "w") as epochFile:
+        for (start,stop,label) in epochTier.entryList:
+            epochFile.write(str(label)+','+str(start)+','+str(stop)+'\n')
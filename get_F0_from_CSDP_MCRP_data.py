@@ -18,13 +18,37 @@ from pyacoustics import aggregate_features
 
 import praatio
 
+import binary_tables
+import build_manifest
+import executor
 import general_CSDP_MCRP
+import instrumentation
+import interval_algebra
+import label_normalizer
+import pitch_extraction
+import pipeline
+import session_catalog
+import speech_rate
+import textgrid_reader
 
 
 def justPitch(inputPath, outputPath):
+    '''
+    Writes only the f0 column of each pitch track
+
+    inputPath may be a binary folder (see binary_tables).
+    '''
     utils.makeDir(outputPath)
     
-    for fn in utils.findFiles(inputPath, filterExt=".txt"):
+    for name in binary_tables.findTableNames(inputPath):
+        fn = name + ".txt"
+        if os.path.exists(join(inputPath, name + binary_tables.BINARY_EXT)):
+            table = binary_tables.loadTable(inputPath, name,
+                                            binary_tables.PITCH)
+            newValList = [str(val) for val in table["f0"].tolist()]
+            open(join(outputPath, fn), "w").write("\n".join(newValList) + "\n")
+            continue
+        
         valList = utils.openCSV(inputPath, fn, valueIndex=1)
         
         newValList = []
@@ -54,149 +78,87 @@ def correctTextgrids(inputDir, outputDir, correctDictFullPath):
         
         newEntryList = []
         for start, stop, label in tier.entryList:
-
-            label = _filterLabelFunction(label)
-            
-            wordList = []
-            for word in label.split(" "):
-                word = word.strip()
-                if word == "":
-                    continue
-                try:
-                    newWord = wordReplaceDict[word]
-                    print z, word, newWord
-                    z += 1
-                    word = newWord
-                except KeyError:
-                    pass # No change
-                wordList.append(word)
-            newLabel = " ".join(wordList)
+            newLabel, replacementList = label_normalizer.correctLabel(label,
+                                                                      wordReplaceDict)
+            for word, newWord in replacementList:
+                print z, word, newWord
+                z += 1
             newEntryList.append( (start, stop, newLabel) )
         
         tg.replaceTier("Mother", newEntryList)
         tg.save(join(outputDir, fn))
 
 
-def _filterLabelFunction(label):
-    label = label.lower()
-    
-    # Strip punctuation
-    # 'nc' - 'not comprehensible'?
-    for char in ['.', '!', '?', ',', "' ", " '", ';', ',', '--', 'nc', '(nc)', '`']:
-        label = label.replace(char, ' ')
-    
-    label = label.replace('(', '<')
-    label = label.replace(')', '>')
-    
-    # Strip speech mode labels
-    for mode in ['<whispers>', '<whispering>', '<whispered>', 
-                 '<sad voice>', '<normal>', 
-                 '<laughing>', '<laughter>']:
-        label = label.replace(mode, ' ')
-
-    # Remove any general mode that contains 'voice' e.g. 'normal voice'
-    for subLabel in ['voice',]:
-        label = _matchDemarker(label, '<', '>', subLabel)  
-
-    # Remove specific tags (each one only occurs once)
-    for subLabel in ['<mika presumably short for mikayla>',
-                 "<the why don't ya is extremely slurred>",
-                 "<back to normal>",
-                 "<this was said very slurred>",
-                 "<not sure if correct>",]:
-        label = label.replace(subLabel, ' ')
-        
-    label = label.strip()
+def mergePlayTextgrids(origTGPath, laughterTGPath, outputPath):
     
-    for startMarker, endMarker in [('[', ']')]:
-        label = _matchDemarker(label, startMarker, endMarker)
+    utils.makeDir(outputPath)
     
-    # If any < > tag is still in the label, wipe the label
-    # it may represent some portion of the text that was not correctly
-    # transcribed or untranscribable--such as laughter or onomatopoeia
-    if '<' in label:
-        start = label.index('<')
-        end = label.index('>')
-        
-        label = label[:start] + label[end+1:]
+    jobList = [(fn, (origTGPath, laughterTGPath, outputPath, fn))
+               for fn in utils.findFiles(origTGPath, filterExt=".TextGrid")
+               if not os.path.exists(join(outputPath, fn))]
+    return executor.mapFiles(_mergePlayTextgrid, jobList)[1]
 
-    return label
 
-
-def _matchDemarker(label, startMarker, endMarker, subLabel=None):
+def _mergeSpeechEntries(origSpeechEntryList, laughEntryList,
+                        laughSpeechEntryList):
+    '''
+    The speech entries after swapping in the laughter-checked speech
     
-    startIndex = 0
-
-    while True:
-#         print startIndex
-        try:
-            startIndex = label.index(startMarker, startIndex)
-        except ValueError:
-            break
-        
-        endIndex = label.index(endMarker, startIndex)
+    For each laughter span in turn, the speech entries touching it are
+    swapped for the entries of laughSpeechEntryList that touch them.  A
+    span sees the entries swapped in for the spans before it, as it always
+    has, so the spans are handled one at a time--but on an
+    interval_algebra.IntervalList rather than a praatio tier.  All three
+    lists must be sorted and non-overlapping, as the entries of any tier
+    are.  benchmarks/check_equivalence.py compares this against the
+    praatio-style loop.
+    '''
+    speechList = interval_algebra.IntervalList(origSpeechEntryList)
+    laughSpeechList = interval_algebra.IntervalList(laughSpeechEntryList)
+    interval_algebra.checkSorted(laughEntryList)
     
-        if subLabel == None or subLabel in label[startIndex:endIndex]:
-            label = label[:startIndex] + label[endIndex+1:]
-        else:
-            label = label
-            startIndex = endIndex
+    for start, stop, label in laughEntryList:
+        laughSpeechMatches = []
+        for entry in speechList.getEntries(start, stop, boundaryInclusive=True):
+            speechList.deleteEntry(entry)
+            laughSpeechMatches.extend(laughSpeechList.getEntries(entry[0],
+                                                                 entry[1],
+                                                                 boundaryInclusive=True))
+        for entry in laughSpeechMatches:
+            speechList.insert(entry)
     
-    return label
+    return speechList.entryList
 
 
-def mergePlayTextgrids(origTGPath, laughterTGPath, outputPath):
+def _mergePlayTextgrid(origTGPath, laughterTGPath, outputPath, fn):
+    '''
+    Replaces the speech around each "LA" span with the laughter-checked speech
     
-    utils.makeDir(outputPath)
+    The laughter spans are merged into the laughter tier and the speech
+    tier is rebuilt by _mergeSpeechEntries(); each tier is replaced once.
+    '''
     
     speechTierName = "Mother"
     laughTierName = "Mother's Backchannel"
     
-    for fn in utils.findFiles(origTGPath, filterExt=".TextGrid"):
-        if os.path.exists(join(outputPath, fn)):
-            continue
-        print fn
-        origTG = praatio.openTextGrid(join(origTGPath, fn))
-        laughTG = praatio.openTextGrid(join(laughterTGPath, fn))
-        
-        origSpeechTier = origTG.tierDict[speechTierName]
-        origLaughTier = origTG.tierDict[laughTierName]
-        
-        laughEntryList = laughTG.tierDict[laughTierName].find("LA")
-        laughSpeechTier = laughTG.tierDict[speechTierName]
-        
-        for start, stop, label in laughEntryList:
-            origLaughTier.insert((start, stop, label), warnFlag=True,
-                                 collisionCode="replace")
-            
-            origSpeechMatches = origSpeechTier.getEntries(start, stop, boundaryInclusive=True)
-            laughSpeechMatches = []
-            for entry in origSpeechMatches:
-                origSpeechTier.deleteEntry(entry)
-                
-                subStart, subStop, subLabel = entry
-                laughSpeechMatches.extend(laughSpeechTier.getEntries(subStart, subStop, boundaryInclusive=True))
-            laughSpeechMatch = set(laughSpeechMatches)
-            for entry in laughSpeechMatches:
-                origSpeechTier.insert(entry, warnFlag=True, collisionCode="replace")
-            
-#             # Need to delete any possible matches from the orig textgrids
-#             if len(laughSpeechMatches) == 0:
-#                 origSpeechMatches = origSpeechTier.getEntries(start, stop, boundaryInclusive=True)
-#                 for entry in origSpeechMatches:
-#                     origSpeechTier.delete(entry)
-#             
-#             # Need to replace the entries in the origSpeechTier with those in
-#             # the laughSpeechTier
-#             else:
-#                 for entry in laughSpeechMatches:
-#                     origSpeechTier.insert(entry, 
-#                                           warnFlag=True, 
-#                                           collisionCode="replace")
-        
-        origTG.replaceTier(speechTierName, origSpeechTier.entryList)
-        origTG.replaceTier(laughTierName, origLaughTier.entryList)
-        origTG.save(join(outputPath, fn))
+    print fn
+    origTG = praatio.openTextGrid(join(origTGPath, fn))
+    laughTG = praatio.openTextGrid(join(laughterTGPath, fn))
+    
+    origSpeechEntryList = origTG.tierDict[speechTierName].entryList
+    origLaughEntryList = origTG.tierDict[laughTierName].entryList
+    
+    laughEntryList = laughTG.tierDict[laughTierName].find("LA")
+    laughSpeechEntryList = laughTG.tierDict[speechTierName].entryList
+    
+    speechEntryList = _mergeSpeechEntries(origSpeechEntryList, laughEntryList,
+                                          laughSpeechEntryList)
+    laughEntryList = interval_algebra.replaceIntervals(origLaughEntryList,
+                                                       laughEntryList)
+    
+    origTG.replaceTier(speechTierName, speechEntryList)
+    origTG.replaceTier(laughTierName, laughEntryList)
+    origTG.save(join(outputPath, fn))
         
 
 # Combines information in the textgrids with laughter checks with the 
@@ -212,56 +174,215 @@ def mergePlayTextgrids(origTGPath, laughterTGPath, outputPath):
 #                           "play_session_pronunciation_output.csv"), 
 #                      )
         
-def playTask_step1(path):
-
-    # Generates a series of textgrid files that have been cleaned and
-    # with the mother's speech isolated from room noise and child speech
-    general_CSDP_MCRP.generateEpochFiles(join(path, "textgrids_intervals_marked"),
-                                         join(path, "wavs"),
-                                         join(path, "epochs")
-                                         )
-
+def recordArtifacts(path, stepPipeline, hashFlag=False):
+    '''
+    Records the files each stage of a pipeline wrote in the session catalog
+    
+    The outputs are only hashed with hashFlag (the segment wavs alone are
+    sizeable).  The input folders in path are recorded too, without a
+    stage or hashes.  See session_catalog.
+    '''
+    catalog = session_catalog.SessionCatalog(path)
+    
+    outputPathSet = set()
+    for stage in stepPipeline.stageList:
+        catalog.recordStage(stage.name, stage.outputPathList, hashFlag)
+        outputPathSet.update(stage.outputPathList)
+    
+    for stage in stepPipeline.stageList:
+        for inputPath in stage.inputPathList:
+            folder = os.path.relpath(inputPath, path)
+            if inputPath in outputPathSet or folder.startswith(os.pardir):
+                continue
+            catalog.scanFolder(folder, hashFlag=False)
+            outputPathSet.add(inputPath)
+    
+    catalog.close()
 
-    general_CSDP_MCRP.processTextgrids(path, "textgrids_intervals_marked", 
-#                                 includeMothersPhones=True)
-                                 )
 
-    general_CSDP_MCRP.simplifyTextgrids(join(path, "textgrids_w_epochs_filtered_for_child_speech"),
-                                    join(path, "textgrids_w_epochs_filtered_for_child_speech_two_label")
-                                    )
- 
-    general_CSDP_MCRP.simplifyTextgrids(join(path, "textgrids_w_epochs_filtered_for_room_noise"),
-                                    join(path, "textgrids_w_epochs_filtered_for_room_noise_two_label")
-                                    )
-    general_CSDP_MCRP.simplifyTextgrids(join(path, "textgrids_w_epochs_final_non_isolated"),
-                                   join(path, "textgrids_w_epochs_final_non_isolated_two_label")
-                                   )
+def playTask_step1(path, fusedFlag=False, epochDuration=None,
+                   incrementalFlag=False, speechRateFlag=False,
+                   nameList=None):
+    '''
+    With incrementalFlag, each stage only reprocesses the sessions whose
+    input files or parameters have changed since the last run (as recorded
+    in the build manifest in path)
+    
+    The stages run as a pipeline.Pipeline: each session moves on to the
+    next stage as soon as it is ready, independently of the others.  If
+    nameList is given, only those sessions are processed.
+    
+    With speechRateFlag, the syllable nuclei of the mother's speech are
+    also found (see speech_rate), in place of running extractSpeechRate()
+    in MATLAB between steps 1 and 3.
+    
+    The time, memory and IO used by each stage and session are written to
+    run_report_step1.json and .csv in path (see instrumentation), and the
+    files written are recorded in the session catalog (see
+    recordArtifacts()).  Returns the errors, as pipeline.Pipeline.run()
+    does.
+    '''
+    
+    manifest = None
+    if incrementalFlag:
+        manifest = build_manifest.BuildManifest(path)
+    
+    tgPath = join(path, "textgrids_intervals_marked")
+    nameList = general_CSDP_MCRP.findSessionFiles(tgPath, ".TextGrid",
+                                                  nameList, stripExt=True)
+    stepPipeline = pipeline.Pipeline(nameList)
 
+    # Generates a series of textgrid files that have been cleaned and
+    # with the mother's speech isolated from room noise and child speech
+    # (the sessions whose textgrids have no "Epochs" tier fail if
+    # epochDuration is None)
+    stepPipeline.addStage(pipeline.Stage("generateEpochFiles",
+                                         general_CSDP_MCRP.generateEpochFiles,
+                                         (tgPath, join(path, "wavs"),
+                                          join(path, "epochs"),
+                                          epochDuration),
+                                         [tgPath, join(path, "wavs")],
+                                         [join(path, "epochs")],
+                                         paramList=[epochDuration],
+                                         subsetFlag=True))
+
+    if fusedFlag:
+        folderList = general_CSDP_MCRP.FUSED_OUTPUT_FOLDERS
+    else:
+        folderList = (["textgrids_w_epochs_final_isolated",
+                       "textgrids_two_tags"] +
+                      general_CSDP_MCRP.FUSED_DEBUG_FOLDERS)
+    stepPipeline.addStage(pipeline.Stage("processTextgrids",
+                                         general_CSDP_MCRP.processTextgrids,
+                                         (path, "textgrids_intervals_marked"),
+                                         [tgPath, join(path, "epochs")],
+                                         [join(path, folder) for folder
+                                          in folderList + ["tg_info"]],
+                                         paramList=[False, fusedFlag, 0.15],
+#                                        kwargDict={"includeMothersPhones": True,
+                                         kwargDict={"fusedFlag": fusedFlag},
+                                         sessionFlag=True))
+
+    # The fused mode writes the two-label textgrids itself
+    if not fusedFlag:
+        for folder in ["textgrids_w_epochs_filtered_for_child_speech",
+                       "textgrids_w_epochs_filtered_for_room_noise",
+                       "textgrids_w_epochs_final_non_isolated"]:
+            stepPipeline.addStage(pipeline.Stage("simplifyTextgrids:" + folder,
+                                                 general_CSDP_MCRP.simplifyTextgrids,
+                                                 (join(path, folder),
+                                                  join(path, folder + "_two_label")),
+                                                 [join(path, folder)],
+                                                 [join(path, folder + "_two_label")],
+                                                 sessionFlag=True))
 
     # Extract the wav segments and textgrids for the individual segments
     # --we'll extract the speech rate from each of these segments individually
-    general_CSDP_MCRP.extractMotherSpeech(join(path, "wavs"),
-                                     join(path, "textgrids_w_epochs_final_isolated"),
-                                     "Mother",
-                                     join(path, "wavs_subset_mothers_speech"),
-                                     join(path, "textgrids_subset_mothers_speech"))
+    stepPipeline.addStage(pipeline.Stage("extractMotherSpeech",
+                                         general_CSDP_MCRP.extractMotherSpeech,
+                                         (join(path, "wavs"),
+                                          join(path, "textgrids_w_epochs_final_isolated"),
+                                          "Mother",
+                                          join(path, "wavs_subset_mothers_speech"),
+                                          join(path, "textgrids_subset_mothers_speech")),
+                                         [join(path, "wavs"),
+                                          join(path, "textgrids_w_epochs_final_isolated")],
+                                         [join(path, "wavs_subset_mothers_speech"),
+                                          join(path, "textgrids_subset_mothers_speech")],
+                                         paramList=["Mother"],
+                                         sessionFlag=True,
+                                         namedOutputFlag=False))
+
+    # The speech rate is measured on the same segments, cut in memory.  It
+    # is a folder stage so that its per-segment jobs are spread over every
+    # worker, rather than run one after another in a session's task.
+    if speechRateFlag:
+        stepPipeline.addStage(pipeline.Stage("extractSpeechRate",
+                                             speech_rate.extractSpeechRateFromTextgrids,
+                                             (join(path, "wavs"),
+                                              join(path, "textgrids_w_epochs_final_isolated"),
+                                              "Mother",
+                                              join(path, "uwe_raw_speech_rate_mothers_speech")),
+                                             [join(path, "wavs"),
+                                              join(path, "textgrids_w_epochs_final_isolated")],
+                                             [join(path, "uwe_raw_speech_rate_mothers_speech")],
+                                             paramList=["Mother"],
+                                             subsetFlag=True,
+                                             namedOutputFlag=False))
+
+    instrumentation.reset()
+    errorList = stepPipeline.run(manifest)
+    instrumentation.writeReport(path, "run_report_step1")
+    recordArtifacts(path, stepPipeline)
 
     # Prepare the directory for the data extracted by the matlab script
+    # (if it wasn't extracted above)
     utils.makeDir(join(path, "uwe_raw_speech_rate_mothers_speech"))
+    
+    return errorList
 
 
-def playTask_step3(path, islevPath, praatScriptPath, praatExePath):
+def playTask_step3(path, islevPath, praatScriptPath, praatExePath,
+                   pitchCachePath=None, numPraatProcesses=None,
+                   pitchBackend=pitch_extraction.PRAAT, incrementalFlag=False,
+                   binaryFlag=False, minPitch=75, maxPitch=750,
+                   sampleStep=0.01, chunkDuration=None, nameList=None):
+    '''
+    See playTask_step1() for incrementalFlag and nameList
+    
+    The pitch folders are named for minPitch and maxPitch (e.g.
+    praat_f0_min_75_max_750).
+    
+    The pyacoustics stages (speech rate, aggregation) always run over
+    every session; the pitch tracks have their own cache.  The
+    speech rate and the pitch tracks don't depend on each other, so they
+    are computed at the same time.
+    
+    With binaryFlag, the filtered pitch tracks, epochs and tg_info are
+    also written as binary tables (see binary_tables), which the per-epoch
+    pitch measures are then computed from.
+    
+    With chunkDuration, the per-epoch pitch measures are computed reading
+    each pitch track about chunkDuration seconds at a time, for sessions
+    too long to load whole; the measures are the same either way.
+    
+    The run report and session catalog are written and the errors are
+    returned as for playTask_step1().
+    '''
+    
+    manifest = None
+    if incrementalFlag:
+        manifest = build_manifest.BuildManifest(path)
+    
+    nameList = general_CSDP_MCRP.findSessionFiles(join(path, "epochs"), ".txt",
+                                                  nameList, stripExt=True)
+    rawPitchFolder = "praat_f0_min_%d_max_%d" % (minPitch, maxPitch)
+    filteredPitchFolder = "praat_f0_%d_%d_median_filtered_%%d" % (minPitch,
+                                                                  maxPitch)
+    stepPipeline = pipeline.Pipeline(nameList)
 
     # Acoustic analysis
-    # (must have run extractSpeechRate() in matlab first)   
-    uwe_sr.aggregateSpeechRate(join(path, "tg_info"), 
-                               join(path, "uwe_raw_speech_rate_mothers_speech"), 
-                               join(path, "uwe_nucleus_listing_mothers_speech"), 
-                               44100)
-    uwe_sr.uwePhoneCountForEpochs(join(path, "epochs"), 
-                                  join(path, "tg_info"),
-                                  join(path, "uwe_nucleus_listing_mothers_speech"), 
-                                  join(path, "uwe_speech_rate_for_epochs"))
+    # (must have run extractSpeechRate() in matlab first, or step 1 with
+    # speechRateFlag)
+    stepPipeline.addStage(pipeline.Stage("aggregateSpeechRate",
+                                         uwe_sr.aggregateSpeechRate,
+                                         (join(path, "tg_info"), 
+                                          join(path, "uwe_raw_speech_rate_mothers_speech"), 
+                                          join(path, "uwe_nucleus_listing_mothers_speech"), 
+                                          44100),
+                                         [join(path, "tg_info"),
+                                          join(path, "uwe_raw_speech_rate_mothers_speech")],
+                                         [join(path, "uwe_nucleus_listing_mothers_speech")]))
+    stepPipeline.addStage(pipeline.Stage("uwePhoneCountForEpochs",
+                                         uwe_sr.uwePhoneCountForEpochs,
+                                         (join(path, "epochs"), 
+                                          join(path, "tg_info"),
+                                          join(path, "uwe_nucleus_listing_mothers_speech"), 
+                                          join(path, "uwe_speech_rate_for_epochs")),
+                                         [join(path, "epochs"),
+                                          join(path, "tg_info"),
+                                          join(path, "uwe_nucleus_listing_mothers_speech")],
+                                         [join(path, "uwe_speech_rate_for_epochs")]))
    
 #    dictionary_estimate.manualPhoneCount(join(path, "tg_info"),
 #                                         islevPath,
@@ -276,43 +397,101 @@ def playTask_step3(path, islevPath, praatScriptPath, praatExePath):
     # The follow code can be run over the whole audio files, regardless of epoch
     # or textgrids (we'll extract pitch information for the intervals and
     # epochs later) 
-    utils.makeDir(join(path, "praat_f0_min_75_max_750"))
-    for fn in utils.findFiles(join(path, "wavs"), filterExt=".wav",
-                              skipIfNameInList=utils.findFiles(join(path, "praat_f0_min_75_max_750"), filterExt=".txt")):
-        print fn
-        praat_pi.getPraatPitchAndIntensity(inputPath=join(path, "wavs"), 
-                                           inputFN=fn, 
-                                           outputPath=join(path, "praat_f0_min_75_max_750"), 
-                                           praatEXE=praatExePath, 
-                                           praatScriptPath=praatScriptPath, 
-                                           minPitch=75, 
-                                           maxPitch=750, 
-                                           sampleStep=0.01, 
-                                           forceRegenerate=True)
+    # Pitch tracks are cached by wav content, so only new or changed
+    # recordings are sent to Praat.  With pitchBackend "native", pitch is
+    # tracked in numpy and Praat isn't needed at all.
+    if pitchCachePath is None:
+        pitchCachePath = join(path, "praat_f0_cache")
+    stepPipeline.addStage(pipeline.Stage("extractPitch",
+                                         pitch_extraction.extractPitch,
+                                         (join(path, "wavs"),
+                                          join(path, rawPitchFolder),
+                                          pitchCachePath,
+                                          praatExePath,
+                                          praatScriptPath),
+                                         [join(path, "wavs")],
+                                         [join(path, rawPitchFolder)],
+                                         kwargDict={"minPitch": minPitch,
+                                                    "maxPitch": maxPitch,
+                                                    "sampleStep": sampleStep,
+                                                    "numProcesses": numPraatProcesses,
+                                                    "backend": pitchBackend}))
  
-    praat_pi.medianFilter(join(path, "praat_f0_min_75_max_750"), 
-                          join(path, "praat_f0_75_750_median_filtered_9"), 
-                          windowSize=9)
+    # Every window size is filtered from a single read of each track
+    medianWindowList = [(windowSize,
+                         join(path, filteredPitchFolder % windowSize))
+                        for windowSize in [5, 9, 49]]
+    medianOutputPathList = [outputPath for windowSize, outputPath
+                            in medianWindowList]
+    if binaryFlag:
+        medianOutputPathList += [binary_tables.getBinaryPath(outputPath)
+                                 for outputPath in medianOutputPathList]
+    stepPipeline.addStage(pipeline.Stage("medianFilter",
+                                         general_CSDP_MCRP.medianFilterPitch,
+                                         (join(path, rawPitchFolder),
+                                          medianWindowList),
+                                         [join(path, rawPitchFolder)],
+                                         medianOutputPathList,
+                                         paramList=[medianWindowList],
+                                         kwargDict={"binaryFlag": binaryFlag},
+                                         sessionFlag=True))
     # END whole audio file pitch extraction
 
-    general_CSDP_MCRP.extractPraatPitchForEpochs(join(path, "praat_f0_75_750_median_filtered_9"),
-                                            join(path, "epochs"),
-                                            join(path, "tg_info"),
-                                            join(path, "praat_f0_75_750_median_filtered_9_for_epochs")
-                                            )
-
-    general_CSDP_MCRP.eventStructurePerEpoch(join(path, "epochs"),
-                                        join(path, "textgrids_two_tags"),
-                                        join(path, "textgrids_w_epochs_filtered_for_child_speech_two_label"),
-                                        join(path, "textgrids_w_epochs_filtered_for_room_noise_two_label"),
-                                        join(path, "textgrids_w_epochs_final_non_isolated_two_label"),
-                                        join(path, "event_frequency_and_duration"),
-                                        "Mother",
-                                        "Mother's Backchannel")
-
-    general_CSDP_MCRP.generateEpochRowHeader(join(path, "epochs"),
-                                        join(path, "epoch_row_header"),
-                                        "P")
+    # The per-epoch pitch measures read these folders, or their binary
+    # versions (the median filter writes the binary pitch tracks itself)
+    pitchInputPathList = [join(path, filteredPitchFolder % 9),
+                          join(path, "epochs"),
+                          join(path, "tg_info")]
+    if binaryFlag:
+        for inputPath, schemaName in [(join(path, "epochs"), binary_tables.EPOCHS),
+                                      (join(path, "tg_info"), binary_tables.TG_INFO)]:
+            binaryPath = binary_tables.getBinaryPath(inputPath)
+            stepPipeline.addStage(pipeline.Stage("textToBinary:%s" % schemaName,
+                                                 binary_tables.textToBinary,
+                                                 (inputPath, schemaName, binaryPath),
+                                                 [inputPath],
+                                                 [binaryPath],
+                                                 sessionFlag=True))
+        pitchInputPathList = [binary_tables.getBinaryPath(inputPath)
+                              for inputPath in pitchInputPathList]
+
+    stepPipeline.addStage(pipeline.Stage("extractPraatPitchForEpochs",
+                                         general_CSDP_MCRP.extractPraatPitchForEpochs,
+                                         tuple(pitchInputPathList +
+                                               [join(path, filteredPitchFolder % 9 + "_for_epochs")]),
+                                         pitchInputPathList,
+                                         [join(path, filteredPitchFolder % 9 + "_for_epochs")],
+                                         kwargDict={"chunkDuration": chunkDuration},
+                                         sessionFlag=True))
+
+    twoLabelFolderList = ["textgrids_two_tags",
+                          "textgrids_w_epochs_filtered_for_child_speech_two_label",
+                          "textgrids_w_epochs_filtered_for_room_noise_two_label",
+                          "textgrids_w_epochs_final_non_isolated_two_label"]
+    stepPipeline.addStage(pipeline.Stage("eventStructurePerEpoch",
+                                         general_CSDP_MCRP.eventStructurePerEpoch,
+                                         tuple([join(path, "epochs")] +
+                                               [join(path, folder) for folder
+                                                in twoLabelFolderList] +
+                                               [join(path, "event_frequency_and_duration"),
+                                                "Mother",
+                                                "Mother's Backchannel"]),
+                                         [join(path, "epochs")] +
+                                         [join(path, folder) for folder
+                                          in twoLabelFolderList],
+                                         [join(path, "event_frequency_and_duration")],
+                                         paramList=["Mother", "Mother's Backchannel"],
+                                         sessionFlag=True))
+
+    stepPipeline.addStage(pipeline.Stage("generateEpochRowHeader",
+                                         general_CSDP_MCRP.generateEpochRowHeader,
+                                         (join(path, "epochs"),
+                                          join(path, "epoch_row_header"),
+                                          "P"),
+                                         [join(path, "epochs")],
+                                         [join(path, "epoch_row_header")],
+                                         paramList=["P"],
+                                         sessionFlag=True))
 
     headerStr = ("file,id,session,interval,int_start,int_end,int_dur,"
                  "ms_dur_s,ms_freq,ms_child_speech_filtered_dur_s,"
@@ -323,27 +502,49 @@ def playTask_step3(path, islevPath, praatScriptPath, praatExePath):
                  "uwe_sylcnt,f0_mean,"
                  "f0_max,f0_min,f0_range,f0_var,f0_std"
                  )
-    aggregate_features.aggregateFeatures(path, ["epoch_row_header", 
-                                                "event_frequency_and_duration", 
- #                                               "manual_phone_counts_for_epochs",
-                                                "uwe_speech_rate_for_epochs", 
-                                                "praat_f0_75_750_median_filtered_9_for_epochs"],
-                                         headerStr
-                                         )
+    featureFolderList = ["epoch_row_header", 
+                         "event_frequency_and_duration", 
+#                         "manual_phone_counts_for_epochs",
+                         "uwe_speech_rate_for_epochs", 
+                         filteredPitchFolder % 9 + "_for_epochs"]
+    
+    # Only waits on the folders it aggregates
+    stepPipeline.addStage(pipeline.Stage("aggregateFeatures",
+                                         aggregate_features.aggregateFeatures,
+                                         (path, featureFolderList, headerStr),
+                                         [join(path, folder) for folder
+                                          in featureFolderList],
+                                         []))
+    
+    instrumentation.reset()
+    errorList = stepPipeline.run(manifest)
+    instrumentation.writeReport(path, "run_report_step3")
+    recordArtifacts(path, stepPipeline)
+    
+    return errorList
 
 
 def playTask_F0Compare(path):
+    '''
+    Returns the list of (fn, traceback) for the textgrids that failed
+    '''
 
     # Copy F0 Check tier from edited textgrid to the origin textgrid
-    for fn in utils.findFiles(join(path, "textgrids_f0_checks"), 
-                              filterExt=".TextGrid"):
-        tg = praatio.openTextGrid(join(path, "textgrids_f0_checks", fn))
-        tier = tg.tierDict["F0 Checks"]
+    jobList = [(fn, (path, fn))
+               for fn in utils.findFiles(join(path, "textgrids_f0_checks"), 
+                                         filterExt=".TextGrid")]
+    return executor.mapFiles(_copyF0ChecksTier, jobList)[1]
+
+
+def _copyF0ChecksTier(path, fn):
     
-        tg = praatio.openTextGrid(join(path, "textgrids_intervals_marked", fn))
-        if "F0 Checks" not in tg.tierDict.keys():
-            tg.addTier(tier)
-            tg.save(join(path, "textgrids_intervals_marked", fn))
+    tg = textgrid_reader.openTextgrid(join(path, "textgrids_f0_checks", fn))
+    tier = tg.tierDict["F0 Checks"]
+    
+    tg = praatio.openTextGrid(join(path, "textgrids_intervals_marked", fn))
+    if "F0 Checks" not in tg.tierDict.keys():
+        tg.addTier(tier)
+        tg.save(join(path, "textgrids_intervals_marked", fn))
 
     # Generates a series of textgrid files that have been cleaned and
     # with the mother's speech isolated from room noise and child speech
@@ -406,11 +607,11 @@ def playTask_F0Compare(path):
     # or textgrids (we'll extract pitch information for the intervals and
     # epochs later) 
 #     for fn in utils.findFiles(join(path, "wavs"), filterExt=".wav",
-#                               skipIfNameInList=utils.findFiles(join(path, "praat_f0_min_75_max_750"), filterExt=".txt")):
+#                               skipIfNameInList=utils.findFiles(join(path, rawPitchFolder), filterExt=".txt")):
 #         print fn
 #         praat_pi.getPraatPitchAndIntensity(inputPath=join(path, "wavs"), 
 #                                            inputFN=fn, 
-#                                            outputPath=join(path, "praat_f0_min_75_max_750"), 
+#                                            outputPath=join(path, rawPitchFolder), 
 #                                            praatEXE="/Applications/praat.App/Contents/MacOS/Praat", 
 #                                            praatScriptPath="/Users/tmahrt/Dropbox/workspace/AcousticFeatureExtractionSuite/praatScripts", 
 #                                            minPitch=75, 
@@ -427,8 +628,8 @@ def playTask_F0Compare(path):
 #                           windowSize=5)
 # 
 # 
-#     praat_pi.medianFilter(join(path, "praat_f0_min_75_max_750"), 
-#                           join(path, "praat_f0_75_750_median_filtered_9"), 
+#     praat_pi.medianFilter(join(path, rawPitchFolder), 
+#                           join(path, filteredPitchFolder % 9), 
 #                           windowSize=9)
 
 #     praat_pi.medianFilter(join(path, "praat_f0"), 
@@ -436,10 +637,10 @@ def playTask_F0Compare(path):
 #                           windowSize=49)
     # END whole audio file pitch extraction
 
-#    general_CSDP_MCRP.extractPraatPitchForEpochs(join(path, "praat_f0_75_750_median_filtered_9"),
+#    general_CSDP_MCRP.extractPraatPitchForEpochs(join(path, filteredPitchFolder % 9),
 #                                            join(path, "epochs"),
 #                                            join(path, "tg_info"),
-#                                            join(path, "praat_f0_75_750_median_filtered_9_for_epochs")
+#                                            join(path, filteredPitchFolder % 9 + "_for_epochs")
 #                                            )
 # #     
 #    general_CSDP_MCRP.eventStructurePerEpoch(join(path, "epochs"),
@@ -460,7 +661,7 @@ def playTask_F0Compare(path):
 #                                                "event_frequency_and_duration", 
 #                                                "manual_phone_counts_for_epochs",
 #                                                "uwe_speech_rate_for_epochs", 
-#                                                "praat_f0_75_750_median_filtered_9_for_epochs"],
+#                                                filteredPitchFolder % 9 + "_for_epochs"],
 #                                         headerStr
 #                                         )
 
@@ -475,26 +676,25 @@ def deleteBadLaughterMergedFiles(path, featureList):
     '''
     affectedIDs = [2,4,5,6,7,8,11,15,17,19,22,30,38,39,43,48,51,56,62,67,68,74,80,86,88,109,119,124]
     
-    for feature in featureList:
-        
-        fn = "CSDP_ID_%03d_P%s"
-        
-        for id in affectedIDs:
-            for ext in [".txt", ".csv", ".TextGrid"]:
-                try:
-                    os.remove(join(path, feature, fn % (id,ext)))
-                    print "Removed: %s" % join(path, feature, fn % (id,ext))
-                except OSError:
-                    continue
+    subwavFeatureList = [#"wavs_subset_mothers_speech", 
+                         "uwe_raw_speech_rate_mothers_speech"]
+    # Only the folders being cleaned are listed
+    catalog = session_catalog.SessionCatalog(path)
+    catalog.scan(featureList + subwavFeatureList)
+    
+    artifactList = catalog.getArtifacts(featureList, idList=affectedIDs,
+                                        code="P",
+                                        extList=[".txt", ".csv", ".TextGrid"],
+                                        segmentFlag=False)
     
     # Remove subwav files
-    for feature in [#"wavs_subset_mothers_speech", 
-                    "uwe_raw_speech_rate_mothers_speech"]:      
-        fnList = utils.findFiles(join(path, feature))
-        for fn in fnList:
-            idNum = int(fn.split("_")[2])
-            if idNum in affectedIDs:
-                os.remove(join(path, feature, fn))
+    artifactList += catalog.getArtifacts(subwavFeatureList,
+                                         idList=affectedIDs)
+    
+    for feature, fn, name, segment in artifactList:
+        catalog.removeArtifact(feature, fn)
+        print "Removed: %s" % join(path, feature, fn)
+    catalog.close()
 
 def extractUtterances(path):
     
@@ -537,17 +737,21 @@ def copyFiles():
     
     path = "/Users/tmahrt/Desktop/experiments/Mother_Prosody_RAship/all_data/play"
     outputPath = "/Users/tmahrt/Desktop/experiments/Mother_Prosody_RAship/all_data/play_f0_checks"
-    idList = ["012_P", "023_P", "070_P", "109_P", "111_P"]
+    idList = [12, 23, 70, 109, 111]
     import shutil
     
-    for folder in utils.findFiles(path, filterPaths=True):
-        fnList = utils.findFiles(join(path, folder))
-        for id in idList:
-            for fn in fnList:
-                if id in fn:
-                    utils.makeDir(join(outputPath, folder))
-                    shutil.copy(join(path, folder, fn),
-                                join(outputPath, folder, fn))
+    # Every folder is copied from, so every folder is rescanned; files
+    # changed outside of the play task steps would otherwise be missed
+    catalog = session_catalog.SessionCatalog(path)
+    catalog.scan()
+    for folder, fn, name, segment in catalog.getArtifacts(idList=idList,
+                                                          code="P"):
+        if not os.path.exists(join(path, folder, fn)):
+            continue
+        utils.makeDir(join(outputPath, folder))
+        shutil.copy(join(path, folder, fn),
+                    join(outputPath, folder, fn))
+    catalog.close()
                 
 
 def guideUser(project_path):
@@ -582,7 +786,12 @@ def guideUser(project_path):
                 else:
                     print('Please enter "y" or "n"')
                     continue
-            playTask_step1(working_path)
+            epochDuration = None
+            tgPath = join(working_path, "textgrids_intervals_marked")
+            if len(general_CSDP_MCRP.findTextgridsWithoutTier(tgPath, "Epochs")) > 0:
+                epochDuration = int(raw_input("\nOk, the textgrids don't have an 'Epochs' tier.  How long are the epochs in this dataset?\nEnter the epoch duration in seconds: "))
+                print("\nOk. Epochs are each %dsecs max.\n" % epochDuration)
+            playTask_step1(working_path, epochDuration=epochDuration)
             stepStr = ("\nStep 1 complete.  Now for step 2...\n\n"
                        "Run the following command in MatLab: \n"
                        "extractSpeechRate('%s', '%s')\n\n"
@@ -626,6 +835,8 @@ if __name__ == "__main__":
     #
     # The path should be in quotes, for example:
     # project_path = "/Users/authorofnaught/Projects/Maternal_Prosody/"
+    #
+    # For unattended runs (no prompts), use batch_runner.py instead.
 
     project_path = "/Users/authorofnaught/Projects/Maternal_Prosody/results/"
     guideUser(project_path)
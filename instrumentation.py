@@ -0,0 +1,223 @@
+
+# Records how long each stage and each session took and what it cost, for
+# the run report.  Each measurement is a few getrusage() calls and, on
+# Linux, one read of /proc/self/io, so it stays on for normal runs.
+#
+# Sessions run in worker processes, so they are measured there and the
+# measurement is sent back along with the result (see executor._runJob()
+# and pipeline._runTask()); only the main process keeps records.
+#
+# The CPU time and bytes read and written are differences of counters kept
+# for the whole process, so they are only a measurement's own as long as
+# nothing else runs in that process meanwhile (one job per worker, and
+# one folder stage per process).  There is no such difference for peak
+# memory: processPeakRSS is the peak of the process over its whole life so
+# far.  Workers are reused, so it includes the sessions that ran in the
+# worker before, and for a stage run in the main process, everything the
+# main process did before it.
+
+import os
+from os.path import join
+
+import cProfile
+import csv
+import json
+import resource
+import sys
+import time
+
+# A record is one row of the report
+FIELD_LIST = ["kind", "stage", "session", "wallTime", "cpuTime",
+              "processPeakRSS", "numFiles", "bytesRead", "bytesWritten"]
+
+STAGE = "stage"
+SESSION = "session"
+
+# profileStage, if set, is the name of a stage (as in the report) to run
+# under cProfile; a stats file is written to profilePath for each of its
+# sessions.  Like executor's options, these must be set before the
+# workers are started.
+_instrumentOptions = {"enabled": True,
+                      "profileStage": None,
+                      "profilePath": None,
+                      }
+
+_recordList = []
+
+
+def setInstrumentOptions(enabled=True, profileStage=None, profilePath=None):
+    _instrumentOptions["enabled"] = enabled
+    _instrumentOptions["profileStage"] = profileStage
+    _instrumentOptions["profilePath"] = profilePath
+
+
+def isEnabled():
+    return _instrumentOptions["enabled"]
+
+
+def _getIOCounts():
+    '''
+    Bytes read and written by this process so far, or None if unknown
+    '''
+    try:
+        with open("/proc/self/io", "r") as fd:
+            ioDict = dict(line.split(":") for line in fd.read().splitlines())
+    except (IOError, ValueError):
+        return None, None
+
+    return int(ioDict["rchar"]), int(ioDict["wchar"])
+
+
+def _getPeakRSS():
+    '''
+    The peak resident memory of this process over its life, in bytes
+    '''
+    peakRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, OS X bytes
+    if sys.platform != "darwin":
+        peakRSS *= 1024
+
+    return peakRSS
+
+
+def _getCPUTime():
+    '''
+    CPU time of this process and of its finished subprocesses (e.g. Praat)
+    '''
+    total = 0.0
+    for who in [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN]:
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+
+    return total
+
+
+def getCounters():
+    '''
+    Counters to pass to makeRecord() at the start and end of a measurement
+    '''
+    return (time.time(), _getCPUTime()) + _getIOCounts()
+
+
+def _subtract(stop, start):
+    if stop is None or start is None:
+        return None
+    return stop - start
+
+
+def makeRecord(kind, stageName, session, startCounters, stopCounters,
+               numFiles=None):
+    '''
+    A record of one measurement
+
+    numFiles is the number of files or sessions measured, or None if it
+    isn't known.
+    '''
+
+    values = [kind, stageName, session]
+    values += [_subtract(stop, start) for start, stop
+               in zip(startCounters, stopCounters)[:2]]
+    values += [_getPeakRSS(), numFiles]
+    values += [_subtract(stop, start) for start, stop
+               in zip(startCounters, stopCounters)[2:]]
+
+    return dict(zip(FIELD_LIST, values))
+
+
+def measure(stageName, session, func, *argList, **kwargDict):
+    '''
+    Calls func(*argList, **kwargDict), returning (result, record)
+
+    record is None if instrumentation is off.  Its numFiles is left for
+    the caller to fill in.  If stageName is the stage being profiled, the
+    call is run under cProfile.
+    '''
+    if not _instrumentOptions["enabled"]:
+        return func(*argList, **kwargDict), None
+
+    startCounters = getCounters()
+    if stageName == _instrumentOptions["profileStage"]:
+        result = _runProfiled(stageName, session, func, argList, kwargDict)
+    else:
+        result = func(*argList, **kwargDict)
+    stopCounters = getCounters()
+
+    return result, makeRecord(SESSION, stageName, session, startCounters,
+                              stopCounters)
+
+
+def _runProfiled(stageName, session, func, argList, kwargDict):
+
+    profilePath = _instrumentOptions["profilePath"]
+    if profilePath is None:
+        profilePath = os.getcwd()
+    if not os.path.exists(profilePath):
+        os.makedirs(profilePath)
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *argList, **kwargDict)
+    finally:
+        profileName = "%s_%s.prof" % (stageName, session)
+        profiler.dump_stats(join(profilePath,
+                                 profileName.replace(os.sep, "_")))
+
+
+def addRecord(record):
+    if record is not None:
+        _recordList.append(record)
+
+
+def summarizeStage(stageName, startCounters, stopCounters, sessionRecordList):
+    '''
+    A stage record for sessions measured in other processes
+
+    Wall time is the stage's own; the CPU time, files and bytes are the
+    sums over its sessions (if known for all of them) and the process peak
+    RSS is the largest among them.
+    '''
+    record = makeRecord(STAGE, stageName, None, startCounters, stopCounters,
+                        0)
+    if len(sessionRecordList) == 0:
+        return record
+
+    for fieldName in ["cpuTime", "numFiles", "bytesRead", "bytesWritten"]:
+        valueList = [sessionRecord[fieldName] for sessionRecord
+                     in sessionRecordList]
+        if None not in valueList:
+            record[fieldName] = sum(valueList)
+        elif fieldName == "numFiles":
+            record[fieldName] = None
+    record["processPeakRSS"] = max(sessionRecord["processPeakRSS"]
+                                   for sessionRecord in sessionRecordList)
+
+    return record
+
+
+def getRecords():
+    return list(_recordList)
+
+
+def reset():
+    del _recordList[:]
+
+
+def writeReport(outputPath, reportName="run_report"):
+    '''
+    Writes the records so far as <reportName>.json and <reportName>.csv
+    '''
+    if not _instrumentOptions["enabled"]:
+        return
+
+    if not os.path.exists(outputPath):
+        os.makedirs(outputPath)
+
+    with open(join(outputPath, reportName + ".json"), "w") as fd:
+        json.dump(_recordList, fd, indent=1, sort_keys=True)
+
+    with open(join(outputPath, reportName + ".csv"), "wb") as fd:
+        writer = csv.DictWriter(fd, FIELD_LIST)
+        writer.writerow(dict(zip(FIELD_LIST, FIELD_LIST)))
+        for record in _recordList:
+            writer.writerow(record)
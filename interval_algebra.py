@@ -0,0 +1,313 @@
+
+# Operations over sorted lists of (start, stop, label) intervals, such as
+# the entryList of a praatio IntervalTier.  Intervals within a list must be
+# sorted and must not overlap one another--which holds for any interval tier.
+
+import bisect
+
+
+def _splitLabels(startTime, endTime, label, cmprStart, cmprEnd):
+    '''
+    Labels for the two halves of an interval that has been divided in two
+
+    Only one side keeps the label.  The other side is marked as having
+    its text in the previous segment (pST) or the next segment (nST).
+    '''
+    if cmprStart - startTime > cmprEnd - endTime:
+        leftLabel = label
+        rightLabel = '(pST)'
+    else:
+        leftLabel = '(nST)'
+        rightLabel = label
+
+    return leftLabel, rightLabel
+
+
+def subtractIntervals(entryList, cmprEntryList):
+    '''
+    Removes the regions covered by cmprEntryList from entryList
+
+    Both lists are walked once in a single merge sweep, so this runs in
+    O(len(entryList) + len(cmprEntryList)).  The labels in cmprEntryList
+    are ignored.  When an interval is divided in two, the labels are
+    assigned with _splitLabels().
+    '''
+    cmprList = [(float(start), float(stop))
+                for start, stop, label in cmprEntryList]
+    numCmpr = len(cmprList)
+
+    returnList = []
+    j = 0
+    for start, stop, label in entryList:
+
+        # Comparison intervals ending before this interval are also before
+        # all remaining intervals
+        while j < numCmpr and cmprList[j][1] <= start:
+            j += 1
+
+        # A comparison interval can span several intervals, so the sweep
+        # for this interval starts from j without consuming it
+        k = j
+        tmpStart = start
+        tmpLabel = label
+        coveredFlag = False
+        while k < numCmpr and cmprList[k][0] < stop:
+            cmprStart, cmprEnd = cmprList[k]
+
+            if cmprStart <= tmpStart and cmprEnd >= stop: # Crop entire region
+                coveredFlag = True
+                break
+            elif cmprStart <= tmpStart and cmprEnd < stop: # Crop left edge
+                tmpStart = cmprEnd
+            elif cmprStart > tmpStart and cmprEnd >= stop: # Crop right edge
+                returnList.append((tmpStart, cmprStart, tmpLabel))
+                tmpStart = stop
+                break
+            else: # Interval divided in two
+                leftLabel, rightLabel = _splitLabels(tmpStart, stop, tmpLabel,
+                                                     cmprStart, cmprEnd)
+                returnList.append((tmpStart, cmprStart, leftLabel))
+                tmpStart = cmprEnd
+                tmpLabel = rightLabel
+            k += 1
+
+        # A zero-length interval is kept unless it is covered
+        if not coveredFlag and (tmpStart < stop or start == stop):
+            returnList.append((tmpStart, stop, tmpLabel))
+
+    return returnList
+
+
+def checkSorted(entryList):
+    '''
+    Raises ValueError unless entryList is sorted and non-overlapping
+
+    Entries may share a boundary point.
+    '''
+    prevStop = float("-inf")
+    for entry in entryList:
+        start, stop = float(entry[0]), float(entry[1])
+        if start < prevStop or stop < start:
+            raise ValueError("Intervals are not sorted and non-overlapping "
+                             "at %r" % (entry,))
+        prevStop = stop
+
+
+def replaceIntervals(entryList, newEntryList):
+    '''
+    Merges newEntryList into entryList, dropping the entries it overlaps
+
+    Equivalent to inserting each new entry into a tier with
+    collisionCode="replace", but done in one sweep.  Entries that only
+    share a boundary point with a new entry are kept.  As everywhere in
+    this module, both lists must be sorted and non-overlapping; since the
+    new entries can't then overlap one another, the order of the inserts
+    doesn't matter.  newEntryList is checked, as it is usually built by
+    the caller rather than read from a tier.
+    '''
+    checkSorted(newEntryList)
+    spanList = [(float(span[0]), float(span[1])) for span in newEntryList]
+    numSpans = len(spanList)
+
+    keptList = []
+    j = 0
+    for entry in entryList:
+        start, stop = float(entry[0]), float(entry[1])
+        while j < numSpans and spanList[j][1] <= start:
+            j += 1
+        if not (j < numSpans and spanList[j][0] < stop):
+            keptList.append(entry)
+
+    return sorted(keptList + list(newEntryList),
+                  key=lambda entry: (float(entry[0]), float(entry[1]),
+                                     entry[2]))
+
+
+def sumLabelPerWindow(windowList, entryList, searchLabel):
+    '''
+    Total duration and count of the searchLabel entries in each window
+
+    windowList holds (start, stop) pairs.  As with cropping a textgrid
+    (non-strict) to each window, an entry that crosses a window boundary
+    counts toward the window and only its part inside the window counts
+    toward the duration.  Returns a list of (duration, count), one per
+    window, in O(len(windowList) + len(entryList)) for sequential windows.
+    '''
+    matchList = [(float(start), float(stop))
+                 for start, stop, label in entryList if label == searchLabel]
+    numMatches = len(matchList)
+
+    # Windows are swept in time order but reported in the given order
+    orderList = sorted(range(len(windowList)),
+                       key=lambda i: float(windowList[i][0]))
+
+    returnList = [(0.0, 0)] * len(windowList)
+    j = 0
+    for i in orderList:
+        windowStart, windowStop = float(windowList[i][0]), float(windowList[i][1])
+
+        while j < numMatches and matchList[j][1] <= windowStart:
+            j += 1
+
+        duration = 0.0
+        count = 0
+        k = j
+        while k < numMatches and matchList[k][0] < windowStop:
+            start, stop = matchList[k]
+            duration += min(stop, windowStop) - max(start, windowStart)
+            count += 1
+            k += 1
+
+        returnList[i] = (duration, count)
+
+    return returnList
+
+
+def cropToWindows(windowList, entryList):
+    '''
+    The entries overlapping each window, clipped to the window
+
+    Gives the same entries as cropping a tier (non-strict) to each
+    (start, stop) window but walks entryList once for sequential windows.
+    Returns one entry list per window.
+    '''
+    numEntries = len(entryList)
+    orderList = sorted(range(len(windowList)),
+                       key=lambda i: float(windowList[i][0]))
+
+    returnList = [[] for window in windowList]
+    j = 0
+    for i in orderList:
+        windowStart, windowStop = windowList[i][0], windowList[i][1]
+
+        while j < numEntries and entryList[j][1] <= windowStart:
+            j += 1
+
+        k = j
+        while k < numEntries and entryList[k][0] < windowStop:
+            start, stop, label = entryList[k]
+            returnList[i].append((max(start, windowStart),
+                                  min(stop, windowStop), label))
+            k += 1
+
+    return returnList
+
+
+def cropPointsToWindows(windowList, pointList):
+    '''
+    The (time, label) points within each window, boundaries included
+    '''
+    timeList = [float(point[0]) for point in pointList]
+
+    returnList = []
+    for windowStart, windowStop in windowList:
+        i = bisect.bisect_left(timeList, float(windowStart))
+        j = bisect.bisect_right(timeList, float(windowStop))
+        returnList.append(pointList[i:j])
+
+    return returnList
+
+
+class IntervalIndex(object):
+    '''
+    Answers overlap queries against a fixed list of intervals
+
+    Built once in O(n log n); each query is a binary search.  Two intervals
+    overlap if they share more than a boundary point, as when cropping a
+    textgrid (non-strict).  Unlike the other functions in this module, the
+    indexed intervals may overlap one another.
+    '''
+
+    def __init__(self, entryList):
+        self.entryList = sorted(entryList,
+                                key=lambda entry: (float(entry[0]),
+                                                   float(entry[1])))
+        self.startList = [float(entry[0]) for entry in self.entryList]
+
+        # The largest stop time among the first i entries is non-decreasing
+        # so it too can be binary searched
+        self.maxStopList = []
+        maxStop = float("-inf")
+        for entry in self.entryList:
+            maxStop = max(maxStop, float(entry[1]))
+            self.maxStopList.append(maxStop)
+
+    def anyOverlap(self, start, stop):
+        '''
+        True if any interval overlaps start-stop
+        '''
+        i = bisect.bisect_left(self.startList, float(stop))
+
+        return i > 0 and self.maxStopList[i - 1] > float(start)
+
+    def getOverlaps(self, start, stop):
+        '''
+        All intervals that overlap start-stop, in time order
+        '''
+        start, stop = float(start), float(stop)
+        i = bisect.bisect_right(self.maxStopList, start)
+        j = bisect.bisect_left(self.startList, stop)
+
+        return [entry for entry in self.entryList[i:j]
+                if float(entry[1]) > start]
+
+
+class IntervalList(object):
+    '''
+    A tier's entries, edited in place
+
+    Mirrors IntervalTier.getEntries(), deleteEntry() and insert() with
+    collisionCode="replace"--giving the same entries after the same
+    sequence of edits--but the entries are found with a binary search
+    rather than a scan of the tier, so a long series of edits stays cheap.
+    The entries must stay sorted and non-overlapping, which they are in
+    any interval tier and which the edits preserve; this is checked when
+    the list is built.
+    '''
+
+    def __init__(self, entryList):
+        checkSorted(entryList)
+        self.entryList = sorted(entryList)
+        self._startList = [float(entry[0]) for entry in self.entryList]
+        self._stopList = [float(entry[1]) for entry in self.entryList]
+
+    def _getRange(self, start, stop, boundaryInclusive):
+
+        # Both the starts and the stops are in order, since the entries
+        # don't overlap
+        start, stop = float(start), float(stop)
+        if boundaryInclusive:
+            return (bisect.bisect_left(self._stopList, start),
+                    bisect.bisect_right(self._startList, stop))
+        return (bisect.bisect_right(self._stopList, start),
+                bisect.bisect_left(self._startList, stop))
+
+    def getEntries(self, start, stop, boundaryInclusive=False):
+        '''
+        The entries overlapping start-stop, in time order
+        '''
+        i, j = self._getRange(start, stop, boundaryInclusive)
+        return self.entryList[i:j]
+
+    def deleteEntry(self, entry):
+        i = bisect.bisect_left(self.entryList, entry)
+        if i == len(self.entryList) or self.entryList[i] != entry:
+            raise ValueError("%r is not in the list" % (entry,))
+
+        del self.entryList[i]
+        del self._startList[i]
+        del self._stopList[i]
+
+    def insert(self, entry):
+        '''
+        Adds entry, replacing the entries it overlaps
+        '''
+        i, j = self._getRange(entry[0], entry[1], False)
+        del self.entryList[i:j]
+        del self._startList[i:j]
+        del self._stopList[i:j]
+
+        i = bisect.bisect_right(self.entryList, entry)
+        self.entryList.insert(i, entry)
+        self._startList.insert(i, float(entry[0]))
+        self._stopList.insert(i, float(entry[1]))
@@ -0,0 +1,105 @@
+
+# Normalizes the transcriptions in the "Mother" tier before spell-correction.
+#
+# The punctuation, speech-mode, specific-tag and "voice" rules are applied
+# in a single pass of one compiled regex, rather than one str.replace() per
+# rule.  Results are memoized since the same short utterances recur
+# throughout a corpus.
+
+import re
+
+# Replaced with a space.  An apostrophe is only punctuation next to a space
+# or to one of . ! ? , (which were stripped before apostrophes used to be).
+# 'nc' - 'not comprehensible'?
+_PUNCTUATION = r"--|nc|[.!?,;`]|'(?=[ .!?,])|(?<=[ .!?,])'"
+
+# Speech mode labels and tags that only occur once in the corpus are
+# replaced with a space.  Any other mode that contains 'voice' e.g.
+# 'normal voice' is cut out, joining the text on either side.
+SPEECH_MODE_LIST = ['<whispers>', '<whispering>', '<whispered>',
+                    '<sad voice>', '<normal>',
+                    '<laughing>', '<laughter>']
+
+SPECIFIC_TAG_LIST = ['<mika presumably short for mikayla>',
+                     "<the why don't ya is extremely slurred>",
+                     "<back to normal>",
+                     "<this was said very slurred>",
+                     "<not sure if correct>", ]
+
+_punctuationRE = re.compile(_PUNCTUATION)
+_tokenRE = re.compile(r"<[^<>]*>|" + _PUNCTUATION)
+_squareBracketRE = re.compile(r"\[[^\]]*\]")
+
+_removedTagSet = set(SPEECH_MODE_LIST + SPECIFIC_TAG_LIST)
+
+_labelCache = {}
+
+
+def _replaceToken(matchObj):
+    token = matchObj.group(0)
+    if not token.startswith('<'):
+        return ' '
+
+    token = _punctuationRE.sub(' ', token)
+    if token in _removedTagSet:
+        return ' '
+    if 'voice' in token:
+        return ''
+
+    return token
+
+
+def normalizeLabel(label):
+    '''
+    Lowercases a label and strips punctuation and non-speech markup
+
+    Gives the same words as the rule-by-rule version that this replaced,
+    except on unbalanced brackets, which that version could fail on.
+    '''
+    try:
+        return _labelCache[label]
+    except KeyError:
+        pass
+
+    newLabel = label.lower().replace('(', '<').replace(')', '>')
+    newLabel = _tokenRE.sub(_replaceToken, newLabel)
+    newLabel = newLabel.strip()
+    newLabel = _squareBracketRE.sub('', newLabel)
+
+    # If any < > tag is still in the label, wipe the label
+    # it may represent some portion of the text that was not correctly
+    # transcribed or untranscribable--such as laughter or onomatopoeia
+    if '<' in newLabel:
+        start = newLabel.index('<')
+        end = newLabel.find('>', start)
+        if end == -1:
+            end = len(newLabel)
+
+        newLabel = newLabel[:start] + newLabel[end+1:]
+
+    _labelCache[label] = newLabel
+
+    return newLabel
+
+
+def correctLabel(label, wordReplaceDict):
+    '''
+    Normalizes a label and replaces each word found in wordReplaceDict
+
+    Returns the new label and a list of the (word, newWord) replacements.
+    '''
+    wordList = []
+    replacementList = []
+    for word in normalizeLabel(label).split(" "):
+        word = word.strip()
+        if word == "":
+            continue
+        try:
+            newWord = wordReplaceDict[word]
+            replacementList.append( (word, newWord) )
+            word = newWord
+        except KeyError:
+            pass # No change
+        wordList.append(word)
+
+    return " ".join(wordList), replacementList
@@ -0,0 +1,432 @@
+
+# Runs a pipeline declared as a graph of stages rather than as a fixed
+# sequence of calls.  A stage depends on the stages that write the folders
+# it reads.  Stages that are independent of one another run concurrently.
+#
+# Session tasks run in a pool of worker processes.  Each folder stage runs
+# in a process of its own, started from the main thread, so that folder
+# stages run alongside one another and the session tasks, and are free to
+# start their own workers.  A task whose process dies, or whose arguments
+# or result can't be sent between processes, fails like any other task
+# rather than stalling the run.
+#
+# Session stages (those whose function takes a nameList, see
+# general_CSDP_MCRP.findSessionFiles()) are split into one task per
+# session, and a session's task starts as soon as that session is done in
+# the session stages before it--so one session can be in the pitch stage
+# while another is still being filtered.  Folder stages (e.g. the
+# pyacoustics ones) wait for every session of the stages they read from.
+
+import os
+
+import multiprocessing
+from multiprocessing.queues import SimpleQueue
+import Queue
+import traceback
+
+from pyacoustics.utilities import utils
+
+import build_manifest
+import executor
+import instrumentation
+
+
+class Stage(object):
+    '''
+    One step of a pipeline
+
+    func(*argList, **kwargDict) runs the stage.  inputPathList and
+    outputPathList are the folders it reads and writes.  If sessionFlag is
+    True, func takes a nameList keyword and is run once per session.  If
+    subsetFlag is True, a folder stage also takes a nameList: the
+    pipeline's sessions, less those that are up to date when a build
+    manifest is given.
+
+    paramList holds the parameters recorded in the build manifest.  When
+    checking that a session's output exists, the first output folder is
+    used unless namedOutputFlag is False (e.g. when the outputs are per
+    segment rather than per session).
+    '''
+
+    def __init__(self, name, func, argList, inputPathList, outputPathList,
+                 paramList=None, kwargDict=None, sessionFlag=False,
+                 subsetFlag=False, namedOutputFlag=True):
+        if paramList is None:
+            paramList = []
+        if kwargDict is None:
+            kwargDict = {}
+
+        self.name = name
+        self.func = func
+        self.argList = argList
+        self.kwargDict = kwargDict
+        self.inputPathList = inputPathList
+        self.outputPathList = outputPathList
+        self.paramList = paramList
+        self.sessionFlag = sessionFlag
+        self.subsetFlag = subsetFlag or sessionFlag
+        self.namedOutputFlag = namedOutputFlag
+
+    def getManifestOutputPath(self):
+        if not self.namedOutputFlag or len(self.outputPathList) == 0:
+            return None
+        return self.outputPathList[0]
+
+
+# How often, in seconds, the running tasks are checked on
+POLL_INTERVAL = 0.5
+
+# Set in each worker: where it announces the tasks it starts
+_workerOptions = {"startQueue": None}
+
+
+def _initWorker(startQueue):
+    # Session tasks already run one per worker
+    executor.setWorkerOptions(numWorkers=1)
+    _workerOptions["startQueue"] = startQueue
+
+
+def _runTask(stageName, name, func, argList, kwargDict):
+    '''
+    Runs one task, returning the error instead of raising it
+
+    In a worker, the task and the worker's pid are first sent to the
+    startQueue, so that the task can be failed if the worker dies.
+
+    The task's instrumentation record, if any, is returned with it.  Its
+    numFiles is the number of sessions the task was given, if it was given
+    a nameList.
+    '''
+    startQueue = _workerOptions["startQueue"]
+    if startQueue is not None:
+        startQueue.put(((stageName, name), os.getpid()))
+
+    try:
+        result, record = instrumentation.measure(stageName, name, func,
+                                                 *argList, **kwargDict)
+        if record is not None and "nameList" in kwargDict:
+            record["numFiles"] = len(kwargDict["nameList"])
+        return result, None, record
+    except Exception:
+        return None, traceback.format_exc(), None
+
+
+def _runFolderTask(connection, stageName, func, argList, kwargDict):
+    '''
+    Runs a folder stage in its own process, sending its output back
+
+    The instrumentation records of the stage's own workers (see
+    executor.mapFiles()) are sent back with it.
+    '''
+    instrumentation.reset()
+    output = _runTask(stageName, None, func, argList, kwargDict)
+    try:
+        connection.send((output, instrumentation.getRecords()))
+    except Exception:
+        connection.send(((None, traceback.format_exc(), None), []))
+    connection.close()
+
+
+class Pipeline(object):
+    '''
+    A graph of stages run over the sessions in nameList
+    '''
+
+    def __init__(self, nameList):
+        self.nameList = list(nameList)
+        self.stageList = []
+
+    def addStage(self, stage):
+        self.stageList.append(stage)
+        return stage
+
+    def _getUpstreamStages(self, stage):
+
+        producerDict = {}
+        for otherStage in self.stageList:
+            for outputPath in otherStage.outputPathList:
+                producerDict[outputPath] = otherStage
+
+        upstreamList = []
+        for inputPath in stage.inputPathList:
+            producer = producerDict.get(inputPath)
+            if (producer is not None and producer is not stage and
+                    producer not in upstreamList):
+                upstreamList.append(producer)
+
+        return upstreamList
+
+    def _getTaskList(self, stage):
+        if stage.sessionFlag:
+            return [(stage.name, name) for name in self.nameList]
+        return [(stage.name, None)]
+
+    def _getDependencies(self):
+        '''
+        Maps each task to the tasks it waits on
+
+        A task is a (stageName, name) pair; name is None for folder stages.
+        '''
+        dependencyDict = {}
+        for stage in self.stageList:
+            upstreamList = self._getUpstreamStages(stage)
+            for task in self._getTaskList(stage):
+                name = task[1]
+                waitSet = set()
+                for upstream in upstreamList:
+                    if upstream.sessionFlag and name is not None:
+                        waitSet.add((upstream.name, name))
+                    else:
+                        waitSet.update(self._getTaskList(upstream))
+                dependencyDict[task] = waitSet
+
+        return dependencyDict
+
+    def _addStageRecords(self, stage, startCounters, recordList):
+        '''
+        Adds the instrumentation records for a stage that has finished
+        
+        A folder stage runs in a process of its own, so its one record is
+        the stage's.  The sessions of a session stage are recorded along with a
+        summary of them.
+        '''
+        if startCounters is None:
+            return
+
+        if not stage.sessionFlag:
+            for record in recordList:
+                record["kind"] = instrumentation.STAGE
+                instrumentation.addRecord(record)
+            return
+
+        for record in recordList:
+            instrumentation.addRecord(record)
+        stopCounters = instrumentation.getCounters()
+        instrumentation.addRecord(instrumentation.summarizeStage(stage.name,
+                                                                 startCounters,
+                                                                 stopCounters,
+                                                                 recordList))
+
+    def run(self, manifest=None, numWorkers=None):
+        '''
+        Runs every stage, respecting the dependencies between them
+
+        If manifest (a build_manifest.BuildManifest) is given, only stale
+        sessions are rebuilt.  Returns a list of (stageName, fn, traceback)
+        for everything that failed.
+        '''
+        stageDict = dict((stage.name, stage) for stage in self.stageList)
+        if len(stageDict) != len(self.stageList):
+            raise ValueError("Stage names must be unique")
+
+        dependencyDict = self._getDependencies()
+        waitingSet = set(dependencyDict.keys())
+        doneSet = set()
+        numLeftDict = dict((stage.name, 0) for stage in self.stageList)
+        for stageName, name in waitingSet:
+            numLeftDict[stageName] += 1
+
+        # Workers may race to create a folder, so they are all made first
+        for stage in self.stageList:
+            for outputPath in stage.outputPathList:
+                utils.makeDir(outputPath)
+
+        if numWorkers is None:
+            numWorkers = executor.getNumWorkers()
+        # Written to directly rather than by a feeder thread, so a task's
+        # start is known even if its worker dies right after
+        startQueue = SimpleQueue()
+        pool = multiprocessing.Pool(numWorkers, initializer=_initWorker,
+                                    initargs=(startQueue,))
+        eventQueue = Queue.Queue()
+        errorList = []
+
+        # The session tasks in the pool, and the worker running each
+        pendingDict = {}
+        taskPidDict = {}
+        suspectSet = set()
+
+        # The folder tasks, with their processes and the connections their
+        # output comes back on
+        folderDict = {}
+
+        # Each folder is listed once for the whole run, and again only as
+        # the stages writing it add sessions to it
+        folderIndexCache = build_manifest.FolderIndexCache()
+
+        def _getStaleNames(stage, nameList):
+            if manifest is None or not stage.subsetFlag:
+                return nameList
+            return manifest.getStaleNames(stage.name, stage.inputPathList,
+                                          stage.paramList,
+                                          stage.getManifestOutputPath(),
+                                          nameList, folderIndexCache)
+
+        def _startTask(task):
+            stageName, name = task
+            stage = stageDict[stageName]
+            kwargDict = dict(stage.kwargDict)
+
+            if stage.sessionFlag:
+                nameList = _getStaleNames(stage, [name])
+                if len(nameList) == 0:
+                    eventQueue.put((task, ([], None, None)))
+                    return
+                kwargDict["nameList"] = nameList
+                pendingDict[task] = pool.apply_async(_runTask,
+                                                     (stageName, name,
+                                                      stage.func,
+                                                      stage.argList,
+                                                      kwargDict))
+            else:
+                if stage.subsetFlag:
+                    kwargDict["nameList"] = _getStaleNames(stage,
+                                                           self.nameList)
+
+                # Not a daemon, so that it can start its own workers
+                receiveConnection, sendConnection = multiprocessing.Pipe(False)
+                process = multiprocessing.Process(target=_runFolderTask,
+                                                  args=(sendConnection,
+                                                        stageName, stage.func,
+                                                        stage.argList,
+                                                        kwargDict))
+                process.start()
+                sendConnection.close()
+                folderDict[task] = (process, receiveConnection)
+
+        def _checkFolderTasks():
+            '''
+            Moves the finished (or lost) folder tasks to the eventQueue
+            '''
+            for task, (process, connection) in folderDict.items():
+                # A process that has exited has sent everything it will
+                aliveFlag = process.is_alive()
+                if connection.poll():
+                    try:
+                        output, recordList = connection.recv()
+                    except EOFError:
+                        output, recordList = None, []
+                elif not aliveFlag:
+                    output, recordList = None, []
+                else:
+                    continue
+
+                process.join()
+                connection.close()
+                if output is None:
+                    output = (None, "The process running this stage exited "
+                              "(exit code %s)\n" % process.exitcode, None)
+                for record in recordList:
+                    instrumentation.addRecord(record)
+
+                del folderDict[task]
+                eventQueue.put((task, output))
+
+        def _checkPoolTasks():
+            '''
+            Moves the pool's finished (or lost) tasks to the eventQueue
+            '''
+            while not startQueue.empty():
+                task, pid = startQueue.get()
+                taskPidDict[task] = pid
+
+            livePidSet = set(process.pid for process
+                             in multiprocessing.active_children())
+            for task, asyncResult in pendingDict.items():
+                if asyncResult.ready():
+                    try:
+                        output = asyncResult.get()
+                    except Exception:
+                        output = (None, traceback.format_exc(), None)
+                else:
+                    pid = taskPidDict.get(task)
+                    if pid is None or pid in livePidSet:
+                        continue
+
+                    # Its result may still be on its way from the worker,
+                    # so it is given until the next check
+                    if task not in suspectSet:
+                        suspectSet.add(task)
+                        continue
+                    output = (None, "The worker running this task (pid %d) "
+                              "died\n" % pid, None)
+
+                del pendingDict[task]
+                eventQueue.put((task, output))
+
+        # Counters at the start of each stage and the records of its tasks
+        stageCounterDict = {}
+        stageRecordDict = dict((stage.name, []) for stage in self.stageList)
+
+        def _startReadyTasks():
+            readyList = [task for task in sorted(waitingSet)
+                         if dependencyDict[task].issubset(doneSet)]
+
+            for task in readyList:
+                waitingSet.remove(task)
+                if (instrumentation.isEnabled() and
+                        task[0] not in stageCounterDict):
+                    stageCounterDict[task[0]] = instrumentation.getCounters()
+                _startTask(task)
+
+        try:
+            _startReadyTasks()
+            numTasks = len(dependencyDict)
+            while len(doneSet) < numTasks:
+                _checkPoolTasks()
+                _checkFolderTasks()
+                try:
+                    task, (result, error, record) = eventQueue.get(
+                        timeout=POLL_INTERVAL)
+                except Queue.Empty:
+                    continue
+                stageName, name = task
+                doneSet.add(task)
+                numLeftDict[stageName] -= 1
+                for outputPath in stageDict[stageName].outputPathList:
+                    folderIndexCache.markChanged(outputPath)
+                if record is not None:
+                    stageRecordDict[stageName].append(record)
+
+                taskErrorList = []
+                if error is not None:
+                    taskErrorList = [(name or stageName, error)]
+                elif isinstance(result, list):
+                    taskErrorList = result
+                errorList.extend((stageName, fn, tb)
+                                 for fn, tb in taskErrorList)
+
+                if manifest is not None and stageDict[stageName].subsetFlag:
+                    nameList = None if name is None else [name]
+                    if error is not None and name is None:
+                        nameList = []
+
+                    # A stage that doesn't return its error list can't
+                    # vouch for its sessions, so they are left stale
+                    if error is None and not isinstance(result, list):
+                        nameList = []
+                    manifest.record(stageName, taskErrorList, nameList)
+                    if numLeftDict[stageName] == 0:
+                        manifest.save()
+
+                if numLeftDict[stageName] == 0:
+                    stageErrorList = [(fn, tb) for subStageName, fn, tb
+                                      in errorList
+                                      if subStageName == stageName]
+                    executor.reportErrors(stageName, stageErrorList,
+                                          len(self._getTaskList(stageDict[stageName])))
+                    self._addStageRecords(stageDict[stageName],
+                                          stageCounterDict.get(stageName),
+                                          stageRecordDict[stageName])
+                    print("Finished %s" % stageName)
+
+                _startReadyTasks()
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+            for process, connection in folderDict.values():
+                process.terminate()
+                process.join()
+
+        return errorList
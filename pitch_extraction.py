@@ -0,0 +1,106 @@
+
+import os
+from os.path import join
+
+import filecmp
+import hashlib
+import shutil
+
+from pyacoustics.utilities import utils
+from pyacoustics.intensity_and_pitch import praat_pi
+
+import build_manifest
+import executor
+import f0_tracker
+
+# Backends accepted by extractPitch()
+PRAAT = "praat"
+NATIVE = "native"
+
+
+def getPitchCacheKey(wavFullPath, minPitch, maxPitch, sampleStep,
+                     backend=PRAAT):
+    '''
+    Key identifying a pitch track by its audio content and parameters
+    '''
+    paramStr = "%s,%s,%s" % (repr(float(minPitch)), repr(float(maxPitch)),
+                             repr(float(sampleStep)))
+    
+    # Keys for the Praat backend are unchanged from before backends existed
+    if backend != PRAAT:
+        paramStr += "," + backend
+    
+    return hashlib.sha1(build_manifest.getFileHash(wavFullPath) + paramStr).hexdigest()
+
+
+def extractPitch(wavPath, outputPath, cachePath, praatEXE, praatScriptPath,
+                 minPitch, maxPitch, sampleStep, numProcesses=None,
+                 backend=PRAAT):
+    '''
+    Extracts pitch and intensity for every wav file in wavPath
+    
+    At most numProcesses Praat subprocesses run at once (one per core by
+    default).  Results are stored in cachePath, keyed by the wav's content
+    and the pitch parameters, so unchanged recordings are never sent to
+    Praat twice--even if the output folder has been deleted.
+    
+    With backend=NATIVE, the tracks come from f0_tracker instead and
+    praatEXE and praatScriptPath are ignored.
+    '''
+    
+    if backend not in [PRAAT, NATIVE]:
+        raise ValueError("Unknown pitch backend: %s" % backend)
+    
+    utils.makeDir(outputPath)
+    utils.makeDir(cachePath)
+    
+    jobList = [(fn, (wavPath, fn, outputPath, cachePath, praatEXE,
+                     praatScriptPath, minPitch, maxPitch, sampleStep,
+                     backend))
+               for fn in utils.findFiles(wavPath, filterExt=".wav")]
+    return executor.mapFiles(_extractPitchForFile, jobList,
+                             numWorkers=numProcesses)[1]
+
+
+def _extractPitchForFile(wavPath, fn, outputPath, cachePath, praatEXE,
+                         praatScriptPath, minPitch, maxPitch, sampleStep,
+                         backend):
+    
+    name = os.path.splitext(fn)[0]
+    outputFN = join(outputPath, name + ".txt")
+    
+    key = getPitchCacheKey(join(wavPath, fn), minPitch, maxPitch, sampleStep,
+                           backend)
+    cacheFN = join(cachePath, key + ".txt")
+    
+    if os.path.exists(cacheFN):
+        if not os.path.exists(outputFN) or not filecmp.cmp(cacheFN, outputFN,
+                                                           shallow=False):
+            shutil.copy(cacheFN, outputFN)
+        return
+    
+    print fn
+    if backend == NATIVE:
+        f0_tracker.getPitchAndIntensity(inputPath=wavPath,
+                                        inputFN=fn,
+                                        outputPath=outputPath,
+                                        minPitch=minPitch,
+                                        maxPitch=maxPitch,
+                                        sampleStep=sampleStep,
+                                        forceRegenerate=True)
+    else:
+        praat_pi.getPraatPitchAndIntensity(inputPath=wavPath, 
+                                           inputFN=fn, 
+                                           outputPath=outputPath, 
+                                           praatEXE=praatEXE, 
+                                           praatScriptPath=praatScriptPath, 
+                                           minPitch=minPitch, 
+                                           maxPitch=maxPitch, 
+                                           sampleStep=sampleStep, 
+                                           forceRegenerate=True)
+    
+    # Write under a temporary name so an interrupted run never leaves
+    # a partial file in the cache
+    tmpCacheFN = cacheFN + ".%d.tmp" % os.getpid()
+    shutil.copy(outputFN, tmpCacheFN)
+    os.rename(tmpCacheFN, cacheFN)
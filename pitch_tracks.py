@@ -0,0 +1,312 @@
+
+# Pitch tracks as sorted numpy arrays.  Time windows are resolved with
+# searchsorted() instead of a scan over the whole track, as done by
+# praat_pi.getAllValuesInTime().
+
+import numpy as np
+
+import binary_tables
+
+
+def loadPitchTrack(pitchPath, fn):
+    '''
+    Returns the time, f0, and intensity columns of a pitch track, by time
+
+    pitchPath may be a binary folder (see binary_tables), in which case
+    the columns are memory-mapped rather than parsed.
+    '''
+    table = binary_tables.loadTable(pitchPath, fn, binary_tables.PITCH)
+
+    timeArray = table["time"]
+    if np.any(timeArray[1:] < timeArray[:-1]):
+        table = table[np.argsort(timeArray, kind="mergesort")]
+
+    return table["time"], table["f0"], table["intensity"]
+
+
+def getIndicesInTime(timeArray, startArray, stopArray):
+    '''
+    For each window, the slice of timeArray with start <= time <= stop
+    '''
+    startIndexArray = np.searchsorted(timeArray, startArray, side="left")
+    stopIndexArray = np.searchsorted(timeArray, stopArray, side="right")
+
+    return startIndexArray, stopIndexArray
+
+
+def getIntervalMask(timeArray, startArray, stopArray):
+    '''
+    True for the samples that fall within any of the intervals
+    '''
+    startIndexArray, stopIndexArray = getIndicesInTime(timeArray,
+                                                       startArray, stopArray)
+    boundaryArray = np.zeros(len(timeArray) + 1, dtype=np.int64)
+    np.add.at(boundaryArray, startIndexArray, 1)
+    np.add.at(boundaryArray, stopIndexArray, -1)
+
+    return np.cumsum(boundaryArray[:-1]) > 0
+
+
+def getPitchMoments(timeArray, f0Array, mask, startArray, stopArray):
+    '''
+    The count, mean, sum of squared deviations, min and max of f0 for each
+    window
+
+    Only samples where mask is True and f0 is non-zero are used, as with
+    praat_pi.extractPitchMeasuresForSegment(filterZeroFlag=True).  Windows
+    without any such samples get a count of zero.  Moments from different
+    parts of a track can be combined with PitchAccumulator.
+    '''
+    startIndexArray, stopIndexArray = getIndicesInTime(timeArray,
+                                                       startArray, stopArray)
+
+    # Keep only the usable samples; windows then map onto ranges of the
+    # kept samples through the running count of kept samples
+    isUsed = mask & (np.trunc(f0Array) != 0)
+    valueArray = f0Array[isUsed]
+    usedCountArray = np.concatenate(([0], np.cumsum(isUsed)))
+    lowArray = usedCountArray[startIndexArray]
+    countArray = usedCountArray[stopIndexArray] - lowArray
+    numWindows = len(countArray)
+
+    # Flatten the (possibly overlapping) windows into one array of sample
+    # indices, labeled with the window each came from
+    windowIArray = np.repeat(np.arange(numWindows), countArray)
+    offsetArray = np.cumsum(countArray) - countArray
+    sampleIArray = (np.arange(len(windowIArray)) -
+                    np.repeat(offsetArray - lowArray, countArray))
+    windowValueArray = valueArray[sampleIArray]
+
+    safeCountArray = np.maximum(countArray, 1)
+    meanArray = (np.bincount(windowIArray, windowValueArray,
+                             minlength=numWindows) / safeCountArray)
+    deviationArray = windowValueArray - meanArray[windowIArray]
+    squaresArray = np.bincount(windowIArray, deviationArray ** 2,
+                               minlength=numWindows)
+
+    maxArray = np.full(numWindows, -np.inf)
+    minArray = np.full(numWindows, np.inf)
+    np.maximum.at(maxArray, windowIArray, windowValueArray)
+    np.minimum.at(minArray, windowIArray, windowValueArray)
+
+    return countArray, meanArray, squaresArray, minArray, maxArray
+
+
+def momentsToMeasures(countArray, meanArray, squaresArray, minArray,
+                      maxArray):
+    '''
+    The measures of getPitchMeasures() from those of getPitchMoments()
+    '''
+    varianceArray = squaresArray / np.maximum(countArray, 1)
+    measureArray = np.column_stack((meanArray, maxArray, minArray,
+                                    maxArray - minArray, varianceArray,
+                                    np.sqrt(varianceArray)))
+    measureArray[countArray == 0] = 0
+
+    return measureArray
+
+
+def getPitchMeasures(timeArray, f0Array, mask, startArray, stopArray):
+    '''
+    The mean, max, min, range, variance, and std of f0 for each window
+
+    See getPitchMoments() for the samples used.  Windows without any
+    usable samples get zero for every measure.  Returns an array with one
+    row per window.
+    '''
+    return momentsToMeasures(*getPitchMoments(timeArray, f0Array, mask,
+                                              startArray, stopArray))
+
+
+class PitchAccumulator(object):
+    '''
+    Running f0 moments for a fixed set of windows
+
+    Each call to add() merges in the moments of another part of the track
+    (pairwise, as in Chan et al.'s parallel variance), so a track can be
+    measured a chunk at a time and the result is the same as measuring it
+    whole.
+    '''
+
+    def __init__(self, startArray, stopArray):
+        self.startArray = np.asarray(startArray, dtype=np.float64)
+        self.stopArray = np.asarray(stopArray, dtype=np.float64)
+
+        numWindows = len(self.startArray)
+        self.countArray = np.zeros(numWindows, dtype=np.int64)
+        self.meanArray = np.zeros(numWindows)
+        self.squaresArray = np.zeros(numWindows)
+        self.minArray = np.full(numWindows, np.inf)
+        self.maxArray = np.full(numWindows, -np.inf)
+
+    def add(self, timeArray, f0Array, mask):
+        '''
+        Adds the samples of one part of the track (sorted by time)
+        '''
+        countArray, meanArray, squaresArray, minArray, maxArray = \
+            getPitchMoments(timeArray, f0Array, mask, self.startArray,
+                            self.stopArray)
+
+        totalArray = self.countArray + countArray
+        safeTotalArray = np.maximum(totalArray, 1)
+        deltaArray = meanArray - self.meanArray
+
+        self.meanArray = self.meanArray + deltaArray * countArray / safeTotalArray
+        self.squaresArray = (self.squaresArray + squaresArray +
+                             deltaArray ** 2 * self.countArray * countArray /
+                             safeTotalArray)
+        self.countArray = totalArray
+        self.minArray = np.minimum(self.minArray, minArray)
+        self.maxArray = np.maximum(self.maxArray, maxArray)
+
+    def getMeasures(self):
+        return momentsToMeasures(self.countArray, self.meanArray,
+                                 self.squaresArray, self.minArray,
+                                 self.maxArray)
+
+
+def getChunkBoundaries(startArray, stopArray, chunkDuration):
+    '''
+    Times at which to cut a track into chunks of about chunkDuration
+
+    Every cut falls on an epoch boundary, so no chunk splits an epoch
+    unless the epoch alone is longer than chunkDuration.
+    '''
+    edgeArray = np.unique(np.concatenate((startArray, stopArray)))
+
+    boundaryList = []
+    lastBoundary = edgeArray[0] if len(edgeArray) > 0 else 0
+    for edge in edgeArray.tolist():
+        if edge - lastBoundary >= chunkDuration:
+            boundaryList.append(edge)
+            lastBoundary = edge
+
+    return np.array(boundaryList, dtype=np.float64)
+
+
+def iterPitchChunks(pitchPath, fn, boundaryArray, blockSize=2**16):
+    '''
+    Yields the time and f0 columns of a pitch track, cut at boundaryArray
+
+    The track is read blockSize rows at a time (see
+    binary_tables.iterTableBlocks()), so memory is bounded by the longest
+    chunk rather than the length of the track.  Rows out of time order
+    stay in the chunk they were read in; each chunk is sorted.
+    '''
+    def _sortedChunk(timeArray, f0Array):
+        if np.any(timeArray[1:] < timeArray[:-1]):
+            order = np.argsort(timeArray, kind="mergesort")
+            timeArray, f0Array = timeArray[order], f0Array[order]
+        return timeArray, f0Array
+
+    boundaryI = 0
+    timeList = []
+    f0List = []
+    for block in binary_tables.iterTableBlocks(pitchPath, fn,
+                                               binary_tables.PITCH,
+                                               blockSize):
+        timeArray = np.array(block["time"], dtype=np.float64)
+        f0Array = np.array(block["f0"], dtype=np.float64)
+
+        # Each boundary the block reaches closes a chunk
+        while (boundaryI < len(boundaryArray) and len(timeArray) > 0 and
+               timeArray[-1] >= boundaryArray[boundaryI]):
+            i = np.searchsorted(timeArray, boundaryArray[boundaryI])
+            timeList.append(timeArray[:i])
+            f0List.append(f0Array[:i])
+            yield _sortedChunk(np.concatenate(timeList),
+                               np.concatenate(f0List))
+            timeList, f0List = [], []
+            timeArray, f0Array = timeArray[i:], f0Array[i:]
+            boundaryI += 1
+
+        timeList.append(timeArray)
+        f0List.append(f0Array)
+
+    if sum(len(timeArray) for timeArray in timeList) > 0:
+        yield _sortedChunk(np.concatenate(timeList), np.concatenate(f0List))
+
+
+def getPitchMeasuresStreaming(pitchPath, fn, entryStartArray, entryStopArray,
+                              startArray, stopArray, chunkDuration,
+                              blockSize=2**16):
+    '''
+    getPitchMeasures() for the mother's speech, reading the track in chunks
+
+    The same measures as computing the speech mask from the tg_info
+    entries and calling getPitchMeasures() over the whole track, but the
+    track is walked in chunks of about chunkDuration seconds cut at epoch
+    boundaries and the measures are accumulated as it goes.
+    '''
+    accumulator = PitchAccumulator(startArray, stopArray)
+    boundaryArray = getChunkBoundaries(startArray, stopArray, chunkDuration)
+    for timeArray, f0Array in iterPitchChunks(pitchPath, fn, boundaryArray,
+                                              blockSize):
+        speechMask = getIntervalMask(timeArray, entryStartArray,
+                                     entryStopArray)
+        accumulator.add(timeArray, f0Array, speechMask)
+
+    return accumulator.getMeasures()
+
+
+def formatPitchMeasures(name, entryI, measureRow):
+    '''
+    A row in the same format as praat_pi.extractPitchMeasuresForSegment()
+    '''
+    argList = (name, entryI) + tuple(float(value) for value in measureRow)
+
+    return "%s,%s,%0.3f,%0.3f,%0.3f,%0.3f,%0.3f,%0.3f" % argList
+
+
+def getVoicedRuns(f0Array):
+    '''
+    The start and stop indices of each run of non-zero f0 values
+    '''
+    isVoiced = np.concatenate(([False], np.trunc(f0Array) != 0, [False]))
+    changeArray = np.flatnonzero(isVoiced[1:] != isVoiced[:-1])
+
+    return changeArray[0::2], changeArray[1::2]
+
+
+def medianFilter(valueArray, windowSize, runStartArray=None,
+                 runStopArray=None, chunkSize=2**16):
+    '''
+    Each value replaced by the median of the windowSize values around it
+
+    The window covers windowSize // 2 values on either side and the ends
+    are padded with the first and last values.  If runStartArray and runStopArray are given, only the values
+    in those runs are filtered, each run independently and padded with its
+    own first and last values; the other values are left as they are.
+
+    Rows are processed chunkSize at a time, so memory is bounded by
+    chunkSize * windowSize values regardless of the track's length.
+    '''
+    valueArray = np.asarray(valueArray, dtype=np.float64)
+    numValues = len(valueArray)
+    if runStartArray is None:
+        runStartArray = np.array([0])
+        runStopArray = np.array([numValues])
+
+    # The run each filtered value belongs to
+    runLengthArray = runStopArray - runStartArray
+    runIArray = np.repeat(np.arange(len(runStartArray)), runLengthArray)
+    indexArray = (np.arange(len(runIArray)) -
+                  np.repeat(np.cumsum(runLengthArray) - runLengthArray,
+                            runLengthArray) +
+                  runStartArray[runIArray])
+
+    halfWindow = int(windowSize) // 2
+    offsetArray = np.arange(-halfWindow, halfWindow + 1)
+
+    outputArray = valueArray.copy()
+    for i in range(0, len(indexArray), chunkSize):
+        subIndexArray = indexArray[i:i + chunkSize]
+        subRunIArray = runIArray[i:i + chunkSize]
+        windowIArray = np.clip(subIndexArray[:, None] + offsetArray[None, :],
+                               runStartArray[subRunIArray][:, None],
+                               runStopArray[subRunIArray][:, None] - 1)
+        windowArray = np.partition(valueArray[windowIArray], halfWindow,
+                                   axis=1)
+        outputArray[subIndexArray] = windowArray[:, halfWindow]
+
+    return outputArray
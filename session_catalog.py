@@ -0,0 +1,268 @@
+
+# A SQLite catalog of the sessions in a working directory and of the files
+# (artifacts) the stages have written for them, so that finding the files
+# of some sessions is a query rather than a listing of every folder.
+#
+# A session is named CSDP_ID_<id>_<code> (e.g. CSDP_ID_012_P); its id and
+# session code are parsed from the name once, when it is first seen.  The
+# id is kept both as a number, for queries, and as written in the name
+# (e.g. "012"), for output.  An
+# artifact is a file in a folder of the working directory, e.g.
+# epochs/CSDP_ID_012_P.txt, or, for per-segment files,
+# uwe_raw_speech_rate_mothers_speech/CSDP_ID_012_P_003.txt.  Each one is
+# recorded with its size, modification time, the stage that wrote it (if
+# known) and, if asked for, its hash.
+#
+# The catalog is brought up to date with scanFolder(), one listing per
+# folder; hashing is opt-in (hashFlag), and files whose size and
+# modification time haven't changed aren't rehashed.
+
+import os
+from os.path import join
+
+import re
+import sqlite3
+
+import build_manifest
+
+CATALOG_FN = "session_catalog.sqlite"
+
+# The session name, and the segment number of a per-segment file
+_namePattern = re.compile(r"^(CSDP_ID_(\d+)_([A-Za-z]+))(?:_(\d+))?$")
+
+_schemaList = ["CREATE TABLE IF NOT EXISTS sessions ("
+               "name TEXT PRIMARY KEY, "
+               "id INTEGER, "
+               "idText TEXT, "
+               "code TEXT)",
+               "CREATE TABLE IF NOT EXISTS artifacts ("
+               "folder TEXT NOT NULL, "
+               "fn TEXT NOT NULL, "
+               "name TEXT NOT NULL, "
+               "segment INTEGER, "
+               "size INTEGER, "
+               "mtime REAL, "
+               "hash TEXT, "
+               "stage TEXT, "
+               "PRIMARY KEY (folder, fn))",
+               "CREATE INDEX IF NOT EXISTS sessionIDIndex ON sessions (id, code)",
+               "CREATE INDEX IF NOT EXISTS artifactNameIndex ON artifacts (name)",
+               ]
+
+
+def parseFileName(fn):
+    '''
+    Returns (session name, id, id text, session code, segment number)
+
+    The id, id text and code are None for files not named for a session,
+    and the segment number is None for files of a whole session.
+    '''
+    name = os.path.splitext(fn)[0]
+    match = _namePattern.match(name)
+    if match is None:
+        return name, None, None, None, None
+
+    sessionName, idText, code, segmentStr = match.groups()
+    segment = None
+    if segmentStr is not None:
+        segment = int(segmentStr)
+
+    return sessionName, int(idText), idText, code, segment
+
+
+class SessionCatalog(object):
+    '''
+    The session catalog of one working directory
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.fullPath = join(path, CATALOG_FN)
+
+        # Stages in different processes may use the catalog at once
+        self.connection = sqlite3.connect(self.fullPath, timeout=60)
+        for statement in _schemaList:
+            self.connection.execute(statement)
+
+        # Catalogs made before the id text was kept
+        columnList = [row[1] for row in
+                      self.connection.execute("PRAGMA table_info(sessions)")]
+        if "idText" not in columnList:
+            self.connection.execute("ALTER TABLE sessions ADD COLUMN "
+                                    "idText TEXT")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def _addSession(self, name, id, idText, code):
+        self.connection.execute("INSERT OR IGNORE INTO sessions "
+                                "(name, id, idText, code) VALUES (?, ?, ?, ?)",
+                                (name, id, idText, code))
+        self.connection.execute("UPDATE sessions SET idText = ? WHERE "
+                                "name = ? AND idText IS NULL",
+                                (idText, name))
+
+    def getSession(self, name):
+        '''
+        Returns (id, session code, id text) for a session, adding it if
+        it's new
+
+        All three are None for a name not of the form CSDP_ID_<id>_<code>.
+        '''
+        row = self.connection.execute("SELECT id, code, idText FROM sessions "
+                                      "WHERE name = ?", (name,)).fetchone()
+        if row is not None and (row[0] is None or row[2] is not None):
+            return tuple(row)
+
+        sessionName, id, idText, code, segment = parseFileName(name)
+        self._addSession(name, id, idText, code)
+        self.connection.commit()
+
+        return id, code, idText
+
+    def getSessionNames(self, idList=None, code=None):
+        '''
+        The sessions, limited to those with an id in idList and with code
+        '''
+        query = "SELECT name FROM sessions WHERE 1"
+        argList = []
+        if idList is not None:
+            query += " AND id IN (%s)" % ",".join("?" * len(idList))
+            argList += list(idList)
+        if code is not None:
+            query += " AND code = ?"
+            argList.append(code)
+
+        return [row[0] for row in
+                self.connection.execute(query + " ORDER BY name", argList)]
+
+    def scanFolder(self, folder, hashFlag=False, stageName=None):
+        '''
+        Brings the artifacts of a folder (relative to path) up to date
+
+        Files that are new or whose size or modification time changed are
+        (re)hashed if hashFlag is True, and records of files that are gone
+        are dropped.  If stageName is given, it is recorded as the stage
+        that wrote the folder.
+        '''
+        folderPath = join(self.path, folder)
+        fnList = []
+        if os.path.isdir(folderPath):
+            fnList = [fn for fn in os.listdir(folderPath)
+                      if not fn.startswith(".") and
+                      os.path.isfile(join(folderPath, fn))]
+
+        knownDict = dict((row[0], row[1:]) for row in
+                         self.connection.execute("SELECT fn, size, mtime, "
+                                                 "hash FROM artifacts WHERE "
+                                                 "folder = ?", (folder,)))
+
+        for fn in fnList:
+            statResult = os.stat(join(folderPath, fn))
+            size, mtime = statResult.st_size, statResult.st_mtime
+
+            fileHash = None
+            known = knownDict.get(fn)
+            if known is not None and known[0] == size and known[1] == mtime:
+                fileHash = known[2]
+            if fileHash is None and hashFlag:
+                fileHash = build_manifest.getFileHash(join(folderPath, fn))
+
+            name, id, idText, code, segment = parseFileName(fn)
+            if id is not None:
+                self._addSession(name, id, idText, code)
+
+            if stageName is None and known is not None:
+                self.connection.execute("UPDATE artifacts SET size = ?, "
+                                        "mtime = ?, hash = ? WHERE "
+                                        "folder = ? AND fn = ?",
+                                        (size, mtime, fileHash, folder, fn))
+            else:
+                self.connection.execute("INSERT OR REPLACE INTO artifacts "
+                                        "(folder, fn, name, segment, size, "
+                                        "mtime, hash, stage) VALUES "
+                                        "(?, ?, ?, ?, ?, ?, ?, ?)",
+                                        (folder, fn, name, segment, size,
+                                         mtime, fileHash, stageName))
+
+        goneSet = set(knownDict.keys()) - set(fnList)
+        self.connection.executemany("DELETE FROM artifacts WHERE folder = ? "
+                                    "AND fn = ?",
+                                    [(folder, fn) for fn in goneSet])
+        self.connection.commit()
+
+    def hasFolder(self, folder):
+        '''
+        True if any artifacts of folder have been recorded
+        '''
+        return self.connection.execute("SELECT 1 FROM artifacts WHERE "
+                                       "folder = ? LIMIT 1",
+                                       (folder,)).fetchone() is not None
+
+    def scan(self, folderList=None, hashFlag=False):
+        '''
+        scanFolder() for each of folderList (default: every folder in path)
+        '''
+        if folderList is None:
+            folderList = sorted(fn for fn in os.listdir(self.path)
+                                if not fn.startswith(".") and
+                                os.path.isdir(join(self.path, fn)))
+        for folder in folderList:
+            self.scanFolder(folder, hashFlag)
+
+    def recordStage(self, stageName, outputPathList, hashFlag=False):
+        '''
+        Scans the output folders of a stage, marking their files as its own
+        '''
+        for outputPath in outputPathList:
+            folder = os.path.relpath(outputPath, self.path)
+            self.scanFolder(folder, hashFlag, stageName)
+
+    def getArtifacts(self, folderList=None, nameList=None, idList=None,
+                     code=None, extList=None, segmentFlag=None):
+        '''
+        Returns (folder, fn, name, segment) for the matching artifacts
+
+        Each argument given narrows the results: to the folders in
+        folderList, the sessions in nameList, the ids in idList, the
+        session code, the extensions in extList, and to per-segment
+        (segmentFlag=True) or whole-session (segmentFlag=False) files.
+        '''
+        query = ("SELECT artifacts.folder, artifacts.fn, artifacts.name, "
+                 "artifacts.segment FROM artifacts LEFT JOIN sessions ON "
+                 "artifacts.name = sessions.name WHERE 1")
+        argList = []
+        for column, valueList in [("artifacts.folder", folderList),
+                                  ("artifacts.name", nameList),
+                                  ("sessions.id", idList)]:
+            if valueList is not None:
+                query += (" AND %s IN (%s)" %
+                          (column, ",".join("?" * len(valueList))))
+                argList += list(valueList)
+        if code is not None:
+            query += " AND sessions.code = ?"
+            argList.append(code)
+        if segmentFlag is not None:
+            query += " AND artifacts.segment IS %s NULL" % ("NOT" if segmentFlag
+                                                           else "")
+
+        rowList = self.connection.execute(query + " ORDER BY artifacts.folder, "
+                                          "artifacts.fn", argList).fetchall()
+        if extList is not None:
+            rowList = [row for row in rowList
+                       if os.path.splitext(row[1])[1] in extList]
+
+        return [tuple(row) for row in rowList]
+
+    def removeArtifact(self, folder, fn):
+        '''
+        Deletes an artifact's file and its record
+        '''
+        try:
+            os.remove(join(self.path, folder, fn))
+        except OSError:
+            pass
+        self.connection.execute("DELETE FROM artifacts WHERE folder = ? AND "
+                                "fn = ?", (folder, fn))
+        self.connection.commit()
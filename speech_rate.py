@@ -0,0 +1,223 @@
+
+# A NumPy replacement for the MATLAB extractSpeechRate() / fu_sylncl()
+# step, which finds syllable nuclei as peaks in the energy of the speech
+# band.  The signal is band-pass filtered, its RMS energy is taken over a
+# short sliding window, and a nucleus is a local energy maximum that
+# stands out from both the whole segment and its surroundings.
+#
+# The output is the same as the MATLAB script's: for each segment, a file
+# in uwe_raw_speech_rate_mothers_speech listing the sample index of each
+# nucleus, one per line, which uwe_sr.aggregateSpeechRate() then reads.
+
+import os
+from os.path import join
+
+import numpy as np
+
+from pyacoustics.utilities import utils
+
+import audio_segments
+import executor
+import general_CSDP_MCRP
+import textgrid_reader
+
+# The speech band kept before measuring energy, in Hz
+BAND = (212, 3000)
+
+# Energy window and step, in seconds
+WINDOW_LENGTH = 0.04
+STEP = 0.005
+
+# A nucleus must be more than F_THRESH times the mean energy in the
+# REFERENCE_LENGTH seconds around it, and more than E_MIN times the
+# segment's peak energy
+F_THRESH = 1.071
+REFERENCE_LENGTH = 1.0
+E_MIN = 0.16
+
+# Nuclei closer than this, in seconds, are merged (the larger one is kept)
+MIN_DISTANCE = 0.1
+
+
+def bandPass(sampleArray, sampleRate, band=BAND):
+    '''
+    Zeroes the frequencies outside of band
+    '''
+    numSamples = len(sampleArray)
+    spectrum = np.fft.rfft(sampleArray)
+    freqArray = np.fft.rfftfreq(numSamples, 1.0 / sampleRate)
+    spectrum[(freqArray < band[0]) | (freqArray > band[1])] = 0
+
+    return np.fft.irfft(spectrum, numSamples)
+
+
+def getEnergy(sampleArray, sampleRate):
+    '''
+    Returns the sample index at the center of each frame and its RMS energy
+    '''
+    windowSize = max(int(WINDOW_LENGTH * sampleRate), 1)
+    stepSize = max(int(STEP * sampleRate), 1)
+    if len(sampleArray) < windowSize:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    # A running sum gives every window's energy at once
+    cumArray = np.concatenate(([0], np.cumsum(sampleArray ** 2)))
+    startArray = np.arange(0, len(sampleArray) - windowSize + 1, stepSize)
+    energyArray = np.sqrt(np.maximum(cumArray[startArray + windowSize] -
+                                     cumArray[startArray], 0) / windowSize)
+
+    return startArray + windowSize // 2, energyArray
+
+
+def _getReferenceEnergy(energyArray, sampleRate):
+    '''
+    The mean energy of the REFERENCE_LENGTH seconds around each frame
+    '''
+    halfSize = max(int(REFERENCE_LENGTH / STEP) // 2, 1)
+    numFrames = len(energyArray)
+
+    cumArray = np.concatenate(([0], np.cumsum(energyArray)))
+    iArray = np.arange(numFrames)
+    lowArray = np.maximum(iArray - halfSize, 0)
+    highArray = np.minimum(iArray + halfSize + 1, numFrames)
+
+    return (cumArray[highArray] - cumArray[lowArray]) / (highArray - lowArray)
+
+
+def _mergeClosePeaks(peakIArray, centerArray, energyArray, minDistance):
+    '''
+    Of peaks closer than minDistance samples, keeps the most energetic
+    '''
+    keptList = []
+    for i in peakIArray[np.argsort(-energyArray[peakIArray],
+                                   kind="mergesort")]:
+        center = centerArray[i]
+        if all(abs(center - centerArray[j]) >= minDistance for j in keptList):
+            keptList.append(i)
+
+    return np.sort(np.array(keptList, dtype=np.int64))
+
+
+def findNuclei(sampleArray, sampleRate):
+    '''
+    The sample indices of the syllable nuclei in a segment
+    '''
+    sampleArray = np.asarray(sampleArray, dtype=np.float64)
+    if len(sampleArray) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    filteredArray = bandPass(sampleArray, sampleRate)
+    centerArray, energyArray = getEnergy(filteredArray, sampleRate)
+    if len(energyArray) < 3:
+        return np.zeros(0, dtype=np.int64)
+
+    # Local maxima (the first of a flat top)
+    isPeak = np.zeros(len(energyArray), dtype=bool)
+    isPeak[1:-1] = ((energyArray[1:-1] > energyArray[:-2]) &
+                    (energyArray[1:-1] >= energyArray[2:]))
+
+    isPeak &= energyArray > E_MIN * energyArray.max()
+    isPeak &= energyArray > F_THRESH * _getReferenceEnergy(energyArray,
+                                                           sampleRate)
+
+    peakIArray = _mergeClosePeaks(np.flatnonzero(isPeak), centerArray,
+                                  energyArray, MIN_DISTANCE * sampleRate)
+
+    return centerArray[peakIArray]
+
+
+def _writeNuclei(outputFullPath, nucleusArray):
+
+    outputList = ["%d" % index for index in nucleusArray.tolist()]
+    outputTxt = "\n".join(outputList)
+    if len(outputList) > 0:
+        outputTxt += "\n"
+    open(outputFullPath, "w").write(outputTxt)
+
+
+def extractSpeechRate(wavPath, outputPath, nameList=None):
+    '''
+    Finds the nuclei in each segment wav in wavPath
+
+    Same as running extractSpeechRate(wavPath, outputPath) in MATLAB.  If
+    nameList is given, only the segments of those sessions are processed.
+    '''
+    utils.makeDir(outputPath)
+
+    fnList = utils.findFiles(wavPath, filterExt=".wav")
+    if nameList is not None:
+        nameSet = set(nameList)
+        fnList = [fn for fn in fnList
+                  if os.path.splitext(fn)[0].rsplit("_", 1)[0] in nameSet]
+
+    jobList = [(fn, (wavPath, outputPath, fn)) for fn in fnList]
+    return executor.mapFiles(_extractSpeechRateForFile, jobList)[1]
+
+
+def _extractSpeechRateForFile(wavPath, outputPath, fn):
+
+    fullPath = join(wavPath, fn)
+    header = audio_segments.readWavHeader(fullPath)
+    wavArray = audio_segments.openWavArray(fullPath, header)
+    sampleArray = audio_segments.toFloat(wavArray, header)
+
+    nucleusArray = findNuclei(sampleArray, header.sampleRate)
+    _writeNuclei(join(outputPath, os.path.splitext(fn)[0] + ".txt"),
+                 nucleusArray)
+
+
+def extractSpeechRateFromTextgrids(wavPath, textgridPath, mothersSpeechName,
+                                   outputPath, nameList=None):
+    '''
+    Finds the nuclei in each of the mother's utterances
+
+    The utterances are cut from the session wavs in memory, exactly as
+    general_CSDP_MCRP.extractMotherSpeech() cuts them, so the segment wavs
+    needn't be written first.  The output files have the same names as
+    with extractSpeechRate().
+
+    Each utterance is its own job, so a session with many utterances is
+    spread over the workers.  Errors are returned per session, with the
+    utterance that failed named in the traceback.
+    '''
+    utils.makeDir(outputPath)
+
+    nameList = general_CSDP_MCRP.findSessionFiles(wavPath, ".wav", nameList,
+                                                  stripExt=True)
+    jobList = [(name, (textgridPath, mothersSpeechName, name))
+               for name in nameList]
+    resultList, errorList = executor.mapFiles(_getSegmentTimes, jobList)
+
+    jobList = [("%s_%03d" % (name, i), (wavPath, outputPath, name, i, start,
+                                        stop))
+               for name, timeList in resultList
+               for i, (start, stop) in enumerate(timeList)]
+    segmentErrorList = executor.mapFiles(_extractSpeechRateForSegment,
+                                         jobList)[1]
+    errorList += [(fn.rsplit("_", 1)[0], "%s\n%s" % (fn, error))
+                  for fn, error in segmentErrorList]
+
+    return errorList
+
+
+def _getSegmentTimes(textgridPath, mothersSpeechName, name):
+
+    tg = textgrid_reader.openTextgrid(join(textgridPath, name + ".TextGrid"))
+    speechTier = tg.tierDict[mothersSpeechName]
+
+    return [(float(start), float(stop))
+            for start, stop, label in speechTier.entryList]
+
+
+def _extractSpeechRateForSegment(wavPath, outputPath, name, i, start, stop):
+
+    # Only the header is read; the samples are memory-mapped
+    fullPath = join(wavPath, name + ".wav")
+    header = audio_segments.readWavHeader(fullPath)
+    wavArray = audio_segments.openWavArray(fullPath, header)
+
+    segment = audio_segments.getSegment(wavArray, header, start, stop,
+                                        singleChannelFlag=True)
+    nucleusArray = findNuclei(audio_segments.toFloat(segment, header),
+                              header.sampleRate)
+    _writeNuclei(join(outputPath, "%s_%03d.txt" % (name, i)), nucleusArray)
@@ -0,0 +1,309 @@
+
+# A read-only TextGrid loader that only parses the tiers that are used.
+#
+# The file is scanned once to find where each tier starts; a tier's entries
+# are parsed the first time the tier is accessed.  The object has the
+# tierNameList, tierDict, minTimestamp and maxTimestamp of a praatio
+# Textgrid, and its tiers are praatio tiers, so it can be passed to the
+# functions that only read from a textgrid.  Use toTextgrid() (or
+# praatio.openTextGrid()) for a textgrid that will be modified and saved.
+#
+# Entries are read as praatio reads them: the rest of the line after
+# 'text =' or 'mark =', stripped of whitespace and quotes, with blank
+# intervals dropped.  Only long-format TextGrids are scanned this way;
+# others (e.g. short-format ones) are read whole with praatio.
+
+import os
+from os.path import join
+
+import codecs
+import cPickle
+import hashlib
+import re
+
+from praatio import praatio
+
+INTERVAL_TIER = "IntervalTier"
+POINT_TIER = "TextTier"
+
+_itemRE = re.compile(r"^[ \t]*item \[\d+\]:", re.M)
+_headerFieldRE = re.compile(r"^[ \t]*(class|name|xmin|xmax) = ([^\n]*)$",
+                            re.M)
+_intervalRE = re.compile(r"intervals \[\d+\]:?[ \t]*\n"
+                         r"[ \t]*xmin = ([^\n]*)\n"
+                         r"[ \t]*xmax = ([^\n]*)\n"
+                         r"[ \t]*text = ([^\n]*)")
+_pointRE = re.compile(r"points \[\d+\]:?[ \t]*\n"
+                      r"[ \t]*(?:number|time) = ([^\n]*)\n"
+                      r"[ \t]*mark = ([^\n]*)")
+
+# Bump when the cached data changes shape
+_CACHE_VERSION = 1
+
+# The folder for the pickle sidecars used by openTextgrid(), if any.  Like
+# executor's options, this must be set before the workers are started.
+_readerOptions = {"cachePath": None,
+                  }
+
+
+def setCachePath(cachePath):
+    '''
+    Sets the default sidecar folder for openTextgrid(); None for no cache
+    '''
+    _readerOptions["cachePath"] = cachePath
+
+
+def _cleanValue(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        value = value[1:-1]
+
+    return value.strip()
+
+
+def _readText(fullPath):
+
+    data = open(fullPath, "rb").read()
+    if data.startswith(codecs.BOM_UTF16_LE) or data.startswith(codecs.BOM_UTF16_BE):
+        text = data.decode("utf-16")
+    else:
+        text = data.decode("utf-8-sig")
+
+    return text.replace("\r\n", "\n")
+
+
+def _parseTier(className, tierText):
+    '''
+    The entry list of a tier, from the text of its "item [n]:" section
+    '''
+    if className == INTERVAL_TIER:
+        entryList = [(float(start), float(stop), _cleanValue(label))
+                     for start, stop, label in _intervalRE.findall(tierText)]
+        entryList = [entry for entry in entryList if entry[2] != ""]
+    else:
+        entryList = [(float(time), _cleanValue(label))
+                     for time, label in _pointRE.findall(tierText)]
+
+    return entryList
+
+
+def _makeTier(className, name, entryList, minT, maxT):
+    if className == INTERVAL_TIER:
+        return praatio.IntervalTier(name, entryList, minT, maxT)
+    return praatio.PointTier(name, entryList, minT, maxT)
+
+
+class _LazyTierDict(object):
+    '''
+    Like the tierDict of a praatio Textgrid, but tiers are only parsed
+    when first accessed
+    '''
+
+    def __init__(self, textgrid):
+        self._textgrid = textgrid
+        self._tierDict = {}
+
+    def __getitem__(self, tierName):
+        if tierName not in self._tierDict:
+            self._tierDict[tierName] = self._textgrid._loadTier(tierName)
+        return self._tierDict[tierName]
+
+    def __contains__(self, tierName):
+        return tierName in self._textgrid.tierNameList
+
+    def __iter__(self):
+        return iter(self._textgrid.tierNameList)
+
+    def __len__(self):
+        return len(self._textgrid.tierNameList)
+
+    def get(self, tierName, default=None):
+        if tierName not in self:
+            return default
+        return self[tierName]
+
+    def keys(self):
+        return list(self._textgrid.tierNameList)
+
+
+class LazyTextgrid(object):
+    '''
+    A read-only textgrid whose tiers are parsed on demand
+    '''
+
+    def __init__(self, fullPath, minTimestamp, maxTimestamp, tierInfoList,
+                 text=None, entryDict=None):
+        '''
+        tierInfoList holds (name, className, minT, maxT, startOffset,
+        endOffset) for each tier, offsets being into text.  entryDict, if
+        given, holds the already parsed entry list of each tier.
+        '''
+        self.fullPath = fullPath
+        self.minTimestamp = minTimestamp
+        self.maxTimestamp = maxTimestamp
+        self.tierNameList = [tierInfo[0] for tierInfo in tierInfoList]
+        self._tierInfoDict = dict((tierInfo[0], tierInfo)
+                                  for tierInfo in tierInfoList)
+        self._text = text
+        self._entryDict = entryDict
+        self.tierDict = _LazyTierDict(self)
+
+    def _getEntryList(self, tierName):
+        if self._entryDict is not None:
+            return self._entryDict[tierName]
+
+        name, className, minT, maxT, start, end = self._tierInfoDict[tierName]
+        return _parseTier(className, self._text[start:end])
+
+    def _loadTier(self, tierName):
+        name, className, minT, maxT = self._tierInfoDict[tierName][:4]
+        return _makeTier(className, name, self._getEntryList(tierName),
+                         minT, maxT)
+
+    def toTextgrid(self):
+        '''
+        A praatio Textgrid with every tier, for modifying and saving
+        '''
+        tg = praatio.Textgrid()
+        for tierName in self.tierNameList:
+            tg.addTier(self.tierDict[tierName])
+
+        return tg
+
+
+def _scanTextgrid(fullPath):
+    '''
+    Finds the header and the location of each tier without parsing entries
+
+    Returns None if the file isn't a long-format TextGrid.
+    '''
+    text = _readText(fullPath)
+
+    itemStartList = [match.start() for match in _itemRE.finditer(text)]
+    if len(itemStartList) == 0 and "item []" not in text:
+        return None
+
+    headerEnd = itemStartList[0] if len(itemStartList) > 0 else len(text)
+    headerDict = dict(_headerFieldRE.findall(text[:headerEnd]))
+    minTimestamp = float(headerDict["xmin"])
+    maxTimestamp = float(headerDict["xmax"])
+
+    tierInfoList = []
+    offsetList = itemStartList + [len(text)]
+    for start, end in zip(offsetList[:-1], offsetList[1:]):
+
+        # The tier's own fields come before its first entry
+        fieldDict = {}
+        for match in _headerFieldRE.finditer(text, start, end):
+            fieldName = match.group(1)
+            if fieldName in fieldDict:
+                break
+            fieldDict[fieldName] = _cleanValue(match.group(2))
+            if len(fieldDict) == 4:
+                break
+
+        tierInfoList.append((fieldDict["name"], fieldDict["class"],
+                             float(fieldDict["xmin"]),
+                             float(fieldDict["xmax"]), start, end))
+
+    return text, minTimestamp, maxTimestamp, tierInfoList
+
+
+def _readWithPraatio(fullPath):
+    '''
+    Like _scanTextgrid(), for the formats it doesn't scan, but every tier
+    is parsed, and the entry list of each is returned instead of the text
+    '''
+    tg = praatio.openTextGrid(fullPath)
+
+    tierInfoList = []
+    entryDict = {}
+    for tierName in tg.tierNameList:
+        tier = tg.tierDict[tierName]
+        className = POINT_TIER
+        if isinstance(tier, praatio.IntervalTier):
+            className = INTERVAL_TIER
+        tierInfoList.append((tierName, className, tier.minTimestamp,
+                             tier.maxTimestamp, None, None))
+        entryDict[tierName] = tier.entryList
+
+    return tg.minTimestamp, tg.maxTimestamp, tierInfoList, entryDict
+
+
+def _readTextgrid(fullPath):
+    '''
+    Returns (text, minT, maxT, tierInfoList, entryDict)
+
+    For a long-format TextGrid, entryDict is None and the tiers are parsed
+    from text when needed; otherwise text is None.
+    '''
+    scanned = _scanTextgrid(fullPath)
+    if scanned is None:
+        minT, maxT, tierInfoList, entryDict = _readWithPraatio(fullPath)
+        return None, minT, maxT, tierInfoList, entryDict
+
+    text, minT, maxT, tierInfoList = scanned
+    return text, minT, maxT, tierInfoList, None
+
+
+def _getCacheFullPath(fullPath, cachePath):
+    # TextGrids of the same name in different folders (e.g. the stages'
+    # output folders) share a cache folder, so the key is the full path
+    pathHash = hashlib.sha1(os.path.abspath(fullPath)).hexdigest()
+    return join(cachePath, "%s_%s.pickle" % (os.path.basename(fullPath),
+                                             pathHash))
+
+
+def openTextgrid(fullPath, cachePath=None):
+    '''
+    Opens a TextGrid for reading, parsing tiers only as they are used
+
+    If cachePath is given (or set with setCachePath()), the parsed tiers
+    are kept there in a pickle sidecar, which is reused as long as the
+    TextGrid's size and modification time haven't changed.  Opening a
+    textgrid with a valid sidecar doesn't read the textgrid at all.
+    '''
+    if cachePath is None:
+        cachePath = _readerOptions["cachePath"]
+
+    if cachePath is None:
+        text, minT, maxT, tierInfoList, entryDict = _readTextgrid(fullPath)
+        return LazyTextgrid(fullPath, minT, maxT, tierInfoList, text=text,
+                            entryDict=entryDict)
+
+    statResult = os.stat(fullPath)
+    stamp = (_CACHE_VERSION, statResult.st_size, statResult.st_mtime)
+    cacheFullPath = _getCacheFullPath(fullPath, cachePath)
+
+    if os.path.exists(cacheFullPath):
+        try:
+            with open(cacheFullPath, "rb") as fd:
+                cached = cPickle.load(fd)
+        except (EOFError, cPickle.UnpicklingError):
+            cached = None
+        if cached is not None and cached["stamp"] == stamp:
+            return LazyTextgrid(fullPath, cached["minT"], cached["maxT"],
+                                cached["tierInfoList"],
+                                entryDict=cached["entryDict"])
+
+    text, minT, maxT, tierInfoList, entryDict = _readTextgrid(fullPath)
+    if entryDict is None:
+        entryDict = dict((tierInfo[0],
+                          _parseTier(tierInfo[1],
+                                     text[tierInfo[4]:tierInfo[5]]))
+                         for tierInfo in tierInfoList)
+
+    if not os.path.exists(cachePath):
+        os.makedirs(cachePath)
+
+    # Written under a temporary name since several workers may cache the
+    # same textgrid at once
+    tmpCacheFullPath = cacheFullPath + ".%d.tmp" % os.getpid()
+    with open(tmpCacheFullPath, "wb") as fd:
+        cPickle.dump({"stamp": stamp, "minT": minT, "maxT": maxT,
+                      "tierInfoList": tierInfoList, "entryDict": entryDict},
+                     fd, cPickle.HIGHEST_PROTOCOL)
+    os.rename(tmpCacheFullPath, cacheFullPath)
+
+    return LazyTextgrid(fullPath, minT, maxT, tierInfoList,
+                        entryDict=entryDict)